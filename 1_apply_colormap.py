@@ -2,254 +2,241 @@
 # -*- coding: utf-8 -*-
 
 """
-Apply a color table using the GDAL method of converting the input raster
-to a VRT, inserting the color table into the VRT, and then writing it
-back to a new .tif raster.  
+Apply a color table by copying the input raster to a new .tif raster that
+is created with the color table from Color_tables already attached.
 Author: Dan Zelenak
 Last Updated: 8/4/2017 by Dan Zelenak
 """
 
 import os
-import sys
 import datetime
 import glob
-import subprocess
 import argparse
 import ast
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from osgeo import gdal
 
+import band_math
+import output_profile
+import palette
+
 t1 = datetime.datetime.now()
 print("\n", t1.strftime("%Y-%m-%d %H:%M:%S"))
 
+# product name: color table
+PRODUCTS = {"CoverPrim": "color_covermap.txt",
+            "CoverSec": "color_covermap.txt",
+            "CoverConfPrim": "color_coverconf.txt",
+            "CoverConfSec": "color_coverconf.txt",
+            "ChangeMap": "color_changemap.txt",
+            "LastChange": "color_lastchange.txt",
+            "SegLength": "color_seglength.txt",
+            "QAMap": "color_qa.txt",
+            "ChangeMagMap": "color_changemag.txt"}
 
-def add_color_table(in_file, clr_table, dtype):
-    """Open the .txt file which contains the color table information and
-    insert it into the xml code of the .vrt file
-
-    Args:
-        in_file = the vrt file produced from the original raster file
-        clr_table = the color table .txt file
-        dtype = the data type of the original raster file (e.g. Byte)
-    Returns:
-        out_vrt = the edited vrt file containing color table information
-    """
-
-    clr_table = "Color_tables%s%s" % (os.sep, clr_table)
-
-    color_table = open(clr_table, "r")
-
-    # split the path and file name
-    (dirname, filename) = os.path.split(in_file)
-    (filebase, fileext) = os.path.splitext(filename)
-
-    out_vrt = r"%s%szzzzz%s_temp.vrt" % (dirname, os.sep, filebase)
-
-    # open the input vrt file as read-only
-    txt = open(in_file, "r+")
-
-    # get lines in a list
-    txt_read = txt.readlines()
-
-    # check text for keywords
-    key = '<VRTRasterBand dataType="%s" band="1">' % (dtype)
-
-    # create and open the output vrt file for writing
-    out_txt = open(out_vrt, "w")
-
-    for line in txt_read:
-
-        write = r"%s" % line
-
-        out_txt.write(write)
-
-        # insert color table following keywords
-        if key in line:
-
-            color_read = color_table.readlines()
-
-            for ln in color_read:
-                out_txt.write(ln)
-
-    out_txt.close()
-
-    return out_vrt
+# GDAL data types that a GTiff color table can be attached to
+PALETTE_TYPES = (gdal.GDT_Byte, gdal.GDT_UInt16)
 
 
-def all_calc(infile, outputdir, outfile, clrtable, dtype):
-    """Primary function that runs gdal executables.  Takes in a single input
+def all_calc(infile, outputdir, outfile, clrtable, blocksize=1024):
+    """Primary function that writes the colored raster.  Takes in a single input
     raster file, a specified output directory including the full path, output 
-    file name with full path, as well as the appropriate color table and data 
-    type of the output raster.
+    file name with full path, as well as the appropriate color table.  Band 1
+    of the input is copied block by block into an output of the same data
+    type, the same as gdal_translate -b 1, which is created with the color
+    table already attached if the data type is Byte or UInt16.
     
     Args:
         infile = the full path to the current input raster
         outputdir = the full path to the output folder
         outfile = the full path and name of the output raster
         clrtable = the color table to be used
-        dtype = the data type of the output raster (e.g. Byte)
+        blocksize = the number of rows and columns copied at a time
     Returns:
         None
     """
-    outcsv_file = r"%s%szzzz_%s_list.csv" % (outputdir, os.sep, os.path.basename(infile))
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
 
-    if os.path.isfile(outcsv_file):
-        os.remove(outcsv_file)
+    inband = src.GetRasterBand(1)
 
-    open_csv = open(outcsv_file, "wb")
+    rows = src.RasterYSize
+    cols = src.RasterXSize
 
-    # -----------------------------------------------------------------------
-    # Generate a temporary output raster file--------------------------------
-    tempoutfile = outputdir + os.sep + "zzzz_" + os.path.basename(infile) + ".tif"
+    out = band_math.create_output(outfile, "GTiff", cols, rows, inband.DataType,
+                                  src.GetGeoTransform(), src.GetProjection(), inband.GetNoDataValue())
 
-    runsubset = "gdal_translate -of %s -b %s -q %s %s" % ("GTiff", "1", infile, tempoutfile)
+    outband = out.GetRasterBand(1)
 
-    subprocess.call(runsubset, shell=True)
-
-    # write temporary raster file path to this .csv file (required for VRT)
-    if sys.version[0] == '3':
-        open_csv.write(tempoutfile.encode("utf-8") + "\r\n".encode("utf-8"))
+    if inband.DataType in PALETTE_TYPES:
+        palette.set_color_table(outband, clrtable)
 
     else:
-        open_csv.write(tempoutfile + "\r\n")
-
-    open_csv.close()
+        print("{} is {}, no color table was attached".format(os.path.basename(infile),
+                                                              gdal.GetDataTypeName(inband.DataType)))
 
-    # -----------------------------------------------------------------------
-    # Genereate temporary VRT file based on temp raster listed in .csv file
-    temp_VRT = outputdir + os.sep + "zzzz_" + os.path.basename(infile) + ".vrt"
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
 
-    com = "gdalbuildvrt -q -input_file_list %s %s" % (outcsv_file, temp_VRT)
+        outband.WriteArray(inband.ReadAsArray(xoff, yoff, xsize, ysize), xoff, yoff)
 
-    subprocess.call(com, shell=True)
+    # same as the -stats option of gdal_translate
+    outband.ComputeStatistics(False)
 
-    # subprocess.call(com, shell=True)
+    band_math.finish_output(out, outfile, "GTiff")
 
-    color_VRT = add_color_table(temp_VRT, clrtable, dtype)
+    src, inband, out, outband = None, None, None, None
 
-    # -----------------------------------------------------------------------
-    # Write the VRT w/ color table added to the output raster file
-    runCom = "gdal_translate -of %s -q -stats %s %s" % ("GTiff", color_VRT, outfile)
+    return None
 
-    subprocess.call(runCom, shell=True)
 
+def build_overviews(outraster, threads=None):
     """
-    # -----------------------------------------------------------------------
-    #Add spatial reference system to output raster file
-    runEdit = "%s/gdal_edit.py -a_srs EPSG:5070 %s" % (GDALpath, outfile)
-    subprocess.call(runEdit, shell=True)
+    Build nearest neighbor overviews for the colored raster
+    :param outraster: <str> The full path to the colored raster
+    :param threads: GDAL_NUM_THREADS setting used to compute the overviews (e.g. 4 or ALL_CPUS), the default leaves
+                    GDAL's current setting (such as the GDAL_NUM_THREADS environment variable) in place
+    :return:
     """
+    if threads is not None:
+        gdal.SetConfigOption("GDAL_NUM_THREADS", str(threads))
 
-    get_srs(infile, outfile)
+    out_src = gdal.Open(outraster, gdal.GA_ReadOnly)
 
-    # Remove temporary files (1 each of a .csv, .vrt, and .tif)
-    for v in glob.glob(outputdir + os.sep + "zzz*"):
-        os.remove(v)
+    out_src.BuildOverviews(resampling="NEAREST", overviewlist=[2,4,8])
+
+    out_src = None
 
     return None
 
 
-def get_srs(inraster, outraster):
-    """Apply a spatial reference system to the new raster file based on the
-    SRS of the original raster
-    
-    Args:
-        inraster = the original input raster file
-        outraster = the newly created raster file that contains a color map
-    Returns:
-        None
+def get_jobs(indir, name, outdir, ovr):
+    """
+    Find the files of one product that need a color table applied and create the product's output folder
+    :param indir: <str> The full path to the input directory
+    :param name: <str> The product name (e.g. ChangeMap)
+    :param outdir: <str> The full path to the output directory
+    :param ovr: <bool> Whether or not to overwrite existing outputs
+    :return: <list> all_calc arguments (infile, outputdir, outfile, clrtable) for each file
     """
+    outputdir = "%s%s%s_color" % (outdir, os.sep, name)
 
-    in_src = gdal.Open(inraster, gdal.GA_ReadOnly)
-    out_src = gdal.Open(outraster, gdal.GA_Update)
+    filelist = sorted(glob.glob("{}{}*{}*.tif".format(indir, os.sep, name)))
 
-    out_src.SetGeoTransform(in_src.GetGeoTransform())
-    out_src.SetProjection(in_src.GetProjection())
+    if not os.path.exists(outputdir):
+        os.makedirs(outputdir)
 
-    in_src = None
-    out_src = None
+    clrtable = PRODUCTS[name]
 
-    # build_overviews(outraster)
+    print("\nFiles saving to {}\n".format(outputdir))
 
-    return None
+    jobs = []
 
+    for r in filelist:
 
-def build_overviews(outraster):
+        outfile = outputdir + os.sep + os.path.basename(r)
+
+        file_exists = os.path.exists(outfile)
+
+        if (file_exists and ovr) or not file_exists:
+
+            try:
+                os.remove(outfile)
+            except:
+                pass
+
+            jobs.append((r, outputdir, outfile, clrtable))
+
+    return jobs
+
+
+def run_job(job, overviews=False, threads=None, profile=None):
     """
-    
-    :param outraster:
-    :return:
+    Color one file and optionally build its overviews.  Any error is returned rather than raised so that one failed
+    file doesn't stop the rest of the pool.
+    :param job: <tuple> all_calc arguments from get_jobs
+    :param overviews: <bool> Whether or not to build overviews
+    :param threads: GDAL_NUM_THREADS setting for the overviews
+    :param profile: <str> The output_profile name
+    :return: <str> The traceback of the error, None if the file succeeded
     """
-    out_src = gdal.Open(outraster, gdal.GA_ReadOnly)
+    try:
+        output_profile.set_profile(profile)
 
-    out_src.BuildOverviews(resampling="NEAREST", overviewlist=[2,4,8])
+        all_calc(*job)
 
-    out_src = None
+        if overviews:
+            build_overviews(job[2], threads)
+
+    except (Exception, SystemExit):
+        return traceback.format_exc()
 
     return None
 
-def main_work(indir, name, outdir, ovr):
+
+def main_work(indir, name, outdir, ovr, workers=1, overviews=False, threads=None, profile=None):
     """
 
     :param indir:
-    :param name:
+    :param name: <str> or <list> One or more product names, "all" selects every product in the tile
     :param outdir:
-    :return:
+    :param ovr:
+    :param workers: <int> Number of files colored at the same time
+    :param overviews: <bool> Build overviews for each colored file
+    :param threads: GDAL_NUM_THREADS setting for the overviews, defaults to the GDAL_NUM_THREADS environment variable
+    :param profile: <str> The output_profile name
+    :return: <list> (input file, traceback) for each file that failed
     """
-    outputdir = "%s%s%s_color" % (outdir, os.sep, name)
+    output_profile.set_profile(profile)
 
     ovr = ast.literal_eval(ovr)
 
-    filelist = sorted(glob.glob("{}{}*{}*.tif".format(indir, os.sep, name)))
+    names = [name] if isinstance(name, str) else list(name)
 
-    if not os.path.exists(outputdir):
-        os.makedirs(outputdir)
+    if "all" in names:
+        names = list(PRODUCTS.keys())
 
-    names = ["CoverPrim", "CoverSec", "CoverConfPrim", "CoverConfSec",
-             "ChangeMap", "LastChange", "SegLength", "QAMap", "ChangeMagMap"]
+    if threads is None:
+        threads = os.environ.get("GDAL_NUM_THREADS")
 
-    colortables = ["color_covermap.txt", "color_covermap.txt",
-                   "color_coverconf.txt", "color_coverconf.txt",
-                   "color_changemap.txt", "color_lastchange.txt",
-                   "color_seglength.txt", "color_qa.txt",
-                   "color_changemag.txt"]
+    jobs = [job for n in names for job in get_jobs(indir, n, outdir, ovr)]
 
-    dtypes = ["Byte", "Byte", "Byte", "Byte", "UInt16",
-              "Byte", "Byte", "Byte", "Byte"]
+    failed = []
 
-    lookupcolor = dict(zip(names, colortables))
+    if workers <= 1:
 
-    lookuptype = dict(zip(names, dtypes))
+        for job in jobs:
 
-    clrtable = lookupcolor[name]
+            print("Processing file ", job[0], "\n")
 
-    dtype = lookuptype[name]
+            error = run_job(job, overviews, threads, profile)
 
-    print("\nFiles saving to {}\n".format(outputdir))
+            if error is None:
+                print("Finished file ", job[0])
 
-    for r in filelist:
+            else:
+                failed.append((job[0], error))
 
-        outfile = outputdir + os.sep + os.path.basename(r)
+    else:
 
-        file_exists = os.path.exists(outfile)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
 
-        if (file_exists and ovr) or not file_exists:
+            futures = {pool.submit(run_job, job, overviews, threads, profile): job[0] for job in jobs}
 
-            try:
-                os.remove(outfile)
-            except:
-                pass
+            for future in as_completed(futures):
 
-            print("Processing file ", r, "\n")
+                error = future.result()
 
-            # Call the primary function
-            all_calc(r, outputdir, outfile, clrtable, dtype)
+                if error is None:
+                    print("Finished file ", futures[future])
 
-        elif file_exists and not ovr:
+                else:
+                    failed.append((futures[future], error))
 
-            continue
+    for r, error in failed:
+        print("\nFAILED {}\n{}".format(r, error))
 
-    return None
+    return failed
 
 
 def main():
@@ -260,10 +247,10 @@ def main():
     parser.add_argument('-i', '--input', dest='indir', type=str, required=True,
                         help="The full path to the input directory")
 
-    parser.add_argument('-n', dest='name', type=str, required=True,
+    parser.add_argument('-n', dest='name', type=str, required=True, nargs='+',
                         choices=["CoverPrim", "CoverSec", "CoverConfPrim", "CoverConfSec",
-                                 "ChangeMap", "LastChange", "SegLength", "QAMap", "ChangeMagMap"],
-                        help='Input product name')
+                                 "ChangeMap", "LastChange", "SegLength", "QAMap", "ChangeMagMap", "all"],
+                        help='One or more input product names, or all to color every product in the tile')
 
     parser.add_argument('-o', '--output', dest='outdir', type=str, required=True,
                         help='The full path to the output directory')
@@ -271,6 +258,18 @@ def main():
     parser.add_argument('-ovr', dest='ovr', type=str, required=False, default='False',
                         help="Specify whether or not to overwrite the file if it already exists")
 
+    parser.add_argument('-w', '--workers', dest='workers', type=int, required=False, default=1,
+                        help="Number of files to color at the same time")
+
+    parser.add_argument('-pyr', '--overviews', dest='overviews', action='store_true',
+                        help="Build overviews for each colored file")
+
+    parser.add_argument('-threads', dest='threads', type=str, required=False,
+                        help="GDAL_NUM_THREADS used to build overviews, defaults to the GDAL_NUM_THREADS "
+                             "environment variable")
+
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
@@ -21,6 +21,8 @@ try:
 except ImportError:
     import gdal
 
+import output_profile
+
 t1 = datetime.datetime.now()
 print("\n", t1.strftime("%Y-%m-%d %H:%M:%S"))
 
@@ -138,10 +140,13 @@ def all_calc(infile, outputdir, outfile, clrtable, dtype):
 
     # -----------------------------------------------------------------------
     # Write the VRT w/ color table added to the output raster file
-    runCom = "gdal_translate -of %s -q %s %s" % ("GTiff", color_VRT, outfile)
+    runCom = "gdal_translate %s -q %s %s" % (output_profile.get_co_args(gdal.GetDataTypeByName(dtype)),
+                                             color_VRT, outfile)
 
     subprocess.call(runCom, shell=True)
 
+    output_profile.add_overviews(outfile)
+
     """
     # -----------------------------------------------------------------------
     #Add spatial reference system to output raster file
@@ -182,14 +187,17 @@ def get_srs(inraster, outraster):
     return None
 
 
-def main_work(indir, name, outdir):
+def main_work(indir, name, outdir, profile=None):
     """
 
     :param indir:
     :param name:
     :param outdir:
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     outputdir = "{}{}{}_color".format(outdir, os.sep, name)
 
     if name == "trends": name = "Trends"
@@ -244,6 +252,8 @@ def main():
     parser.add_argument('-o', '--output', dest='outdir', type=str, required=True,
                         help='The full path to the output directory')
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
@@ -8,42 +8,35 @@ import datetime
 import glob
 import os
 import pprint
-import subprocess
 import sys
 import argparse
-from collections import namedtuple
 
-print(sys.version)
-
-WKT = "ard_srs.wkt"
+import ard_clip
+import output_profile
 
-GeoExtent = namedtuple('GeoExtent', ['x_min', 'y_max', 'x_max', 'y_min'])
-
-CONUS_EXTENT = GeoExtent(x_min=-2565585,
-                         y_min=14805,
-                         x_max=2384415,
-                         y_max=3314805)
+print(sys.version)
 
 t1 = datetime.datetime.now()
 print(t1.strftime("%Y-%m-%d %H:%M:%S"))
 
 
-def geospatial_hv(h, v, loc=CONUS_EXTENT):
+def get_outfile(outdir, name, multiple):
     """
-    Geospatial extent and 30m affine for a given ARD grid location.
+    Build the output path of a clipped tile.  When more than one tile is clipped each gets its own hHHvVV subfolder.
 
-    :param h:
-    :param v:
-    :param loc:
-    :return:
+    :param outdir: <str> Full path to the output location
+    :param name: <str> Output file name without extension
+    :param multiple: <bool> More than one tile is being clipped
+    :return: <function> Takes h and v and returns the output path
     """
 
-    xmin = loc.x_min + h * 5000 * 30
-    xmax = loc.x_min + h * 5000 * 30 + 5000 * 30
-    ymax = loc.y_max - v * 5000 * 30
-    ymin = loc.y_max - v * 5000 * 30 - 5000 * 30
+    def outfile(h, v):
+        if multiple:
+            return os.path.join(outdir, "h{:02d}v{:02d}".format(h, v), name + ".tif")
 
-    return GeoExtent(x_min=xmin, x_max=xmax, y_max=ymax, y_min=ymin)
+        return os.path.join(outdir, name + ".tif")
+
+    return outfile
 
 
 def main():
@@ -55,11 +48,17 @@ def main():
     parser.add_argument("-o", "--output", type=str, required=True,
                         help="Full path to the output location")
 
-    parser.add_argument('-hv', nargs=2, type=str, required=False, metavar=('HH (0-32)', 'VV (0-21)'),
-                        help='Horizontal and vertical ARD grid identifiers.')
+    parser.add_argument('-hv', nargs='+', type=str, required=True, metavar='HH VV',
+                        help='Horizontal and vertical ARD grid identifiers, repeat HH VV to clip several tiles.')
+
+    output_profile.add_argument(parser)
 
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
+    tiles = ard_clip.get_tiles(args.hv)
+
     file_list = sorted(glob.glob(args.input + os.sep + '*.img'))
 
     if len(file_list) == 0:
@@ -76,36 +75,26 @@ def main():
 
     pprint.pprint(file_list)
 
-    for file in file_list:
-
-        print('\tWorking on {}'.format(os.path.basename(file)))
+    srs = ard_clip.get_srs()
 
-        if not os.path.exists(args.output):
-            os.makedirs(args.output)
-
-        clip_extent = geospatial_hv(h=int(args.hv[0]), v=int(args.hv[1]))
+    for h, v in tiles:
+        clip_extent = ard_clip.geospatial_hv(h=h, v=v)
 
         print('\n------------------------')
 
-        print('Extent of the out layer:\n\t\t\t', clip_extent.y_max,
+        print('Extent of H{:02d}V{:02d}:\n\t\t\t'.format(h, v), clip_extent.y_max,
               '\n\n\t', clip_extent.x_min, '\t\t\t', clip_extent.x_max, '\n\n\t\t\t', clip_extent.y_min)
 
         print('------------------------\n')
 
-        in_file = os.path.basename(file)
-        out_name = os.path.splitext(in_file)[0]
-        out_file = args.output + os.sep + out_name + ".tif"
+    for file in file_list:
 
-        print('\tProducing output {}'.format(out_file))
+        print('\tWorking on {}'.format(os.path.basename(file)))
 
-        run_trans = "gdal_translate -projwin {ulx} {uly} {lrx} {lry} -a_srs {wkt} {src} {dst}".format(
-            ulx=clip_extent.x_min, uly=clip_extent.y_max,
-            lrx=clip_extent.x_max, lry=clip_extent.y_min,
-            wkt=WKT,
-            src=file,
-            dst=out_file)
+        out_name = os.path.splitext(os.path.basename(file))[0]
 
-        subprocess.call(run_trans, shell=True)
+        ard_clip.clip_tiles(file, tiles, get_outfile(args.output, out_name, len(tiles) > 1), srs=srs,
+                            keep_empty=True)
 
     print("\nAll done")
 
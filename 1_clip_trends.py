@@ -11,25 +11,12 @@ import datetime
 import glob
 import os
 import pprint
-import subprocess
 import sys
 import argparse
 import re
-from collections import namedtuple
 
-from osgeo import gdal
-import numpy as np
-
-print(sys.version)
-
-WKT = "ard_srs.wkt"
-
-GeoExtent = namedtuple('GeoExtent', ['x_min', 'y_max', 'x_max', 'y_min'])
-
-CONUS_EXTENT = GeoExtent(x_min=-2565585,
-                         y_min=14805,
-                         x_max=2384415,
-                         y_max=3314805)
+import ard_clip
+import output_profile
 
 print(sys.version)
 
@@ -38,61 +25,26 @@ t1 = datetime.datetime.now()
 print(t1.strftime("%Y-%m-%d %H:%M:%S"))
 
 
-def geospatial_hv(h, v, loc=CONUS_EXTENT):
-    """
-    Geospatial extent and 30m affine for a given ARD grid location.
-
-    :param h:
-    :param v:
-    :param loc:
-    :return:
-    """
-
-    xmin = loc.x_min + h * 5000 * 30
-    xmax = loc.x_min + h * 5000 * 30 + 5000 * 30
-    ymax = loc.y_max - v * 5000 * 30
-    ymin = loc.y_max - v * 5000 * 30 - 5000 * 30
-
-    return GeoExtent(x_min=xmin, x_max=xmax, y_max=ymax, y_min=ymin)
+def get_outfile(outdir, name, multiple):
+    """Build the output path of a clipped tile.  When more than one tile is
+    clipped each gets its own hHHvVV subfolder.
 
-
-def remove_empty(raster):
-    """Open the clipped Trends rasters and delete those that are entirely
-    no data.
-    
     Args:
-        raster (str) = path to the Trends raster being tested
-    
+        outdir (str) = full path to the output location
+        name (str) = output file name without extension
+        multiple (bool) = more than one tile is being clipped
+
     Returns:
-        None
+        function that takes h and v and returns the output path
     """
-    test = gdal.Open(raster, gdal.GA_ReadOnly)
-
-    testband = test.GetRasterBand(1)
-
-    testbanddata = testband.ReadAsArray()
-
-    if not np.any(testbanddata):
-
-        test, testband, testbanddata = None, None, None
 
-        os.remove(raster)
+    def outfile(h, v):
+        if multiple:
+            return os.path.join(outdir, "h{:02d}v{:02d}".format(h, v), name + ".tif")
 
-        ancillary = glob.glob(raster + '*')  # remove associated files too (.aux)
+        return os.path.join(outdir, name + ".tif")
 
-        for i in ancillary:
-            os.remove(i)
-
-        print('%s is entirely no data and it has been removed' % (os.path.basename(raster)))
-
-    allfiles = glob.glob(raster + "*")
-
-    for anc in allfiles:
-        anc_ = re.sub("era", "", anc)
-
-        os.rename(anc, anc_)
-
-    return None
+    return outfile
 
 
 def main():
@@ -104,11 +56,17 @@ def main():
     parser.add_argument("-o", "--output", type=str, required=True,
                         help="Full path to the output location")
 
-    parser.add_argument('-hv', nargs=2, type=str, required=False, metavar=('HH (0-32)', 'VV (0-21)'),
-                        help='Horizontal and vertical ARD grid identifiers.')
+    parser.add_argument('-hv', nargs='+', type=str, required=True, metavar='HH VV',
+                        help='Horizontal and vertical ARD grid identifiers, repeat HH VV to clip several tiles.')
+
+    output_profile.add_argument(parser)
 
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
+    tiles = ard_clip.get_tiles(args.hv)
+
     file_list = sorted(glob.glob(args.input + os.sep + '*.img'))
 
     if len(file_list) == 0:
@@ -123,39 +81,27 @@ def main():
 
     pprint.pprint(file_list)
 
-    for file in file_list:
-
-        print('\tWorking on {}'.format(os.path.basename(file)))
-
-        if not os.path.exists(args.output):
-            os.makedirs(args.output)
+    srs = ard_clip.get_srs()
 
-        clip_extent = geospatial_hv(h=int(args.hv[0]), v=int(args.hv[1]))
+    for h, v in tiles:
+        clip_extent = ard_clip.geospatial_hv(h=h, v=v)
 
         print('\n------------------------')
 
-        print('Extent of the out layer:\n\t\t\t', clip_extent.y_max,
+        print('Extent of H{:02d}V{:02d}:\n\t\t\t'.format(h, v), clip_extent.y_max,
               '\n\n\t', clip_extent.x_min, '\t\t\t', clip_extent.x_max, '\n\n\t\t\t', clip_extent.y_min)
 
         print('------------------------\n')
 
-        in_file = os.path.basename(file)
-        out_name = os.path.splitext(in_file)[0]
-        out_file = args.output + os.sep + out_name + ".tif"
-
-        print('\tProducing output {}'.format(out_file))
+    for file in file_list:
 
-        run_trans = "gdal_translate -projwin {ulx} {uly} {lrx} {lry} -a_srs {wkt} {src} {dst}".format(
-            ulx=clip_extent.x_min, uly=clip_extent.y_max,
-            lrx=clip_extent.x_max, lry=clip_extent.y_min,
-            wkt=WKT,
-            src=file,
-            dst=out_file)
+        print('\tWorking on {}'.format(os.path.basename(file)))
 
-        subprocess.call(run_trans, shell=True)
+        # the "era" in the Trends file names is dropped from the clipped outputs
+        out_name = re.sub("era", "", os.path.splitext(os.path.basename(file))[0])
 
-        # check if dataset is empty
-        remove_empty(out_file)
+        # tiles that are entirely 0 (no data in Trends) are skipped instead of being written and removed
+        ard_clip.clip_tiles(file, tiles, get_outfile(args.output, out_name, len(tiles) > 1), srs=srs, empty_value=0)
 
     print("\nAll done")
 
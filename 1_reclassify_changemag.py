@@ -15,10 +15,8 @@ Last updated on Tue Apr 25, 2017
 import datetime
 import glob
 import os
-import sys
 import argparse
 import ast
-import numpy as np
 
 try:
     from osgeo import gdal
@@ -26,9 +24,16 @@ try:
 except ImportError:
     import gdal
 
+import output_profile
+import reclassify
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
+# Upper bound of each change magnitude class, values over the last break become class 32
+BREAKS = [0, 650, 750, 800, 850, 950, 1000, 1100, 1200, 1300, 1400, 1500, 1600, 1700, 1900, 2000, 2200, 2300,
+          2500, 2600, 2700, 2900, 3000, 3300, 3500, 3800, 4100, 4700, 5200, 6000, 7000, 9100]
+
 t1 = datetime.datetime.now()
 print (t1.strftime("\n%Y-%m-%d %H:%M:%S\n\n"))
 
@@ -64,79 +69,18 @@ def get_layers(infolder, pattern, y1, y2):
     return rlist
 
 
-def get_array(inrast):
-
-    """Open the input raster and write it to a numpy array
-
-    Args:
-        inrast = the input raster to be opened
-
-    Returns:
-        outarray = the written numpy array
-    """
-
-    tempsrc = gdal.Open(inrast)
-
-    if tempsrc is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(inrast) ))
-
-        sys.exit(1)
-
-    outarray = tempsrc.GetRasterBand(1).ReadAsArray()
-
-    tempsrc = None
-
-    return outarray
-
-
 def array_calc(inarray):
 
-    """Bin the array values
+    """Bin the array values in one pass using BREAKS
 
     Args:
         inarray = the input numpy array
 
     Returns:
-        xarray = the input numpy array with modified values in UInt8 type
+        xarray = the UInt8 array of class values
     """
 
-    inarray[ (inarray == 0) ] = 0
-    inarray[ (inarray > 0) & (inarray <= 650)] = 1
-    inarray[ (inarray > 650) & (inarray <= 750) ] = 2
-    inarray[ (inarray > 750) & (inarray <= 800) ] = 3
-    inarray[ (inarray > 800) & (inarray <= 850) ]= 4
-    inarray[ (inarray > 850) & (inarray <= 950) ] = 5
-    inarray[ (inarray > 950) & (inarray <= 1000) ] = 6
-    inarray [ (inarray > 1000) & (inarray <= 1100) ] = 7
-    inarray [ (inarray > 1100) & (inarray <= 1200) ] = 8
-    inarray [ (inarray > 1200) & (inarray <= 1300) ] = 9
-    inarray [ (inarray > 1300) & (inarray <= 1400) ] = 10
-    inarray [ (inarray > 1400) & (inarray <= 1500) ] = 11
-    inarray [ (inarray > 1500) & (inarray <= 1600) ] = 12
-    inarray [ (inarray > 1600) & (inarray <= 1700) ] = 13
-    inarray [ (inarray > 1700) & (inarray <= 1900) ] = 14
-    inarray [ (inarray > 1900) & (inarray <= 2000) ] = 15
-    inarray [ (inarray > 2000) & (inarray <= 2200) ] = 16
-    inarray [ (inarray > 2200) & (inarray <= 2300) ] = 17
-    inarray [ (inarray > 2300) & (inarray <= 2500) ] = 18
-    inarray [ (inarray > 2500) & (inarray <= 2600) ] = 19
-    inarray [ (inarray > 2600) & (inarray <= 2700) ] = 20
-    inarray [ (inarray > 2700) & (inarray <= 2900) ] = 21
-    inarray [ (inarray > 2900) & (inarray <= 3000) ] = 22
-    inarray [ (inarray > 3000) & (inarray <= 3300) ] = 23
-    inarray [ (inarray > 3300) & (inarray <= 3500) ] = 24
-    inarray [ (inarray > 3500) & (inarray <= 3800) ] = 25
-    inarray [ (inarray > 3800) & (inarray <= 4100) ] = 26
-    inarray [ (inarray > 4100) & (inarray <= 4700) ] = 27
-    inarray [ (inarray > 4700) & (inarray <= 5200) ] = 28
-    inarray [ (inarray > 5200) & (inarray <= 6000) ] = 29
-    inarray [ (inarray > 6000) & (inarray <= 7000) ] = 30
-    inarray [ (inarray > 7000) & (inarray <= 9100) ] = 31
-    inarray [ (inarray > 9100)] = 32
-
-    xarray = inarray.astype( dtype=np.uint8 )
+    xarray = reclassify.classify(inarray, BREAKS)
 
     return xarray
 
@@ -167,76 +111,18 @@ def get_outname(infile, outfolder, pat):
     return outfile
 
 
-def write_raster(raster, srcarray, outfile):
-
-    """Take the reclassified numpy array and write it back to a raster file
-
-    Args:
-        raster = the original raster file
-        srcarray = the input numpy array
-        outfile = the full path to the output raster
-
-
-    Returns:
-        None
-    """
-    #=======================================================================
-    #Do some initial gdal stuff=============================================
-
-    src = gdal.Open(raster)
-
-    if src is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(raster) ))
-
-        sys.exit(1)
-
-    rows = src.RasterYSize
-    cols = src.RasterXSize
-
-    driver = src.GetDriver()
-
-    #GDALDriver::Create() method requires image size,
-    #num. of bands, and band type
-    outraster = driver.Create( outfile, cols, rows,
-                              1, gdal.GDT_Byte )
-
-    if outraster is None:
-
-        print ("Could not create image file {a}".format
-        ( a=os.path.basename(outfile) ))
-
-        sys.exit(1)
-
-    #=======================================================================
-    #write numpy array to the raster========================================
-    outband = outraster.GetRasterBand(1)
-    outband.WriteArray(srcarray, 0, 0)
-
-    #=======================================================================
-    #save data to the disk and set the no data value=========================
-    outband.FlushCache()
-
-    #=======================================================================
-    #georeference the image and set the projection==========================
-    outraster.SetGeoTransform( src.GetGeoTransform() )
-    outraster.SetProjection( src.GetProjection() )
-
-    src, outraster = None, None
-
-    return None
-
-
-def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
+def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False', profile=None):
     """
 
     :param infolder:
     :param outfolder:
     :param fromyear:
     :param toyear:
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     lookfor = "ChangeMagMap"
 
     ovr = ast.literal_eval(ovr)
@@ -258,18 +144,12 @@ def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
 
             print("Processing image ", r)
 
-            array = get_array(r)
-
-            array = array_calc(array)
-
-            write_raster(r, array, output)
+            reclassify.reclassify_raster(r, output, array_calc)
 
         elif file_exists and not ovr:
 
             continue
 
-        array = None
-
 
 def main():
 
@@ -290,6 +170,8 @@ def main():
     parser.add_argument('-ovr', dest='ovr', type=str, required=False, default='False',
                         help="Specify whether or not to overwrite existing products")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
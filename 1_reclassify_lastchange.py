@@ -16,12 +16,10 @@ Last updated on Tue Apr 25, 2017
 """
 
 import os
-import sys
 import glob
 import datetime
 import argparse
 import ast
-import numpy as np
 
 try:
     from osgeo import gdal
@@ -29,9 +27,16 @@ try:
 except ImportError:
     import gdal
 
+import output_profile
+import reclassify
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
+# Upper bound of each class in days, class k holds (k - 1, k] years since the last change and class 31 holds
+# everything over 30 years
+BREAKS = [0] + [365 * k for k in range(1, 31)]
+
 t1 = datetime.datetime.now()
 print (t1.strftime("\n%Y-%m-%d %H:%M:%S\n\n"))
 
@@ -67,84 +72,18 @@ def get_layers(infolder, pattern, y1, y2):
         return rlist
 
 
-def get_array(inrast):
-
-    """Open the input raster and write it to a numpy array
-
-    Args:
-        inrast = the input raster to be opened
-
-    Returns:
-        outarray = the written numpy array
-    """
-
-    tempsrc = gdal.Open(inrast, gdal.GA_ReadOnly)
-
-    if tempsrc is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(inrast) ))
-
-        sys.exit(1)
-
-    outarray = tempsrc.GetRasterBand(1).ReadAsArray()
-
-    tempsrc = None
-
-    return outarray
-
-
 def array_calc(inarray):
 
-    """Bin the array values
+    """Bin the array values in one pass using BREAKS
 
     Args:
         inarray = the input numpy array
 
     Returns:
-        outarray = the input numpy array with modified values
+        outarray = the UInt8 array of class values
     """
 
-    inarray = inarray.astype( dtype=np.float32 )
-    
-    inarray = (inarray / 365.0) * 100.0
-    
-    # inarray = inarray.astype( dtype=np.uint16 )
-
-    inarray [ (inarray == 0) ] = 0
-    inarray [ (inarray > 0) & (inarray <= 100)] = 1
-    inarray [ (inarray > 100) & (inarray <= 200) ] = 2
-    inarray [ (inarray > 200) & (inarray <= 300) ] = 3
-    inarray [ (inarray > 300) & (inarray <= 400) ]= 4
-    inarray [ (inarray > 400) & (inarray <= 500) ] = 5
-    inarray [ (inarray > 500) & (inarray <= 600) ] = 6
-    inarray [ (inarray > 600) & (inarray <= 700) ] = 7
-    inarray [ (inarray > 700) & (inarray <= 800) ] = 8
-    inarray [ (inarray > 800) & (inarray <= 900) ] = 9
-    inarray [ (inarray > 900) & (inarray <= 1000) ] = 10
-    inarray [ (inarray > 1000) & (inarray <= 1100) ] = 11
-    inarray [ (inarray > 1100) & (inarray <= 1200) ] = 12
-    inarray [ (inarray > 1200) & (inarray <= 1300) ] = 13
-    inarray [ (inarray > 1300) & (inarray <= 1400) ] = 14
-    inarray [ (inarray > 1400) & (inarray <= 1500) ] = 15
-    inarray [ (inarray > 1500) & (inarray <= 1600) ] = 16
-    inarray [ (inarray > 1600) & (inarray <= 1700) ] = 17
-    inarray [ (inarray > 1700) & (inarray <= 1800) ] = 18
-    inarray [ (inarray > 1800) & (inarray <= 1900) ] = 19
-    inarray [ (inarray > 1900) & (inarray <= 2000) ] = 20
-    inarray [ (inarray > 2000) & (inarray <= 2100) ] = 21
-    inarray [ (inarray > 2100) & (inarray <= 2200) ] = 22
-    inarray [ (inarray > 2200) & (inarray <= 2300) ] = 23
-    inarray [ (inarray > 2300) & (inarray <= 2400) ] = 24
-    inarray [ (inarray > 2400) & (inarray <= 2500) ] = 25
-    inarray [ (inarray > 2500) & (inarray <= 2600) ] = 26
-    inarray [ (inarray > 2600) & (inarray <= 2700) ] = 27
-    inarray [ (inarray > 2700) & (inarray <= 2800) ] = 28
-    inarray [ (inarray > 2800) & (inarray <= 2900) ] = 29
-    inarray [ (inarray > 2900) & (inarray <= 3000) ] = 30
-    inarray [ (inarray > 3000) ] = 31
-
-    outarray = inarray.astype( dtype=np.uint8 )
+    outarray = reclassify.classify(inarray, BREAKS)
 
     return outarray
 
@@ -177,66 +116,6 @@ def get_outname(infile, outfolder, pat):
     return outfile
 
 
-def write_raster(raster, srcarray, outfile):
-
-    """Take the reclassified numpy array and write it back to a raster file
-
-    Args:
-        raster = the original raster file
-        srcarray = the input numpy array
-        outfile = the full path to the output raster
-
-    Returns:
-        None
-    """
-    # =======================================================================
-    # Do some initial gdal stuff=============================================
-
-    src = gdal.Open(raster, gdal.GA_ReadOnly)
-
-    if src is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(raster) ))
-
-        sys.exit(1)
-
-    rows = src.RasterYSize
-    cols = src.RasterXSize
-
-    driver = src.GetDriver()
-
-    # GDALDriver::Create() method requires image size,
-    # num. of bands, and band type
-    outraster = driver.Create( outfile, cols, rows, 1, gdal.GDT_Byte )
-
-    if outraster is None:
-
-        print ("Could not create image file {a}".format
-        ( a=os.path.basename(outfile) ))
-
-        sys.exit(1)
-
-    #=======================================================================
-    #write numpy array to the raster========================================
-    outband = outraster.GetRasterBand(1)
-    outband.WriteArray(srcarray, 0, 0)
-
-    #=======================================================================
-    #save data to the disk and set the nodata value=========================
-    outband.FlushCache()
-    # outband.SetNoDataValue(255)
-
-    #=======================================================================
-    #georeference the image and set the projection==========================
-    outraster.SetGeoTransform( src.GetGeoTransform() )
-    outraster.SetProjection( src.GetProjection() )
-
-    src, outraster = None, None
-
-    return None
-
-
 def usage():
     
     print("\n\t[-i Full path to the input File Directory]\n" \
@@ -251,15 +130,18 @@ def usage():
     return None
 
 
-def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
+def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False', profile=None):
     """
 
     :param infolder:
     :param outfolder:
     :param fromyear:
     :param toyear:
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     lookfor = "LastChange"
 
     ovr = ast.literal_eval(ovr)
@@ -281,18 +163,12 @@ def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
 
             print("Processing image ", r)
 
-            array = get_array(r)
-
-            array = array_calc(array)
-
-            write_raster(r, array, output)
+            reclassify.reclassify_raster(r, output, array_calc)
 
         elif file_exists and not ovr:
 
             continue
 
-        array = None
-
 
 def main():
 
@@ -313,6 +189,8 @@ def main():
     parser.add_argument('-ovr', dest='ovr', type=str, required=False, default='False',
                         help="Specify whether or not to overwrite existing products")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
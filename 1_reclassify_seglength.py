@@ -16,10 +16,8 @@ Last updated on Tue Apr 25, 2017
 import datetime
 import glob
 import os
-import sys
 import argparse
 import ast
-import numpy as np
 
 try:
     from osgeo import gdal
@@ -27,9 +25,16 @@ try:
 except ImportError:
     import gdal
 
+import output_profile
+import reclassify
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
+# Upper bound of each segment length class in days, values over the last break become class 29
+BREAKS = [0, 100, 250, 500, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 5750, 6000, 6500, 6750,
+          7000, 7500, 8000, 8500, 9000, 9500, 10000, 10500, 11000, 11500, 12000]
+
 t1 = datetime.datetime.now()
 print (t1.strftime("\n%Y-%m-%d %H:%M:%S\n\n"))
 
@@ -65,76 +70,18 @@ def get_layers(infolder, pattern, y1, y2):
         return rlist
 
 
-def get_array(inrast):
-
-    """Open the input raster and write it to a numpy array
-
-    Args:
-        inrast = the input raster to be opened
-
-    Returns:
-        outarray = the written numpy array
-    """
-
-    tempsrc = gdal.Open(inrast)
-
-    if tempsrc is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(inrast) ))
-
-        sys.exit(1)
-
-    outarray = tempsrc.GetRasterBand(1).ReadAsArray()
-
-    tempsrc = None
-
-    return outarray
-
-
 def array_calc(inarray):
 
-    """Bin the array values
+    """Bin the array values in one pass using BREAKS
 
     Args:
         inarray = the input numpy array
 
     Returns:
-        outarray = the input numpy array with modified values
+        outarray = the UInt8 array of class values
     """
 
-    inarray[ (inarray == 0) ] = 0
-    inarray[ (inarray > 0) & (inarray <= 100)] = 1
-    inarray[ (inarray > 100) & (inarray <= 250) ] = 2
-    inarray[ (inarray > 250) & (inarray <= 500) ] = 3
-    inarray[ (inarray > 500) & (inarray <= 1000) ]= 4
-    inarray[ (inarray > 1000) & (inarray <= 1500) ] = 5
-    inarray[ (inarray > 1500) & (inarray <= 2000) ] = 6
-    inarray [ (inarray > 2000) & (inarray <= 2500) ] = 7
-    inarray [ (inarray > 2500) & (inarray <= 3000) ] = 8
-    inarray [ (inarray > 3000) & (inarray <= 3500) ] = 9
-    inarray [ (inarray > 3500) & (inarray <= 4000) ] = 10
-    inarray [ (inarray > 4000) & (inarray <= 4500) ] = 11
-    inarray [ (inarray > 4500) & (inarray <= 5000) ] = 12
-    inarray [ (inarray > 5000) & (inarray <= 5500) ] = 13
-    inarray [ (inarray > 5500) & (inarray <= 5750) ] = 14
-    inarray [ (inarray > 5750) & (inarray <= 6000) ] = 15
-    inarray [ (inarray > 6000) & (inarray <= 6500) ] = 16
-    inarray [ (inarray > 6500) & (inarray <= 6750) ] = 17
-    inarray [ (inarray > 6750) & (inarray <= 7000) ] = 18
-    inarray [ (inarray > 7000) & (inarray <= 7500) ] = 19
-    inarray [ (inarray > 7500) & (inarray <= 8000) ] = 20
-    inarray [ (inarray > 8000) & (inarray <= 8500) ] = 21
-    inarray [ (inarray > 8500) & (inarray <= 9000) ] = 22
-    inarray [ (inarray > 9000) & (inarray <= 9500) ] = 23
-    inarray [ (inarray > 9500) & (inarray <= 10000) ] = 24
-    inarray [ (inarray > 10000) & (inarray <= 10500) ] = 25
-    inarray [ (inarray > 10500) & (inarray <= 11000) ] = 26
-    inarray [ (inarray > 11000) & (inarray <= 11500) ] = 27
-    inarray [ (inarray > 11500) & (inarray <= 12000) ] = 28
-    inarray [ (inarray > 12000)] = 29
-
-    outarray = inarray.astype( dtype=np.uint8 )
+    outarray = reclassify.classify(inarray, BREAKS)
 
     return outarray
 
@@ -169,75 +116,18 @@ def get_outname(infile, outfolder, pat):
     return outfile
 
 
-def write_raster(raster, srcarray, outfile):
-
-    """Take the reclassified numpy array and write it back to a raster file
-
-    Args:
-        raster = the original raster file
-        srcarray = the input numpy array
-        outfile = the full path to the output raster
-
-    Returns:
-        None
-    """
-    #=======================================================================
-    #Do some initial gdal stuff=============================================
-
-    src = gdal.Open(raster)
-
-    if src is None:
-
-        print ("Could not open image file {a}".format
-        ( a=os.path.basename(raster) ))
-
-        sys.exit(1)
-
-    rows = src.RasterYSize
-    cols = src.RasterXSize
-
-    driver = src.GetDriver()
-
-    #GDALDriver::Create() method requires image size,
-    #num. of bands, and band type
-    outraster = driver.Create( outfile, cols, rows, 1, gdal.GDT_Byte )
-
-    if outraster is None:
-
-        print ("Could not create image file {a}".format
-        ( a=os.path.basename(outfile) ))
-
-        sys.exit(1)
-
-    #=======================================================================
-    #write numpy array to the raster========================================
-    outband = outraster.GetRasterBand(1)
-    outband.WriteArray(srcarray, 0, 0)
-
-    #=======================================================================
-    #save data to the disk and set the nodata value=========================
-    outband.FlushCache()
-    # outband.SetNoDataValue(255)
-
-    #=======================================================================
-    #georeference the image and set the projection==========================
-    outraster.SetGeoTransform( src.GetGeoTransform() )
-    outraster.SetProjection( src.GetProjection() )
-
-    src, outraster = None, None
-
-    return None
-
-
-def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
+def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False', profile=None):
     """
 
     :param infolder:
     :param outfolder:
     :param fromyear:
     :param toyear:
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     lookfor = "SegLength"
 
     ovr = ast.literal_eval(ovr)
@@ -263,18 +153,12 @@ def main_work(infolder, outfolder, fromyear=1984, toyear=2015, ovr='False'):
 
             print("Processing image ", r)
 
-            array = get_array(r)
-
-            array = array_calc(array)
-
-            write_raster(r, array, output)
+            reclassify.reclassify_raster(r, output, array_calc)
 
         elif file_exists and not ovr:
 
             continue
 
-        array = None
-
 
 def main():
     
@@ -295,6 +179,8 @@ def main():
     parser.add_argument('-ovr', dest='ovr', type=str, required=False, default='False',
                         help="Specify whether or not to overwrite existing products")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
@@ -61,12 +61,15 @@ NLCDClass	NLCDClassName								RecodedNLCDClass	CCDC Class
 import os
 import sys
 import glob
-import numpy as np
+import functools
 from osgeo import gdal
 import datetime
 
 import argparse
 
+import output_profile
+import reclassify
+
 t1 = datetime.datetime.now()
 
 print (t1.strftime("%Y-%m-%d %H:%M:%S\n")    )
@@ -74,11 +77,20 @@ print (t1.strftime("%Y-%m-%d %H:%M:%S\n")    )
 gdal.UseExceptions()
 gdal.AllRegister()
 
+# NLCD class -> PyCCD class, classes that aren't listed keep their value
+RECODE_1992 = {11: 5, 12: 7, 21: 1, 22: 1, 23: 1, 31: 8, 32: 1, 33: 8, 41: 4, 42: 4, 43: 4, 51: 3, 61: 2, 71: 3,
+               81: 81, 82: 2, 83: 2, 84: 2, 85: 1, 91: 6, 92: 6}
 
-def recode_nlcd(indir, outdir=None):
+RECODE_2001 = {11: 5, 12: 7, 21: 1, 22: 1, 23: 1, 24: 1, 31: 8, 41: 4, 42: 4, 43: 4, 51: 0, 52: 3, 71: 3, 72: 3,
+               73: 0, 74: 0, 81: 81, 82: 2, 90: 6, 95: 6}
+
+LUT_1992 = reclassify.get_lut(RECODE_1992)
+
+LUT_2001 = reclassify.get_lut(RECODE_2001)
+
+
+def recode_nlcd(indir, outdir=None, blocksize=1024):
 
-    driver = gdal.GetDriverByName("GTiff")
-    
     in_nlcd_list = glob.glob(indir + "*.img")
 
     if len(in_nlcd_list) == 0:
@@ -95,66 +107,17 @@ def recode_nlcd(indir, outdir=None):
         
         print("Working on recoding {}\n".format(os.path.basename(nlcd)))
 
-        src = gdal.Open(nlcd, gdal.GA_ReadOnly)
-        
-        srcdata = src.GetRasterBand(1).ReadAsArray()
-        
-        holder = np.copy(srcdata)
-        
         if os.path.basename(nlcd)[5:9] == "1992":
 
-            holder[srcdata == 11] = 5
-            holder[srcdata == 12] = 7
-            holder[srcdata == 21] = 1
-            holder[srcdata == 22] = 1
-            holder[srcdata == 23] = 1
-            holder[srcdata == 31] = 8
-            holder[srcdata == 32] = 1
-            holder[srcdata == 33] = 8
-            holder[srcdata == 41] = 4
-            holder[srcdata == 42] = 4
-            holder[srcdata == 43] = 4
-            holder[srcdata == 51] = 3
-            holder[srcdata == 61] = 2
-            holder[srcdata == 71] = 3
-            holder[srcdata == 81] = 81
-            holder[srcdata == 82] = 2
-            holder[srcdata == 83] = 2
-            holder[srcdata == 84] = 2
-            holder[srcdata == 85] = 1
-            holder[srcdata == 91] = 6
-            holder[srcdata == 92] = 6
+            lut = LUT_1992
 
         else:
 
-            holder[ srcdata == 11 ] = 5
-            holder[ srcdata == 12 ] = 7
-            holder[ srcdata == 21 ] = 1
-            holder[ srcdata == 22 ] = 1
-            holder[ srcdata == 23 ] = 1
-            holder[ srcdata == 24 ] = 1
-            holder[ srcdata == 31 ] = 8
-            holder[ srcdata == 41 ] = 4
-            holder[ srcdata == 42 ] = 4
-            holder[ srcdata == 43 ] = 4
-            holder[ srcdata == 51 ] = 0
-            holder[ srcdata == 52 ] = 3
-            holder[ srcdata == 71 ] = 3
-            holder[ srcdata == 72 ] = 3
-            holder[ srcdata == 73 ] = 0
-            holder[ srcdata == 74 ] = 0
-            holder[ srcdata == 81 ] = 81
-            holder[ srcdata == 82 ] = 2
-            holder[ srcdata == 90 ] = 6
-            holder[ srcdata == 95 ] = 6
+            lut = LUT_2001
 
-        
         root, file = os.path.split(nlcd)
         fname, ext = os.path.splitext(file)
         
-        rows = src.RasterYSize
-        cols = src.RasterXSize
-        
         if outdir is None:
         
             outdir = root + os.sep + "pyccd_recode"
@@ -165,22 +128,12 @@ def recode_nlcd(indir, outdir=None):
         
         outname = outdir + os.sep + fname + "_recode.tif"
         
-        outraster = driver.Create(outname, cols, rows, 1, gdal.GDT_Byte)
-        
         print("Generating output file {}\n".format(os.path.basename(outname)))
 
-        outband = outraster.GetRasterBand(1)
-        
-        outband.WriteArray(holder, 0, 0)
-        
-        outband.FlushCache()
-        outband.SetNoDataValue(0)
-        
-        outraster.SetGeoTransform( src.GetGeoTransform() )
-        outraster.SetProjection( src.GetProjection() )
-        
-        src, srcdata, holder, outraster = None, None, None, None
-        
+        reclassify.reclassify_raster(nlcd, outname, functools.partial(reclassify.recode, lut=lut), fformat="GTiff",
+                                     nodata=0, blocksize=blocksize)
+
+
 def main():
     
     parser = argparse.ArgumentParser()
@@ -190,14 +143,21 @@ def main():
     
     parser.add_argument('-o', '--output', type=str, required=False,
                         help='Full path to the output location')
+
+    parser.add_argument('-bs', '--blocksize', type=int, required=False, default=1024,
+                        help='Number of rows and columns to recode at a time')
+
+    output_profile.add_argument(parser)
     
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     in_nlcd_dir = args.input
     
     out_nlcd_dir = args.output
     
-    recode_nlcd(in_nlcd_dir, out_nlcd_dir)
+    recode_nlcd(in_nlcd_dir, out_nlcd_dir, args.blocksize)
     
 if __name__ == '__main__':
     
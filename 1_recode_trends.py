@@ -21,21 +21,26 @@ Trends --> PyCCD Class Scheme
 import os
 import sys
 import glob
-import numpy as np
-from osgeo import gdal
+import functools
 import datetime
 
 import argparse
 
+import output_profile
+import reclassify
+
 t1 = datetime.datetime.now()
 
 print (t1.strftime("%Y-%m-%d %H:%M:%S\n")    )
 
+# Trends class -> PyCCD class, classes that aren't listed keep their value
+RECODE = {1: 5, 2: 1, 3: 9, 4: 1, 5: 8, 6: 4, 7: 3, 8: 2, 9: 6, 10: 9, 11: 7}
 
-def recode_trends(indir, outdir=None):
+LUT = reclassify.get_lut(RECODE)
+
+
+def recode_trends(indir, outdir=None, blocksize=1024):
 
-    driver = gdal.GetDriverByName("GTiff")
-    
     in_trends_list = glob.glob(indir + "*.img")
 
     if len(in_trends_list) == 0:
@@ -52,30 +57,9 @@ def recode_trends(indir, outdir=None):
         
         print("Working on recoding {}\n".format(os.path.basename(trends)))
 
-        src = gdal.Open(trends, gdal.GA_ReadOnly)
-        
-        srcdata = src.GetRasterBand(1).ReadAsArray()
-        
-        holder = np.copy(srcdata)
-        
-        holder[ srcdata == 1 ] = 5
-        holder[ srcdata == 2 ] = 1
-        holder[ srcdata == 3 ] = 9
-        holder[ srcdata == 4 ] = 1
-        holder[ srcdata == 5 ] = 8
-        holder[ srcdata == 6 ] = 4
-        holder[ srcdata == 7 ] = 3
-        holder[ srcdata == 8 ] = 2
-        holder[ srcdata == 9 ] = 6
-        holder[ srcdata == 10 ] = 9
-        holder[ srcdata == 11 ] = 7
-        
         root, file = os.path.split(trends)
         fname, ext = os.path.splitext(file)
         
-        rows = src.RasterYSize
-        cols = src.RasterXSize
-        
         if outdir is None:
         
             outdir = root + os.sep + "pyccd_recode"
@@ -86,22 +70,12 @@ def recode_trends(indir, outdir=None):
         
         outname = outdir + os.sep + fname + "_recode.tif"
         
-        outraster = driver.Create(outname, cols, rows, 1, gdal.GDT_Byte)
-        
         print("Generating output file {}\n".format(os.path.basename(outname)))
 
-        outband = outraster.GetRasterBand(1)
-        
-        outband.WriteArray(holder, 0, 0)
-        
-        outband.FlushCache()
-        outband.SetNoDataValue(0)
-        
-        outraster.SetGeoTransform( src.GetGeoTransform() )
-        outraster.SetProjection( src.GetProjection() )
-        
-        src, srcdata, holder, outraster = None, None, None, None
-        
+        reclassify.reclassify_raster(trends, outname, functools.partial(reclassify.recode, lut=LUT), fformat="GTiff",
+                                     nodata=0, blocksize=blocksize)
+
+
 def main():
     
     parser = argparse.ArgumentParser()
@@ -111,14 +85,21 @@ def main():
     
     parser.add_argument('-o', '--output', type=str, required=False,
                         help='Full path to the output location')
+
+    parser.add_argument('-bs', '--blocksize', type=int, required=False, default=1024,
+                        help='Number of rows and columns to recode at a time')
+
+    output_profile.add_argument(parser)
     
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     in_trends_dir = args.input
     
     out_trends_dir = args.output
     
-    recode_trends(in_trends_dir, out_trends_dir)
+    recode_trends(in_trends_dir, out_trends_dir, args.blocksize)
     
 if __name__ == '__main__':
     
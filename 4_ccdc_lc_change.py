@@ -7,12 +7,13 @@ Usage: Calculate the from-to class-to-class comparison between each year at a
 user-specified interval and also between user-specified end-years
 """
 import datetime
-import glob
 import os
 import sys
 import argparse
-import numpy as np
 import gdal
+
+import catalog
+import output_profile
 # import re
 
 
@@ -24,128 +25,127 @@ def get_time():
     return datetime.datetime.now()
 
 
-def get_inlayers(infolder, name, y1, y2, inty):
-    """Generate a list of the input change map layers with full paths
+def get_pairs(y1, y2, intervals):
+    """Generate the from/to year pairs for each interval length
 
     Args:
-        infolder = the directory containing the annual change map layers
-        y1 = the 'from' year
-        y2 = the 'to' year
-        inty = the year interval
-        name = the cover product
+        y1 = the first 'from' year
+        y2 = the last 'to' year
+        intervals = list of year intervals, each one steps from y1 toward y2
 
     Returns:
-        templist = the complete list of change map raster files
-        - or -
-        flist = the clipped list of change map raster files based on y1, y2
-        ylist = the list of years present
+        pairs = sorted list of (from year, to year) tuples
     """
 
-    templist = glob.glob("{}{}*{}*.tif".format(infolder, os.sep, name))
-
-    templist.sort()
-
-    if y1 == None or y2 == None:
-
-        return templist
+    pairs = set()
 
-    else:
+    for inty in intervals:
 
-        ylist = [y for y in range(int(y1), int(y2) + 1, int(inty))]
+        pairs.update((y, y + inty) for y in range(int(y1), int(y2) - inty + 1, inty))
 
-        flist = [r for y in ylist for r in templist if str(y) in r]
+    return sorted(pairs, key=lambda p: (p[1], p[0]))
 
-        return flist
 
-
-def get_outlayers(inrasters, outfolder, years):
-    """Generate a list of output rasters containing full paths
+def get_outlayers(pairs, outfolder):
+    """Generate the output rasters containing full paths
 
     Args:
-        inrasters = list of the input rasters containing full paths
+        pairs = list of (from year, to year) tuples
         outfolder = the full path to the output folder
 
     Return:
-        outlist = list of output rasters to be created
+        outdict = dict of output rasters to be created, keyed by (from year, to year)
     """
 
-    # years = [re.search(r'\d+', os.path.basename(r)).group() for r in inrasters]
-
-    outlist = ["{}{}ccdc{}to{}lcc.tif".format(outfolder, os.sep, years[i - 1], years[i]) \
-               for i in range(1, len(inrasters))]
+    outdict = {(a, b): "{}{}ccdc{}to{}lcc.tif".format(outfolder, os.sep, a, b) for a, b in pairs}
 
-    return outlist
+    return outdict
 
 
 def do_calc(in_files, out_files):
-    """Generate the output layers containing the from/to class comparisons
+    """Generate the output layers containing the from/to class comparisons.  The stack is traversed once in year
+    order and each year is read one time; an array is kept only while a later pair still uses it as the 'from'
+    year, so with a 1-year interval the 'to' array of one pair becomes the 'from' array of the next.
 
     Args:
-        in_files = the current input raster file list
-        out_files = the output raster file list
+        in_files = dict of the input raster files keyed by year
+        out_files = dict of the output raster files keyed by (from year, to year)
 
     Returns:
         None
     """
 
-    driver = gdal.GetDriverByName("GTiff")
+    pairs = [p for p in sorted(out_files, key=lambda p: (p[1], p[0])) if not os.path.exists(out_files[p])]
+
+    if not pairs:
+        return None
+
+    for year in set(y for p in pairs for y in p):
 
-    src0 = gdal.Open(in_files[0])
+        if year not in in_files:
+            print("\nCould not find an input raster for year {}".format(year))
+
+            sys.exit(1)
+
+    src0 = gdal.Open(in_files[pairs[0][0]], gdal.GA_ReadOnly)
 
     rows = src0.RasterYSize
     cols = src0.RasterXSize
 
-    srcdata0 = src0.GetRasterBand(1).ReadAsArray()
+    geo = src0.GetGeoTransform()
+    prj = src0.GetProjection()
 
-    from_to = np.zeros_like(srcdata0, dtype=np.int8)
+    src0 = None
 
-    for index, infile in enumerate(in_files):
+    held = {}
 
-        if index < len(in_files) - 1:
+    for year in sorted(set(y for p in pairs for y in p)):
 
-            if not os.path.exists(out_files[index]):
+        src = gdal.Open(in_files[year], gdal.GA_ReadOnly)
 
-                print("processing input files {} and {}".format(os.path.basename(infile),
-                                                                os.path.basename(in_files[index + 1])))
+        held[year] = src.GetRasterBand(1).ReadAsArray()
 
-                print("\tgenerating output file {}".format(os.path.basename(out_files[index])))
+        src = None
 
-                src1 = gdal.Open(infile, gdal.GA_ReadOnly)
+        for a, b in [p for p in pairs if p[1] == year]:
 
-                src1data = src1.GetRasterBand(1).ReadAsArray()
+            print("processing input files {} and {}".format(os.path.basename(in_files[a]),
+                                                            os.path.basename(in_files[b])))
 
-                src2 = gdal.Open(in_files[index + 1], gdal.GA_ReadOnly)
+            print("\tgenerating output file {}".format(os.path.basename(out_files[(a, b)])))
 
-                src2data = src2.GetRasterBand(1).ReadAsArray()
+            from_to = (held[a] * 10) + held[b]
 
-                from_to = (src1data * 10) + src2data
+            outfile = output_profile.create(out_files[(a, b)], cols, rows, 1, gdal.GDT_Byte)
 
-                outfile = driver.Create(out_files[index], cols, rows, 1, gdal.GDT_Byte)
+            if outfile is None:
+                print("\nCould not create image file {a}".format
+                      (a=os.path.basename(out_files[(a, b)])))
 
-                if outfile is None:
-                    print("\nCould not create image file {a}".format
-                          (a=os.path.basename(out_files[index])))
+                sys.exit(1)
 
-                    sys.exit(1)
+            outband = outfile.GetRasterBand(1)
+            outband.WriteArray(from_to, 0, 0)
 
-                outband = outfile.GetRasterBand(1)
-                outband.WriteArray(from_to, 0, 0)
+            outband.FlushCache()
+            # outband.SetNoDataValue(255)
 
-                outband.FlushCache()
-                # outband.SetNoDataValue(255)
+            outfile.SetGeoTransform(geo)
+            outfile.SetProjection(prj)
 
-                outfile.SetGeoTransform(src0.GetGeoTransform())
-                outfile.SetProjection(src0.GetProjection())
+            output_profile.finish(outfile, out_files[(a, b)])
 
-            # reset this array to all zeros, possibly not necessary
-            from_to = from_to * 0
+            from_to, outband, outfile = None, None, None
 
-            src1, src2, src1data, src2data, outfile = None, None, None, None, None
+        # drop the arrays that no remaining pair reads from
+        remaining = set(p[0] for p in pairs if p[1] > year)
+
+        held = {y: arr for y, arr in held.items() if y in remaining}
 
     return None
 
 
-def main_work(inputdir, outputdir, name, y1, y2, interval=None):
+def main_work(inputdir, outputdir, name, y1, y2, interval=None, profile=None):
     """
 
     :param inputdir:
@@ -153,9 +153,12 @@ def main_work(inputdir, outputdir, name, y1, y2, interval=None):
     :param name:
     :param y1:
     :param y2:
-    :param interval:
+    :param interval: <list> One or more year intervals, each producing its own set of from/to pairs
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     if not os.path.exists(outputdir):
         os.mkdir(outputdir)
 
@@ -167,17 +170,22 @@ def main_work(inputdir, outputdir, name, y1, y2, interval=None):
         os.makedirs(outputdir)
 
     if interval is None:
-        interval = int(y2) - int(y1)
+        interval = [int(y2) - int(y1)]
 
-    years = [y for y in range(int(y1), int(y2)+1, interval)]
+    elif isinstance(interval, int):
+        interval = [interval]
 
-    infiles = get_inlayers(inputdir, name, y1, y2, interval)
+    pairs = get_pairs(y1, y2, interval)
 
-    print("\nInput files are: {}\n".format(infiles))
+    years = sorted(set(y for p in pairs for y in p))
 
-    outfiles = get_outlayers(infiles, outputdir, years)
+    infiles = {int(catalog.get_year(r)): r for r in catalog.get_files(inputdir, product=name, years=years)}
 
-    print("\nOut files are: {}\n".format(outfiles))
+    print("\nInput files are: {}\n".format([infiles[y] for y in sorted(infiles)]))
+
+    outfiles = get_outlayers(pairs, outputdir)
+
+    print("\nOut files are: {}\n".format([outfiles[p] for p in pairs]))
 
     print("\nYears are: {}\n".format(years))
 
@@ -205,8 +213,12 @@ def main():
     parser.add_argument('-y2', dest='y2', type=str, required=True,
                         help='Specify year 2 of the land cover change')
 
-    parser.add_argument('-int', dest='interval', type=int, required=False,
-                        help='Specify the year interval between years 1 and 2.  The default will be year 2 - year 1.')
+    parser.add_argument('-int', dest='interval', type=int, nargs='+', required=False,
+                        help='Specify one or more year intervals between years 1 and 2 (e.g. -int 1 5).  All '
+                             'intervals are produced from one pass over the inputs.  The default will be '
+                             'year 2 - year 1.')
+
+    output_profile.add_argument(parser)
 
     args = parser.parse_args()
 
@@ -7,15 +7,16 @@ Usage: Calculate the from-to class-to-class comparison between each year at a
 user-specified interval and also between user-specified end-years
 """
 import datetime
-import glob
 import os
 import sys
 import argparse
-import re
 import itertools
 import numpy as np
 import gdal
 
+import catalog
+import output_profile
+
 
 def get_time():
     """
@@ -47,7 +48,7 @@ def get_inlayers(infolder, name, years):
 
         name = "Trends"
 
-    filelist = sorted(glob.glob("{}{}*.tif".format(infolder, os.sep)))
+    filelist = catalog.get_files(infolder)
 
     print("\nFound files {}".format(filelist))
 
@@ -57,7 +58,7 @@ def get_inlayers(infolder, name, years):
 
         sys.exit(0)
 
-    yearlist = [re.search(r'\d+', os.path.basename(f)).group() for f in filelist]
+    yearlist = [catalog.get_year(f) for f in filelist]
 
     print("\nFound years {}".format(yearlist))
 
@@ -97,8 +98,6 @@ def do_calc(name, file_fromto, year_fromto, outdir):
     :param outdir:
     :return:
     """
-    driver = gdal.GetDriverByName("GTiff")
-
     for ind, files in enumerate(file_fromto):
 
         out_name = outdir + os.sep + "{}{}to{}lcc.tif".format(name, year_fromto[ind][0], year_fromto[ind][1])
@@ -124,7 +123,7 @@ def do_calc(name, file_fromto, year_fromto, outdir):
 
         from_to = (data1 * 100) + data2
 
-        outfile = driver.Create(out_name, cols, rows, 1, gdal.GDT_Int16)
+        outfile = output_profile.create(out_name, cols, rows, 1, gdal.GDT_Int16)
 
         if outfile is None:
             print("\nCould not create image file {a}".format(a=os.path.basename(out_name)))
@@ -140,12 +139,14 @@ def do_calc(name, file_fromto, year_fromto, outdir):
         outfile.SetGeoTransform(src1.GetGeoTransform())
         outfile.SetProjection(src1.GetProjection())
 
+        output_profile.finish(outfile, out_name)
+
         src1, src2, srcdata1, srcdata2, data1, data2, outfile = None, None, None, None, None, None, None
 
     return None
 
 
-def main_work(inputdir, outputdir, name, years=None):
+def main_work(inputdir, outputdir, name, years=None, profile=None):
     """
 
     :param inputdir:
@@ -153,8 +154,11 @@ def main_work(inputdir, outputdir, name, years=None):
     :param name:
     :param y1:
     :param y2:
+    :param profile: The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     if not os.path.exists(outputdir):
 
         os.mkdir(outputdir)
@@ -186,6 +190,8 @@ def main():
     parser.add_argument("-years", dest='years', type=str, nargs=2, required=False,
                         help="Specify Year 1 and Year 2 for the land cover comparison")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
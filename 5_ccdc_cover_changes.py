@@ -12,11 +12,8 @@ the given range.
 
 """
 import datetime
-import glob
 import os
-import subprocess
 import sys
-from shutil import copy2
 
 import numpy as np
 
@@ -26,6 +23,12 @@ try:
 except ImportError:
     import gdal
 
+import band_math
+import catalog
+import histogram
+import output_profile
+import palette
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
@@ -53,21 +56,15 @@ def get_inlayers(infolder, name, y1, y2):
     
     """
 
-    templist = glob.glob("{}{}*{}*.tif".format(infolder, os.sep, name))
-
-    templist.sort()
-
     if y1 is None or y2 is None:
 
-        return templist
+        return catalog.get_files(infolder, product=name)
 
     else:
 
         ylist = [y for y in range(int(y1), int(y2) + 1)]
 
-        flist = [r for y in ylist for r in templist if str(y) in r]
-
-        return flist
+        return catalog.get_files(infolder, product=name, years=ylist)
 
 
 def get_outlayers(inrasters, outfolder, name):
@@ -86,271 +83,118 @@ def get_outlayers(inrasters, outfolder, name):
     
     """
 
-    years = []
-
-    for r in range(len(inrasters)):
-
-        base = os.path.splitext(os.path.basename(inrasters[r]))[0]
-
-        pieces = base.split("_")
-
-        for piece in pieces:
-
-            if len(piece) == 4:
-
-                try:
-                    int(piece)
-
-                    years.append(piece)
-
-                except ValueError:
-                    continue
-
-        # years.append(fname[-4:])
+    years = [catalog.get_year(r) for r in inrasters]
 
     outlist = ["{}{}{}{}to{}ct.tif".format(outfolder, os.sep, name, years[0], years[i]) for i in range(len(inrasters))]
 
     return outlist, years
 
 
-def do_calc(in_files, out_r):
+def do_calc(in_files, out_files, blocksize=1024):
     """
-    
-    Generate the output layers and add color ramps for the default
-    from/to years (i.e. the min and max years present)
+
+    Generate the cumulative number of cover changes per pixel for every
+    requested year in a single pass over the cover map stack.  The stack is
+    scanned one block at a time, carrying the most recent valid class
+    ("holder") of each pixel in the block from year to year, so only one
+    block of each layer is held in memory.  The histogram of each output is
+    tallied as it is written and saved to the histogram catalog, so the
+    plots never have to read the outputs again.
 
     Args:
         in_files: <list> contains strings representing full paths to input rasters
-        out_r: <string> the full path of the output raster file
+        out_files: <dict> maps an index of in_files to the full path of the
+                   output raster holding the number of changes from
+                   in_files[0] through in_files[index]
+        blocksize: <int> maximum number of rows and columns in a block
 
     Returns:
         None
-    
+
     """
 
-    driver = gdal.GetDriverByName("GTiff")
+    srcs = [gdal.Open(infile, gdal.GA_ReadOnly) for infile in in_files]
 
-    src0 = gdal.Open(in_files[0])
+    src0 = srcs[0]
 
     rows = src0.RasterYSize
     cols = src0.RasterXSize
 
-    srcdata0 = src0.GetRasterBand(1).ReadAsArray()
-
-    # Create a copy of the first cover map to contain "holder" values
-    # which will be used to compare future values to determine
-    # whether a change has occurred.  Each element's value will be updated
-    # each time that a valid class change occurs.
-    holder = np.copy(srcdata0)
-
-    # an array of zeros that will contain the summed number of changes
-    # per pixel
-    sum_change = np.zeros_like(holder, dtype=np.int8)
-
-    for index, infile in enumerate(in_files):
-
-        tempmask = np.zeros_like(holder, dtype=np.int8)
-
-        # skip the first file in the input files list
-        if index == 0:
-
-            continue
-
-        # The current cover map being tested
-        tempsrc = gdal.Open(infile, gdal.GA_ReadOnly)
-
-        # The current cover map converted to a numpy array
-        tempdata = tempsrc.GetRasterBand(1).ReadAsArray()
+    outs = dict()
 
-        if index == 1:
-            # For the first year after year 0, we don't want to include
-            # class 9 in year 0 changing to any other class as a 
-            # countable change, so replace it with the value that exists in 
-            # the following year.
-            holder[holder == 9] = tempdata[holder == 9]
+    hists = {index: dict() for index in out_files.keys()}
 
-            # Do the same for any "insufficient data" class 0 instances
-            holder[holder == 0] = tempdata[holder == 0]
+    for index, out_r in out_files.items():
 
-        # recode class 9 to previous non-9 class value (i.e. no change)
-        tempdata[tempdata == 9] = holder[tempdata == 9]
+        outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_Byte)
 
-        # do the same for class 0
-        tempdata[tempdata == 0] = holder[tempdata == 0]
-
-        # any classes in current year that don't equal the class in holder
-        # are flagged as change with value of 1
-        tempmask[tempdata != holder] = 1
-
-        # update holder elements with most recent changed classes
-        holder[tempdata != holder] = tempdata[tempdata != holder]
-
-        # sum the current number of changes
-        sum_change = sum_change + tempmask
-
-        # reset these temporary datasources to None
-        tempsrc, tempdata = None, None
-
-    outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
-
-    if outfile is None:
-        print("\nCould not create image file {a}".format
-              (a=os.path.basename(out_r)))
-
-        sys.exit(1)
-
-    outband = outfile.GetRasterBand(1)
-    outband.WriteArray(sum_change, 0, 0)
-
-    outband.FlushCache()
-    # outband.SetNoDataValue(255)
-
-    outfile.SetGeoTransform(src0.GetGeoTransform())
-    outfile.SetProjection(src0.GetProjection())
-
-    src0, outfile = None, None
-
-    return None
-
-
-def add_color_table(in_vrt, clr_table, dtype):
-    """
-    
-    Write color map info to a VRT file
-
-    Args:
-        in_vrt: <string> path to the input VRT file
-        clr_table: <string> path to the input color table (.txt)
-        dtype: <string> the bit depth of the original raster
-    
-    Return:
-        out_vrt: <string> path to the VRT with color map info written to it
-    
-    """
+        if outfile is None:
+            print("\nCould not create image file {a}".format
+                  (a=os.path.basename(out_r)))
 
-    color_table = open(clr_table, "r")
-
-    (dirName, fileName) = os.path.split(in_vrt)
-    (fileBase, fileExt) = os.path.splitext(fileName)
-
-    out_vrt = r"{0}{1}zzzzz{2}_temp.vrt".format(dirName, os.sep, fileBase)
-
-    in_txt = open(in_vrt, 'r+')
-    out_txt = open(out_vrt, 'w')
-
-    with open(in_vrt, 'r+') as in_txt, open(out_vrt, "w") as out_txt:
-
-        # key is the line after which to insert the color table in the VRT
-        key = '<VRTRasterBand dataType="{0}" band="1">'.format(dtype)
-
-        # subkey is a line that doesn't need to be in the new VRT text
-        subkey = "   <ColorInterp>Gray</ColorInterp>"
-
-        # get lines in a list
-        txt_read = in_txt.readlines()
-
-        for line in txt_read:
-
-            if subkey in line:
-
-                continue
-
-            else:
-
-                writetxt = r"{0}".format(line)
-
-                out_txt.write(writetxt)
-
-                # insert color table following keywords
-                if key in line:
-
-                    # print "\nFound the key!\n"
-                    color_read = color_table.readlines()
-
-                    # print 'writing color table to vrt'
-                    for ln in color_read:
-                        out_txt.write(ln)
-
-    return out_vrt
-
-
-def add_color(outdir, raster):
-    """
-    
-    Add a color map to the created raster files
-
-    Args:
-        outdir: <string> path to the output folder
-        raster: <string> path to the current raster being worked on
-
-    Return:
-        None
-    
-    """
-
-    namex = os.path.basename(raster)
-    name = os.path.splitext(namex)[0]
-
-    if not os.path.exists(outdir + os.sep + "color"):
-        os.mkdir(outdir + os.sep + "color")
-
-    outfile = outdir + os.sep + "color" + os.sep + namex
+            sys.exit(1)
 
-    clr_table = "Color_tables{}color_numchanges.txt".format(os.sep)
+        outfile.SetGeoTransform(src0.GetGeoTransform())
+        outfile.SetProjection(src0.GetProjection())
 
-    outcsv_file = r'%s%szzzzzz_%s_list.csv' % (outdir, os.sep, name)
+        # the color map is written with the raster instead of in a second copy
+        palette.set_color_table(outfile.GetRasterBand(1), "color_numchanges.txt")
 
-    if os.path.isfile(outcsv_file):
-        os.remove(outcsv_file)
+        outs[index] = outfile
 
-    with open(outcsv_file, 'w') as outcsv2_file:
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
 
-        outcsv2_file.write(str(raster) + "\r\n")
+        # The year 0 block is the starting "holder" values which will be
+        # used to compare future values to determine whether a change has
+        # occurred.  Each element's value will be updated each time that a
+        # valid class change occurs.
+        holder = src0.GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize)
 
-    temp_vrt = '{}{}zzzz_{}.vrt'.format(outdir, os.sep, name)
-    com = 'gdalbuildvrt -q -input_file_list %s %s' % (outcsv_file, temp_vrt)
-    subprocess.call(com, shell=True)
+        # an array of zeros that will contain the summed number of changes
+        # per pixel, Byte is the output type so uint8 can hold any count
+        sum_change = np.zeros_like(holder, dtype=np.uint8)
 
-    out_vrt = add_color_table(temp_vrt, clr_table, 'Byte')
+        for index in range(1, len(srcs)):
 
-    runCom = "gdal_translate -of GTiff -ot Byte -q %s %s" % (out_vrt, outfile)
-    subprocess.call(runCom, shell=True)
+            # The current cover map block being tested
+            tempdata = srcs[index].GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize)
 
-    # remove the temp files used for adding the color tables
-    for v in glob.glob(outdir + os.sep + "zzz*"):
-        os.remove(v)
+            if index == 1:
+                # For the first year after year 0, we don't want to include
+                # class 9 or "insufficient data" class 0 in year 0 changing
+                # to any other class as a countable change, so replace them
+                # with the value that exists in the following year.
+                carry = (holder == 9) | (holder == 0)
 
-    return None
+                holder[carry] = tempdata[carry]
 
+            # recode classes 9 and 0 to the previous valid class value
+            # (i.e. no change)
+            np.copyto(tempdata, holder, where=(tempdata == 9) | (tempdata == 0))
 
-def clean_up(outdir):
-    """
-    
-    Remove duplicate files in the output directory, move the
-    rasters with colortable added from /color to the main output directory.
+            # any classes in current year that don't equal the class in
+            # holder are counted as a change
+            change = tempdata != holder
 
-    Args:
-        outdir: <string> the full path to the output directory
+            # update holder elements with most recent changed classes
+            np.copyto(holder, tempdata, where=change)
 
-    Return:
-        None
-    
-    """
-    # remove the original uncolored rasters first
-    rlist = glob.glob(outdir + os.sep + "*.tif")
+            # sum the current number of changes
+            sum_change += change
 
-    for r in rlist: os.remove(r)
+            if index in outs:
+                outs[index].GetRasterBand(1).WriteArray(sum_change, xoff, yoff)
 
-    # copy the colored rasters to the main output directory
-    nlist = glob.glob(outdir + os.sep + "color" + os.sep + "*.tif")
+                histogram.add_block(hists[index], sum_change)
 
-    for n in nlist: copy2(n, outdir)
+    for index, outfile in outs.items():
+        output_profile.finish(outfile, out_files[index])
 
-    # remove the old copies of the colored rasters
-    for n in nlist: os.remove(n)
+    srcs, src0, outs, outfile = None, None, None, None
 
-    # remove the /color directory
-    os.removedirs(outdir + os.sep + "color")
+    # the outputs must be closed before they are stamped in the catalog
+    for index, out_r in out_files.items():
+        histogram.save_histogram(out_r, hists[index])
 
     return None
 
@@ -363,6 +207,8 @@ def usage():
           "\t[-name the cover map product name]\n"
           "\t**CoverPrim or CoverSec are valid names**\n"
           "\t[-o Full path to the output folder]\n"
+          "\t[-blocksize Optional number of rows and columns read at a time, default 1024]\n"
+          "\t[-profile Optional output profile: none, tiled, lzw, deflate or cog (GDAL >= 3.1), default none]\n"
           "\n\t*Output raster will be saved in the same format "
           "as input raster (GTiff).\n\n"
 
@@ -375,6 +221,8 @@ def usage():
 def main():
     fromY, toY = None, None
 
+    blocksize = 1024
+
     argv = sys.argv
 
     if len(argv) < 3:
@@ -410,6 +258,14 @@ def main():
             i = i + 1
             name = argv[i]
 
+        elif arg == '-blocksize':
+            i = i + 1
+            blocksize = int(argv[i])
+
+        elif arg == '-profile':
+            i = i + 1
+            output_profile.set_profile(argv[i])
+
         elif arg == '-help':
             usage()
             sys.exit(1)
@@ -440,22 +296,19 @@ def main():
 
     outfiles, years = get_outlayers(infiles, outputdir, name)
 
-    # for x in range(len(outfiles)):
-    for index, outfile in enumerate(outfiles):
-
-        if index == 0:
-            continue
-
-        if not os.path.exists(outfile):
-            print("\nGenerating raster file {} from years: ".format(os.path.basename(outfile)))
-
-            print(years[0], " and ", years[index])
+    # Only the outputs that don't already exist need to be calculated
+    targets = {index: outfile for index, outfile in enumerate(outfiles)
+               if index > 0 and not os.path.exists(outfile)}
 
-            do_calc(infiles[0:index + 1], outfile)
+    for index in sorted(targets.keys()):
+        print("\nGenerating raster file {} from years: ".format(os.path.basename(targets[index])))
 
-        add_color(outputdir, outfile)
+        print(years[0], " and ", years[index])
 
-    clean_up(outputdir)
+    if len(targets) > 0:
+        # All of the outputs are generated from one scan of the stack, which
+        # only needs to go as far as the last requested year
+        do_calc(infiles[0:max(targets.keys()) + 1], targets, blocksize)
 
     return None
 
@@ -19,6 +19,10 @@ import numpy as np
 
 from osgeo import gdal
 
+import band_math
+import catalog
+import output_profile
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
@@ -42,103 +46,79 @@ def get_inlayers(infolder, y1, y2):
         rlist = the clipped list of change map raster files based on y1, y2
     """
 
-    templist = glob.glob("{a}{b}*ChangeMap*.tif".format(a=infolder, b=os.sep))
-
-    templist.sort()
-
     if y1 == None or y2 == None:
 
-        return templist
+        return catalog.get_files(infolder, product="ChangeMap")
 
     else:
 
         ylist = [y for y in range(int(y1), int(y2) + 1)]
 
-        rlist = [r for y in ylist for r in templist if str(y) in r]
-
-        return rlist
+        return catalog.get_files(infolder, product="ChangeMap", years=ylist)
 
 
-def get_outlayers(inrasters, outfolder):
-    """Generate a list of output rasters containing full paths
+def get_years(inrasters):
+    """Get the year of each input raster from the catalog's parse of its name
     
     Args:
         inrasters = list of the input rasters containing full paths
-        outfolder = the full path to the output folder
     
     Return:
-        rlist = list of output rasters to be created
+        years = list of years as strings
     """
 
-    rlist = []
-
-    years = []
-
-    for r in range(len(inrasters)):
-        name = os.path.splitext(os.path.basename(inrasters[r]))[0]
-
-        # Get the year value from the name string
-        pieces = name.split("_")
-
-        for piece in pieces:
-
-            if len(piece) == 4:
-
-                try:
-
-                    int(piece)
-
-                    years.append(piece)
+    return [catalog.get_year(r) for r in inrasters]
 
-                except ValueError:
 
-                    continue
-
-        # years.append(name[-4:])
-
-    for i in range(len(inrasters)):
-
-        rlist.append("{a}{b}ccdc{c}to{d}ct.tif".format(a=outfolder, b=os.sep, c=years[0], d=years[i]))
-
-    return rlist
+def get_outname(outfolder, y1, y2):
+    """Generate the full path of the output raster for a from/to range of years
+    
+    Args:
+        outfolder = the full path to the output folder
+        y1 = the 'from' year
+        y2 = the 'to' year
+    
+    Return:
+        the full path to the output raster
+    """
 
+    return "{a}{b}ccdc{c}to{d}ct.tif".format(a=outfolder, b=os.sep, c=y1, d=y2)
 
-def do_calc(out_r, in_r1, in_r2):
 
-    """Generate the output layers and add color ramps for the default
-    from/to years (i.e. the min and max years present)
+def do_calc(in_files, out_files, blocksize=1024):
+    """Generate the number of changes per pixel for every requested from/to
+    range of years from a single read of the change map stack.  Each block
+    of each change map is read exactly once, and the running per-pixel count
+    is kept in memory for the current block only.  The count for a range is
+    the running count at its 'to' year minus the running count just before
+    its 'from' year.
     
     Args:
-        in_r = the input raster file
-        out_r = the output raster file
+        in_files = list of the input change map rasters in year order
+        out_files = dict mapping a (from index, to index) pair of in_files
+                    to the full path of the output raster for that range
+        blocksize = maximum number of rows and columns in a block
         
     Returns:
         None
     """
 
-    driver = gdal.GetDriverByName("GTiff")
+    # The stack only needs to be read as far as the last requested 'to' year
+    last = max(end for start, end in out_files.keys())
 
-    if in_r1 == None:
+    srcs = [gdal.Open(in_r) for in_r in in_files[:last + 1]]
 
-        src2 = gdal.Open(in_r2)
+    rows = srcs[0].RasterYSize
 
-        rows = src2.RasterYSize
+    cols = srcs[0].RasterXSize
 
-        cols = src2.RasterXSize
+    starts = set(start for start, end in out_files.keys())
 
-        srcdata2 = src2.GetRasterBand(1).ReadAsArray()
+    outs = dict()
 
-        if np.any(srcdata2):
-        
-            srcdata2[srcdata2 > 0] = 1
-            
-        else:
-            
-            srcdata2 = np.zeros_like(srcdata2)
+    for key, out_r in out_files.items():
 
-        srcdata2 = srcdata2.astype("uint8")
-        
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
+        outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_Byte)
 
         if outfile is None:
             print("\nCould not create image file {a}".format
@@ -146,65 +126,42 @@ def do_calc(out_r, in_r1, in_r2):
 
             sys.exit(1)
 
-        outband = outfile.GetRasterBand(1)
-        outband.WriteArray(srcdata2)
+        outfile.SetGeoTransform(srcs[0].GetGeoTransform())
+        outfile.SetProjection(srcs[0].GetProjection())
 
-        outband.FlushCache()
-        # outband.SetNoDataValue(255)
+        outs[key] = outfile
 
-        outfile.SetGeoTransform(src2.GetGeoTransform())
-        outfile.SetProjection(src2.GetProjection())
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
 
-        src2, outfile = None, None
+        running = np.zeros((ysize, xsize), dtype=np.uint8)
 
-        return None
+        # The running count just before each 'from' year of the block
+        before = dict()
 
-    else:
+        for index, src in enumerate(srcs):
 
-        src1 = gdal.Open(in_r1)
-        src2 = gdal.Open(in_r2)
+            if index in starts:
 
-        rows = src2.RasterYSize
+                before[index] = np.copy(running)
 
-        cols = src2.RasterXSize
+            srcdata = src.GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize)
 
-        srcdata1 = src1.GetRasterBand(1).ReadAsArray()
-        srcdata2 = src2.GetRasterBand(1).ReadAsArray()
+            # Any change day value > 0 counts as one change
+            running += srcdata > 0
 
-        if not np.any(srcdata1):
-            
-            srcdata1 = np.zeros_like(srcdata1)
-            
-        if not np.any(srcdata2):
-            
-            srcdata2 = np.zeros_like(srcdata2)
-            
-        srcdata2[srcdata2 > 0] = 1
+            for (start, end), outfile in outs.items():
 
-        sumdata = np.add(srcdata1, srcdata2)
+                if end == index:
 
-        sumdata = sumdata.astype("uint8")
-        
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
+                    outfile.GetRasterBand(1).WriteArray(running - before[start], xoff, yoff)
 
-        if outfile is None:
-            print("\nCould not create image file {a}".format
-                  (a=os.path.basename(out_r)))
+    for key, outfile in outs.items():
 
-            sys.exit(1)
-
-        outband = outfile.GetRasterBand(1)
-        outband.WriteArray(sumdata)
-
-        outband.FlushCache()
-        # outband.SetNoDataValue(255)
+        output_profile.finish(outfile, out_files[key])
 
-        outfile.SetGeoTransform(src2.GetGeoTransform())
-        outfile.SetProjection(src2.GetProjection())
+    srcs, outs = None, None
 
-        src1, src2, outfile = None, None, None
-
-        return None
+    return None
 
 
 def add_color_table(in_vrt, clr_table, dtype):
@@ -300,9 +257,11 @@ def add_color(outdir, raster):
 
     out_vrt = add_color_table(temp_vrt, clr_table, 'Byte')
 
-    runCom = "gdal_translate -of %s -ot Byte -q %s %s" % ("GTiff", out_vrt, outfile)
+    runCom = "gdal_translate %s -ot Byte -q %s %s" % (output_profile.get_co_args(gdal.GDT_Byte), out_vrt, outfile)
     subprocess.call(runCom, shell=True)
 
+    output_profile.add_overviews(outfile)
+
     # remove the temp files used for adding the color tables
     for v in glob.glob(outdir + os.sep + "zzz*"):
         os.remove(v)
@@ -345,6 +304,10 @@ def usage():
           "\t[-from The start year]\n"
           "\t[-to The end year]\n"
           "\t[-o Full path to the output folder]\n"
+          "\t[-ranges Optional comma-separated from:to year ranges to generate,\n"
+          "\t\te.g. 1984:1990,1991:2000.  Otherwise generate every cumulative output]\n"
+          "\t[-blocksize Optional number of rows and columns read at a time, default 1024]\n"
+          "\t[-profile Optional output profile: none, tiled, lzw, deflate or cog (GDAL >= 3.1), default none]\n"
           "\n\t*Output raster will be saved in the same format "
           "as input raster (GTiff).\n\n"
 
@@ -357,6 +320,10 @@ def usage():
 def main():
     fromY, toY = None, None
 
+    ranges = None
+
+    blocksize = 1024
+
     argv = sys.argv
 
     if len(argv) < 3:
@@ -388,6 +355,18 @@ def main():
             i = i + 1
             outputdir = argv[i]
 
+        elif arg == '-ranges':
+            i = i + 1
+            ranges = [tuple(r.split(":")) for r in argv[i].split(",")]
+
+        elif arg == '-blocksize':
+            i = i + 1
+            blocksize = int(argv[i])
+
+        elif arg == '-profile':
+            i = i + 1
+            output_profile.set_profile(argv[i])
+
         elif arg == '-help':
             usage()
             sys.exit(1)
@@ -410,31 +389,39 @@ def main():
 
     infiles = get_inlayers(inputdir, fromY, toY)
 
-    outfiles = get_outlayers(infiles, outputdir)
+    years = get_years(infiles)
+
+    # By default generate every cumulative output from the first year
+    if ranges is None:
 
-    for x in range(len(outfiles)):
+        ranges = [(years[0], y) for y in years]
 
-        if x == 0:
+    outfiles = [get_outname(outputdir, y1, y2) for y1, y2 in ranges]
 
-            if not os.path.exists(outfiles[x]):
+    # Only the outputs that don't already exist need to be calculated
+    targets = dict()
 
-                print("\nGenerating raster file {a} from: ".format(a=os.path.basename(outfiles[x])))
+    for (y1, y2), outfile in zip(ranges, outfiles):
 
-                print(os.path.basename(infiles[x]))
+        if y1 not in years or y2 not in years or years.index(y1) > years.index(y2):
+
+            print("\nCould not find the ChangeMap layers for the range {a} to {b}".format(a=y1, b=y2))
+
+            sys.exit(1)
 
-                do_calc(outfiles[x], in_r1=None, in_r2=infiles[x])
+        if not os.path.exists(outfile):
 
-        elif x > 0:
+            print("\nGenerating raster file {a} from years {b} to {c}".format(a=os.path.basename(outfile), b=y1, c=y2))
 
-            if not os.path.exists(outfiles[x]):
+            targets[(years.index(y1), years.index(y2))] = outfile
 
-                print("\nGenerating raster file {a} from:".format(a=os.path.basename(outfiles[x])))
+    if len(targets) > 0:
 
-                print(os.path.basename(outfiles[x - 1]), " and ", os.path.basename(infiles[x]))
+        do_calc(infiles, targets, blocksize)
 
-                do_calc(outfiles[x], outfiles[x - 1], infiles[x])
+    for outfile in outfiles:
 
-        add_color(outputdir, outfiles[x])
+        add_color(outputdir, outfile)
 
     clean_up(outputdir)
 
@@ -10,11 +10,8 @@ the output raster.
 """
 
 import datetime
-import glob
 import os
 import pprint
-import re
-import subprocess
 import sys
 import traceback
 import argparse
@@ -22,99 +19,24 @@ import numpy as np
 
 from osgeo import gdal
 
+import catalog
+import output_profile
+import palette
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
 print("Processing started at: ", t1.strftime("%Y-%m-%d %H:%M:%S\n"))
 
 
-def add_color_table(in_vrt, clr_table, dtype):
-    color_table = open(clr_table, 'r')
-
-    (dirName, fileName) = os.path.split(in_vrt)
-
-    (fileBase, fileExt) = os.path.splitext(fileName)
-
-    out_vrt = r'{0}{1}zzzzz{2}_temp.vrt'.format(dirName, os.sep, fileBase)
-
-    with open(in_vrt, 'r+') as in_txt, open(out_vrt, 'w') as out_txt:
-        # key is the line after which to insert the color table in the new VRT text
-        key = '<VRTRasterBand dataType="{0}" band="1">'.format(dtype)
-
-        # subkey is a line that doesn't need to be in the new VRT text
-        subkey = '   <ColorInterp>Gray</ColorInterp>'
-
-        # get lines in a list
-        txt_read = in_txt.readlines()
-
-        for line in txt_read:
-            if subkey in line:
-
-                # print '\nfound the subkey to ignore\n'
-                continue
-            else:
-                writetxt = r'{0}'.format(line)
-
-                out_txt.write(writetxt)
-
-                # insert color table following keywords
-                if key in line:
-                    # print "\nFound the key!\n"
-
-                    color_read = color_table.readlines()
-
-                    # print 'writing color table to vrt'
-
-                    for ln in color_read:
-
-                        out_txt.write(ln)
-
-                    # print 'done writing!'
-    return out_vrt
-
-
-def colorize(out_dir, temp_file, out_file, from_y, to_y):
-
-    try:
-        # ##--------color_pallette---------------------
-        clr_table = 'Color_tables{}color_yolc.txt'.format(os.sep)
-
-        outcsv_file = f'{out_dir}{os.sep}zzzzzz_{from_y[-2:]}_to_{to_y[-2:]}_list.csv'
-
-        if os.path.isfile(outcsv_file):
-            os.remove(outcsv_file)
-
-        with open(outcsv_file, 'wb') as outcsv2_file:
-            outcsv2_file.write(temp_file.encode('utf-8') + "\r\n".encode('utf-8'))
-
-        out_VRT = f'{out_dir}{os.sep}zzzz_{from_y[-2:]}-{to_y[-2:]}.vrt'
-
-        com = f'gdalbuildvrt -q -input_file_list {outcsv_file} {out_VRT}'
-        subprocess.call(com, shell=True)
-
-        out_vrt = add_color_table(out_VRT, clr_table, 'UInt16')
-
-        runCom = f'gdal_translate -of GTiff -ot UInt16  -stats -q {out_vrt} {out_file}'
-        subprocess.call(runCom, shell=True)
-
-        # remove the temp files used for adding the color tables
-        for v in glob.glob(out_dir + os.sep + "zzz*"):
-            os.remove(v)
-
-    except:
-        print(traceback.format_exc())
-
-        print("Unexpected error:", sys.exc_info()[0])
-
-
 def get_files(in_dir):
 
-    return sorted(glob.glob(in_dir + os.sep + "*.tif"))
+    return catalog.get_files(in_dir)
 
 
 def get_years(r_list):
 
-    return sorted([re.split('[ _ .]', os.path.split(r_file)[1])[1][-4:] for r_file in r_list])
+    return [catalog.get_year(r_file) for r_file in r_list]
 
 
 def clip_lists(r_list, y_list, year1=None, year2=None):
@@ -152,9 +74,7 @@ def make_raster(in_data, in_file, out_r):
     cols = in_src.RasterXSize
     rows = in_src.RasterYSize
 
-    driver = gdal.GetDriverByName("GTiff")
-
-    outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_UInt16)
+    outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_UInt16)
 
     if outfile is None:
         print(f"\nCould not create image file {os.path.basename(out_r)}")
@@ -162,14 +82,22 @@ def make_raster(in_data, in_file, out_r):
         sys.exit(1)
 
     outband = outfile.GetRasterBand(1)
+
+    # ##--------color_pallette---------------------
+    palette.set_color_table(outband, 'color_yolc.txt')
+
     outband.WriteArray(in_data, 0, 0)
 
     outband.FlushCache()
     outband.SetNoDataValue(32767)
 
+    outband.ComputeStatistics(False)
+
     outfile.SetGeoTransform(in_src.GetGeoTransform())
     outfile.SetProjection(in_src.GetProjection())
 
+    output_profile.finish(outfile, out_r)
+
     in_src, outfile = None, None
 
     return None
@@ -188,9 +116,6 @@ def all_calc_numpy(in_dir, out_dir, year1=None, year2=None):
     # final output raster**
     out_file = f'{out_dir}{os.sep}ccdc{y1[-2:]}to{y2[-2:]}yolc.tif'
 
-    # temporary output raster
-    temp_file = f'{out_dir}{os.sep}zzzz{y1[-2:]}to{y2[-2:]}yolc.tif'
-
     src_0_data = load_data(r_list_[0])
 
     final_data = np.zeros_like(src_0_data, dtype=np.uint16)
@@ -204,15 +129,13 @@ def all_calc_numpy(in_dir, out_dir, year1=None, year2=None):
         final_data[mask == 1] = int(year)
 
     if np.any(final_data):
-        make_raster(final_data, r_list_[0], temp_file)
+        make_raster(final_data, r_list_[0], out_file)
 
     else:
         print(traceback.format_exc())
 
         print("Resulting array is all zeros:", sys.exc_info()[0])
 
-    colorize(out_dir, temp_file, out_file, y1, y2)
-
     return None
 
 
@@ -228,8 +151,12 @@ def main():
 
     parser.add_argument("-o", "--output", required=True, type=str, help="The full path to the output folder")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     # call the primary function
     all_calc_numpy(args.input, args.output, args.year1, args.year2)
 
@@ -24,6 +24,9 @@ try:
 except ImportError:
     import gdal
 
+import catalog
+import output_profile
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
@@ -54,21 +57,15 @@ def get_inlayers(infolder, y1, y2):
         rlist = the clipped list of change map raster files based on y1, y2
     """
 
-    templist = glob.glob("{a}{b}nlcd*.tif".format(a=infolder, b=os.sep))
-
-    templist.sort()
-
     if y1 == None or y2 == None:
 
-        return templist
+        return catalog.get_files(infolder, product="nlcd")
 
     else:
 
         ylist = [y for y in range(int(y1), int(y2) + 1)]
 
-        rlist = [r for y in ylist for r in templist if str(y) in r]
-
-        return rlist
+        return catalog.get_files(infolder, product="nlcd", years=ylist)
 
 
 # %%
@@ -90,9 +87,7 @@ def get_outlayers(inrasters, outfolder):
     for r in range(len(inrasters)):
         dirx, filex = os.path.split(inrasters[r])
 
-        name, ext = os.path.splitext(filex)
-
-        years.append(name[5:9])
+        years.append(catalog.get_year(filex))
 
     for i in range(len(inrasters)):
         rlist.append("{a}{b}nlcd{c}to{d}ct.tif".format \
@@ -114,8 +109,6 @@ def do_calc(out_r, in_r1, in_r2):
         None
     """
 
-    driver = gdal.GetDriverByName("GTiff")
-
     if in_r1 == None:
 
         src2 = gdal.Open(in_r2)
@@ -128,7 +121,7 @@ def do_calc(out_r, in_r1, in_r2):
 
         srcdata2[srcdata2 > 0] = 1
 
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
+        outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_Byte)
 
         if outfile is None:
             print("\nCould not create image file {a}".format
@@ -145,6 +138,8 @@ def do_calc(out_r, in_r1, in_r2):
         outfile.SetGeoTransform(src2.GetGeoTransform())
         outfile.SetProjection(src2.GetProjection())
 
+        output_profile.finish(outfile, out_r)
+
         src2, outfile = None, None
 
         return None
@@ -165,7 +160,7 @@ def do_calc(out_r, in_r1, in_r2):
 
         sumdata = np.add(srcdata1, srcdata2)
 
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
+        outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_Byte)
 
         if outfile is None:
             print("\nCould not create image file {a}".format
@@ -182,6 +177,8 @@ def do_calc(out_r, in_r1, in_r2):
         outfile.SetGeoTransform(src2.GetGeoTransform())
         outfile.SetProjection(src2.GetProjection())
 
+        output_profile.finish(outfile, out_r)
+
         src1, src2, outfile = None, None, None
 
         return None
@@ -283,9 +280,11 @@ def add_color(outdir, raster):
 
     out_vrt = add_color_table(temp_vrt, clr_table, 'Byte')
 
-    runCom = "gdal_translate -of %s -ot Byte -q %s %s"%("GTiff", out_vrt, outfile)
+    runCom = "gdal_translate %s -ot Byte -q %s %s"%(output_profile.get_co_args(gdal.GDT_Byte), out_vrt, outfile)
     subprocess.call(runCom, shell=True)
 
+    output_profile.add_overviews(outfile)
+
     # remove the temp files used for adding the color tables
     for v in glob.glob(outdir + os.sep + "zzz*"):
         os.remove(v)
@@ -329,6 +328,7 @@ def usage():
           "\t[-from The start year]\n"
           "\t[-to The end year]\n"
           "\t[-o Full path to the output folder]\n"
+          "\t[-profile Optional output profile: none, tiled, lzw, deflate or cog (GDAL >= 3.1), default none]\n"
           "\n\t*Output raster will be saved in the same format "
           "as input raster (GTiff).\n\n"
 
@@ -373,6 +373,10 @@ def main():
             i = i + 1
             outputdir = argv[i]
 
+        elif arg == '-profile':
+            i = i + 1
+            output_profile.set_profile(argv[i])
+
         elif arg == '-help':
             usage()
             sys.exit(1)
@@ -5,7 +5,7 @@ Date:	8/18/2015
 Last Updated : 2/6/2017 by Dan Zelenak to work on LCSRLNST01
 '''
 
-import os, sys, traceback, datetime, time,numpy,glob, subprocess, re, pprint, fnmatch
+import os, sys, traceback, datetime, time,numpy,glob, re, pprint, fnmatch
 print (sys.version)
 
 try:
@@ -14,7 +14,8 @@ try:
 except ImportError:
 	import gdal	
 
-GDALPath = '/usr/bin'
+import band_math
+import output_profile
 
 t1 = datetime.datetime.now()
 print ("Processing started at: ", t1.strftime("%Y-%m-%d %H:%M:%S\n"))
@@ -107,77 +108,23 @@ def RasterChange1(inDir,frmY, toY, FFormat, OutFile, ext):
 	return OutFile
 
 def RasterChange(FFormat,outputDir,RasterList,exten, OutFile):
-	print ('raster list length = ',len(RasterList)) #for testing
-	print (RasterList)
-	runCalc0  = '%s/gdal_calc.py --format %s --type %s -A %s --outfile %s --calc="0 *(A > 0)" ' \
-	% (GDALPath, FFormat,'Int16', RasterList[0], OutFile)			
-	subprocess.call(runCalc0, shell=True)
-	for i in range(len(RasterList)-1):
-		
-		f1 = RasterList[i]
-		f2 = RasterList[i+1]
-		#f1 = RasterList[0]
-		#f2 = RasterList[1]
-		
-		file3 = outputDir + os.sep + 'zzzz' + exten
-		runCalc1  = '%s/gdal_calc.py --format %s --type %s -A %s -B %s --outfile %s --calc="1 *(A != B)" ' \
-		% (GDALPath, FFormat,'Int16',f1,f2,file3)			
-		subprocess.call(runCalc1, shell=True)
-		
-		OutFiles = outputDir + os.sep + 'zzzz_' +str(i)+exten
-		if not os.path.exists(OutFiles):
-			runCalc2  = '%s/gdal_calc.py --format %s --type %s -A %s -B %s --outfile %s --calc="(A + B)" --overwrite ' \
-			% (GDALPath, FFormat,'Int16',file3,OutFile,OutFiles)	
-			OutFile = OutFiles
-			subprocess.call(runCalc2, shell=True)
-			
-	return OutFiles
+	## count the changes between each pair of consecutive rasters in-process, only the final
+	## frequency raster is written
+	if len(RasterList) < 2:
+		band_math.band_calc("0 * (A > 0)", [{"A": RasterList[0]}], [OutFile], FFormat, gdal.GDT_Int16)
+		return OutFile
+	
+	pairs = [{"A": RasterList[i], "B": RasterList[i+1]} for i in range(len(RasterList)-1)]
+	band_math.band_calc("A != B", pairs, [None] * (len(pairs)-1) + [OutFile], FFormat, gdal.GDT_Int16)
+	
+	return OutFile
 	
 def RasterChangeGrid1(outputDir,RasterList,FfFormat, OutFile):
 	print ("Using numpy")
 	
-	f1 = RasterList[0].split('.')[0]
-	file1 = outputDir + os.sep + 'zzzzx.tif'	
-	runsubset2a  = GDALPath + os.sep + 'gdal_translate -of %s -q %s %s -a_nodata 0' % (FfFormat,f1,file1)		
-	subprocess.call(runsubset2a, shell=True)
-
-	inFile = gdal.Open(f1)
-	cols, rows, geot, proj, DataType, bands = GetGeoInfo(inFile)		
+	pairs = [{"A": RasterList[i], "B": RasterList[i+1]} for i in range(len(RasterList)-1)]
+	band_math.band_calc("A != B", pairs, [None] * (len(pairs)-1) + [OutFile], FfFormat, gdal.GDT_Byte)
 	
-	newArray = numpy.zeros(shape=(rows,cols)).astype(int)
-	for i in range(len(RasterList)-1):
-		f1a = RasterList[i].split('.')[0]
-		f1b = RasterList[i+1].split('.')[0]
-
-		file1a = outputDir + os.sep + 'zzzza1.tif'
-		file1b = outputDir + os.sep + 'zzzza2.tif'		
-		
-		runsubset2a  = '%s\gdal_translate -of %s -q %s %s -a_nodata 0' % (GDALPath, FfFormat,f1a,file1a)		
-		subprocess.call(runsubset2a, shell=True)
-
-		runsubset2b  = '%s\gdal_translate -of %s -q %s %s -a_nodata 0' % (GDALPath, FfFormat,f1b,file1b)				
-		subprocess.call(runsubset2b, shell=True)
-		
-		inFile1 = gdal.Open(file1a)	
-		inFile2 = gdal.Open(file1b)	
-		
-		band1 = inFile1.GetRasterBand(1)
-		band2 = inFile2.GetRasterBand(1)
-		Array1 = band1.ReadAsArray(0, 0, cols, rows)
-		Array2 = band2.ReadAsArray(0, 0, cols, rows)
-
-		ArrayT = (Array1 != Array2).astype(int)
-
-		newArray += ArrayT
-	
-	driver = gdal.GetDriverByName(FFormat)
-	dst_ds = driver.Create(OutFile, cols, rows, bands, GDT_Byte)
-	dst_ds.SetGeoTransform(geot)
-	dst_ds.SetProjection(proj)	
-	dst_ds.GetRasterBand(1).WriteArray(newArray)
-
-	# ListArray.append(OutFile)
-	newArray = None
 	return OutFile
 	
 def RasterChangeGrid(outputDir,inputD,fromY, toY, FfFormat, OutFile):
@@ -205,26 +152,17 @@ def RasterChangeGrid(outputDir,inputD,fromY, toY, FfFormat, OutFile):
 		print ("\n-------------------\nOooops!! Asking 'From' year is not matching in the input files."
 		"Please make sure change layers was computed for the 'From' year, you are asking.\n----------------------\n")
 		os._exit(1)
-	runCalc0  = '%s\gdal_calc --type %s -A %s --outfile %s --calc="0 *(A > 0)" ' % (GDALPath, 'Int16', RasterList[0],OutFile)			
-	subprocess.call(runCalc0, shell=True)
-	runCalc0 = None	
+	pairs = []
 	for i, Year in enumerate(range(int(fromY), int(toY)-inY, inY)):
 		Year2 = int(Year+inY)
 		f1 = glob.glob(inputD +os.sep + "Y"+str(Year)+"-*.asc")[0]
 		f2 = glob.glob(inputD +os.sep + "Y"+str(Year2)+"-*.asc")[0]
-		
-		# f1 = RasterList[i]#.split('.')[0]
-		# f2 = RasterList[i+1]#.split('.')[0]
-
-		file3 = outputDir + os.sep + 'zzzz3.tif'
-		runCalc1  = '%s\gdal_calc --type %s -A %s -B %s --outfile %s --calc="1 *(A != B)" ' % (GDALPath, 'Int16',f1,f2,file3)			
-		subprocess.call(runCalc1, shell=True)
-		
-		OutFiles = outputDir + os.sep + 'zzzzz' +str(i)+'.tif'
-		if not os.path.exists(OutFiles):
-			runCalc2  = '%s\gdal_calc --type %s -A %s -B %s --outfile %s --calc="(A + B)" --overwrite ' % (GDALPath, 'Int16',file3,OutFile,OutFiles)	
-			OutFile = OutFiles
-		subprocess.call(runCalc2, shell=True)
+		pairs.append({"A": f1, "B": f2})
+	
+	if len(pairs) == 0:
+		band_math.band_calc("0 * (A > 0)", [{"A": RasterList[0]}], [OutFile], FfFormat, gdal.GDT_Int16)
+	else:
+		band_math.band_calc("A != B", pairs, [None] * (len(pairs)-1) + [OutFile], FfFormat, gdal.GDT_Int16)
 		
 	return OutFile
 	
@@ -281,8 +219,6 @@ def allCalc(inputDir, outputDir, FileFormat, FromY, ToY):
 			if not os.path.exists(OutFile):
 				print ('working on change frequency for years %s to %s' %(FromY, ToY))
 				cumulativeChange = RasterChange(FFormat, outputDir, TrendsList, exten, OutFile)
-				runsubset3  = '%s/gdal_translate -of %s -q %s %s ' % (GDALPath, FFormat, cumulativeChange, OutFile)				
-				subprocess.call(runsubset3, shell=True)
 			else:
 				print ('%s already exists' %(os.path.basename(OutFile)))
 	
@@ -299,16 +235,10 @@ def allCalc(inputDir, outputDir, FileFormat, FromY, ToY):
 		
 		elif FileFormat == 'GRID':
 			FFormat = 'AAIGrid'
-			OutFile = outputDir + os.sep + "zzzz.tif"
 			OutFile1 = '%s/trends%sto%sct.asc' %(outputDir, frmY, toY)
 			print ("\tOutFile: ", OutFile1)
-			cumulativeChange = RasterChangeGrid(outputDir, inputDir, frmY, toY, 'GTiff', OutFile)
-			
-			runsubset2  = GDALPath + os.sep+'gdal_translate -of %s -q %s %s ' % (FFormat, cumulativeChange, OutFile1)				
-			subprocess.call(runsubset2, shell=True)
+			cumulativeChange = RasterChangeGrid(outputDir, inputDir, frmY, toY, FFormat, OutFile1)
 		
-		for v in glob.glob(outputDir + os.sep+ "zzz*"):
-			os.remove(v)
 			
 	except:
 		print ("Opps! something is not working")
@@ -322,7 +252,8 @@ def usage():
 	[-frm From Year]\n \
 	[-to To Year]\n \
 	[-o Output Folderpath] \n \
-	[-if input File Format (only 3 format supported: GTiff, HFA, and GRID)] \n\n \
+	[-if input File Format (only 3 format supported: GTiff, HFA, and GRID)] \n\
+	[-profile GTiff output profile: none, tiled, lzw, deflate or cog (GDAL >= 3.1) (default none)] \n\n \
 	Output raster will be saved in the same format as input raster.\n\n')
 	print ('')
 	
@@ -332,7 +263,7 @@ def examps():
 	print ('')
 
 def main():
-	oFormat, fromY, toY = None, None, None
+	oFormat, fromY, toY, profile = None, None, None, None
 	
 	argv = sys.argv
 		
@@ -364,6 +295,10 @@ def main():
 			i           = i + 1
 			oFormat      = argv[i]       
 
+		elif arg == '-profile':
+			i           = i + 1
+			profile      = argv[i]
+
 		elif arg == '-help':
 			usage()
 			sys.exit(1) 
@@ -377,6 +312,8 @@ def main():
 	
 	if oFormat == None:
 		oFormat = 'GTiff'
+
+	output_profile.set_profile(profile)
 	
 	# call the primary function
 	allCalc(inputDir, outputDir, oFormat, fromY, toY)
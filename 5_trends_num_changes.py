@@ -14,12 +14,14 @@ import datetime
 import glob
 import subprocess
 
-import numpy as np
-
 from shutil import copy2
 
 from osgeo import gdal
 
+import band_math
+import catalog
+import output_profile
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
@@ -46,21 +48,15 @@ def get_inlayers(infolder, y1, y2):
         rlist = the clipped list of change map raster files based on y1, y2
     """
 
-    templist = glob.glob("{a}{b}Trendsblock*.tif".format(a=infolder, b=os.sep))
-
-    templist.sort()
-
     if y1 == None or y2 == None:
 
-        return templist
+        return catalog.get_files(infolder, product="Trendsblock")
 
     else:
 
         ylist = [y for y in range(int(y1), int(y2) + 1)]
 
-        rlist = [r for y in ylist for r in templist if str(y) in r]
-
-        return rlist
+        return catalog.get_files(infolder, product="Trendsblock", years=ylist)
 
 def get_outlayers(inrasters, outfolder):
     """Generate a list of output rasters containing full paths
@@ -80,9 +76,7 @@ def get_outlayers(inrasters, outfolder):
     for r in range(len(inrasters)):
         dirx, filex = os.path.split(inrasters[r])
 
-        name, ext = os.path.splitext(filex)
-
-        years.append(name[12:16])
+        years.append(catalog.get_year(filex))
 
     for i in range(len(inrasters)):
         rlist.append("{a}{b}trends{c}to{d}ct.tif".format \
@@ -90,89 +84,26 @@ def get_outlayers(inrasters, outfolder):
 
     return rlist
 
-def do_calc(out_r, in_r1, in_r2):
-    """Generate the output layers and add color ramps for the default
-    from/to years (i.e. the min and max years present)
+def do_calc(in_files, out_files):
+    """Generate the cumulative number of changes per pixel for each output
+    in one in-process pass over the input layers.  Any value > 0 counts as a
+    change, and only the outputs that are not None are written.
 
     Args:
-        in_r = the input raster file
-        out_r = the output raster file
+        in_files = list of the input raster files in year order
+        out_files = list of output raster files aligned with in_files, the
+                    count for in_files[0] through in_files[i] is written to
+                    out_files[i]
 
     Returns:
         None
     """
 
-    driver = gdal.GetDriverByName("GTiff")
-
-    if in_r1 == None:
-
-        src2 = gdal.Open(in_r2, gdal.GA_ReadOnly)
-
-        rows = src2.RasterYSize
-
-        cols = src2.RasterXSize
-
-        srcdata2 = src2.GetRasterBand(1).ReadAsArray()
-
-        srcdata2[srcdata2 > 0] = 1
-
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
-
-        if outfile is None:
-            print("\nCould not create image file {a}".format
-                  (a=os.path.basename(out_r)))
-
-            sys.exit(1)
-
-        outband = outfile.GetRasterBand(1)
-        outband.WriteArray(srcdata2, 0, 0)
-
-        outband.FlushCache()
-        outband.SetNoDataValue(255)
-
-        outfile.SetGeoTransform(src2.GetGeoTransform())
-        outfile.SetProjection(src2.GetProjection())
-
-        src2, outfile = None, None
-
-        return None
-
-    else:
+    # the counts only ever treated 0 as "no change", input NoData isn't masked
+    band_math.band_calc("A > 0", [{"A": in_r} for in_r in in_files], out_files,
+                        "GTiff", gdal.GDT_Byte, nodata=255, mask_nodata=False)
 
-        src1 = gdal.Open(in_r1)
-        src2 = gdal.Open(in_r2)
-
-        rows = src2.RasterYSize
-
-        cols = src2.RasterXSize
-
-        srcdata1 = src1.GetRasterBand(1).ReadAsArray()
-        srcdata2 = src2.GetRasterBand(1).ReadAsArray()
-
-        srcdata2[srcdata2 > 0] = 1
-
-        sumdata = np.add(srcdata1, srcdata2)
-
-        outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_Byte)
-
-        if outfile is None:
-            print("\nCould not create image file {a}".format
-                  (a=os.path.basename(out_r)))
-
-            sys.exit(1)
-
-        outband = outfile.GetRasterBand(1)
-        outband.WriteArray(sumdata, 0, 0)
-
-        outband.FlushCache()
-        outband.SetNoDataValue(255)
-
-        outfile.SetGeoTransform(src2.GetGeoTransform())
-        outfile.SetProjection(src2.GetProjection())
-
-        src1, src2, outfile = None, None, None
-
-        return None
+    return None
 
 def add_color_table(in_vrt, clr_table, dtype):
     """Write color map info to a VRT file
@@ -267,11 +198,13 @@ def add_color(outdir, raster):
 
     out_vrt = add_color_table(temp_vrt, clr_table, 'Byte')
 
-    runCom = "gdal_translate -of %s -ot Byte -q" \
+    runCom = "gdal_translate %s -ot Byte -q" \
              " -stats -a_srs EPSG:5070 %s %s" \
-             % ("GTiff", out_vrt, outfile)
+             % (output_profile.get_co_args(gdal.GDT_Byte), out_vrt, outfile)
     subprocess.call(runCom, shell=True)
 
+    output_profile.add_overviews(outfile)
+
     # remove the temp files used for adding the color tables
     for v in glob.glob(outdir + os.sep + "zzz*"):
         os.remove(v)
@@ -313,6 +246,7 @@ def usage():
           "\t[-from The start year]\n"
           "\t[-to The end year]\n"
           "\t[-o Full path to the output folder]\n"
+          "\t[-profile Optional output profile: none, tiled, lzw, deflate or cog (GDAL >= 3.1), default none]\n"
           "\n\t*Output raster will be saved in the same format "
           "as input raster (GTiff).\n\n"
 
@@ -355,6 +289,10 @@ def main():
             i = i + 1
             outputdir = argv[i]
 
+        elif arg == '-profile':
+            i = i + 1
+            output_profile.set_profile(argv[i])
+
         elif arg == '-help':
             usage()
             sys.exit(1)
@@ -372,25 +310,23 @@ def main():
 
     outfiles = get_outlayers(infiles, outputdir)
 
-    for x in range(len(outfiles)):
-
-        if x == 0:
+    # Only the outputs that don't already exist need to be calculated
+    targets = [outfile if not os.path.exists(outfile) else None for outfile in outfiles]
 
-            if not os.path.exists(outfiles[x]):
-                print("\nGenerating raster file {a} from: ".format(a=os.path.basename(outfiles[x])))
+    for x, outfile in enumerate(targets):
 
-                print(os.path.basename(infiles[x]))
+        if outfile is not None:
+            print("\nGenerating raster file {a} from: ".format(a=os.path.basename(outfile)))
 
-                do_calc(outfiles[x], None, infiles[x])
+            print(os.path.basename(infiles[0]), " to ", os.path.basename(infiles[x]))
 
-        elif x > 0:
+    if any(targets):
+        # The inputs only need to be read as far as the last missing output
+        last = max(x for x, outfile in enumerate(targets) if outfile is not None)
 
-            if not os.path.exists(outfiles[x]):
-                print("\nGenerating raster file {a} from:".format(a=os.path.basename(outfiles[x])))
+        do_calc(infiles[:last + 1], targets[:last + 1])
 
-                print(os.path.basename(outfiles[x - 1]), " and ", os.path.basename(infiles[x]))
-
-                do_calc(outfiles[x], outfiles[x - 1], infiles[x])
+    for x in range(len(outfiles)):
 
         add_color(outputdir, outfiles[x])
 
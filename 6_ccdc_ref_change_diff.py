@@ -18,6 +18,8 @@ import traceback
 import numpy as np
 from osgeo import gdal
 
+import output_profile
+
 print(sys.version)
 
 t1 = datetime.datetime.now()
@@ -147,9 +149,7 @@ def write_raster(file_name, geo, prj, cols, rows, out_array):
     :return:
     """
 
-    driver = gdal.GetDriverByName('GTiff')
-
-    out_file = driver.Create(file_name, cols, rows, 1, gdal.GDT_Float32)
+    out_file = output_profile.create(file_name, cols, rows, 1, gdal.GDT_Float32)
 
     out_band = out_file.GetRasterBand(1)
     out_band.WriteArray(out_array, 0, 0)
@@ -160,6 +160,8 @@ def write_raster(file_name, geo, prj, cols, rows, out_array):
     out_file.SetGeoTransform(geo)
     out_file.SetProjection(prj)
 
+    output_profile.finish(out_file, file_name)
+
     out_file = None
 
     return None
@@ -186,8 +188,12 @@ def main():
     parser.add_argument('-n', '--name', type=str, choices=['nlcd', 'trends'], required=True,
                         help='Select either trends or nlcd as the reference data')
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     # call the primary function
     allCalc(args.ref, args.ccdc, args.output, args.year1, args.year2, args.name)
 
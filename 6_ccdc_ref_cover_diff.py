@@ -15,6 +15,8 @@ import numpy as np
 
 import argparse
 
+import output_profile
+
 print (sys.version)
 
 t1 = datetime.datetime.now()
@@ -118,9 +120,7 @@ def write_raster(file_name, geo, prj, cols, rows, out_array):
     :return:
     """
 
-    driver = gdal.GetDriverByName('GTiff')
-
-    out_file = driver.Create(file_name, cols, rows, 1, gdal.GDT_Float32)
+    out_file = output_profile.create(file_name, cols, rows, 1, gdal.GDT_Float32)
 
     out_band = out_file.GetRasterBand(1)
     out_band.WriteArray(out_array, 0, 0)
@@ -131,6 +131,8 @@ def write_raster(file_name, geo, prj, cols, rows, out_array):
     out_file.SetGeoTransform(geo)
     out_file.SetProjection(prj)
 
+    output_profile.finish(out_file, file_name)
+
     out_file = None
 
     return None
@@ -158,8 +160,12 @@ def main():
     parser.add_argument('-to', '--year2', type=str, required=True,
                         help='The end year')
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     if args.type == "trends":
 
         name = "Trendsblock"
@@ -15,8 +15,7 @@ import argparse
 # import glob
 
 import matplotlib
-import numpy as np
-from osgeo import gdal
+import histogram
 
 matplotlib.use("agg")
 import matplotlib.pyplot as plt
@@ -62,9 +61,8 @@ def read_data(cl):
         total_pixels = the total number of Trends pixels in the tile             
     """
 
-    cl_src = gdal.Open(cl, gdal.GA_ReadOnly)
-
-    cl_data = cl_src.GetRasterBand(1).ReadAsArray()
+    # count every from-to value with one read of the raster
+    hist = histogram.get_histogram(cl)
 
     # list of original class values
     classes = [i for i in range(0, 10)]
@@ -74,32 +72,13 @@ def read_data(cl):
 
     # classes = np.unique(cl_data)
 
-    masked_sum = []
-
-    for ind, c in enumerate(classmix):
-
-        mask_cl = np.copy(cl_data)
-
-        if ind == 0:
-
-            mask_cl[mask_cl != int(c)] = 111
-            mask_cl[mask_cl == int(c)] = 1
-            mask_cl[mask_cl == 111] = 0
+    masked_sum = histogram.get_counts(hist, [int(c) for c in classmix])
 
-        else:
-
-            mask_cl[mask_cl != int(c)] = 0
-            mask_cl[mask_cl == int(c)] = 1
-
-        holder = np.sum(mask_cl)
-
-        masked_sum.append(holder)
+    for c, holder in zip(classmix, masked_sum):
 
         # gives an idea of progress for the user
         print(c, " ", holder)
 
-    cl_data, cl_src, mask_cl = None, None, None
-
     return classmix, masked_sum
 
 
@@ -18,10 +18,10 @@ import matplotlib
 matplotlib.use('agg')
 import matplotlib.pyplot as plt
 
-import numpy as np
-from osgeo import gdal
 from pandas import DataFrame
 
+import histogram
+
 
 def get_rasters(indir):
 
@@ -52,10 +52,8 @@ def read_data(cl):
         total_pixels = the total number of Trends pixels in the tile             
     """
 
-    cl_src = gdal.Open(cl, gdal.GA_ReadOnly)
-    # count_src = gdal.Open(count, gdal.GA_ReadOnly)
-
-    cl_data = cl_src.GetRasterBand(1).ReadAsArray()
+    # count every from-to value with one read of the raster
+    hist = histogram.get_histogram(cl)
 
     # these are valid for the NLCD recoded classes, use np.unique below
     # to ignore empty classes if desired
@@ -76,25 +74,13 @@ def read_data(cl):
 
     # classes_original = np.unique(cl_data)
 
-    masked_sum = []
-
-    for c in classes:
-
-        mask_cl = np.copy(cl_data)
+    masked_sum = histogram.get_counts(hist, classes)
 
-        mask_cl[mask_cl != c] = 0
-
-        mask_cl[mask_cl == c] = 1
-
-        holder = np.sum(mask_cl)
-
-        masked_sum.append(holder)
+    for c, holder in zip(classes, masked_sum):
 
         # gives an idea of progress for the user
         print(c, " ", holder)
 
-    cl_data, cl_src, mask_cl = None, None, None
-
     return classes, masked_sum
 
 
@@ -10,11 +10,11 @@ for specific years.
 """
 
 import os, sys, glob
-from osgeo import gdal
-import numpy as np
 import matplotlib
 import argparse
 
+import histogram
+
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from pandas import DataFrame
@@ -60,9 +60,8 @@ def read_data(cl):
         total_pixels = the total number of Trends pixels in the tile
     """
 
-    cl_src = gdal.Open(cl, gdal.GA_ReadOnly)
-
-    cl_data = cl_src.GetRasterBand(1).ReadAsArray()
+    # count every from-to value with one read of the raster
+    hist = histogram.get_histogram(cl)
 
 
     """
@@ -86,9 +85,7 @@ def read_data(cl):
 
     masked_sum = []
 
-    for c in classes:
-
-        mask_cl = np.copy(cl_data)
+    for c, holder in zip(classes, histogram.get_counts(hist, classes)):
 
         if c == 0:
 
@@ -104,43 +101,29 @@ def read_data(cl):
 
         else:
 
-            mask_cl[mask_cl != c] = 0
-
-            mask_cl[mask_cl == c] = 1
-
-            holder = np.sum(mask_cl)
-
             masked_sum.append(holder)
 
             # gives an idea of progress for the user
             print(c, " ", holder)
 
-    total_pixels = get_trends_area(cl_data)
-
-    cl_data, cl_src, mask_cl = None, None, None
+    total_pixels = get_trends_area(hist)
 
     return classes, masked_sum, total_pixels
 
 
-def get_trends_area(data):
+def get_trends_area(hist):
     """Purpose:  Calculate the area of coverage by Trends within the ARD tile,
     which will be used to calculate the percentage for each Trends From-To class.
 
     Args:
-        data = numpy array, the input data
+        hist = dict, the value -> pixel count histogram of the input data
 
     Returns:
         count = integer, the calculated area covered by trends (actually the
         number of trends pixels)
     """
 
-    mask_data = np.copy(data)
-
-    mask_data[mask_data > 0] = 1
-
-    mask_data[mask_data <= 0] = 0
-
-    count = np.sum(mask_data)
+    count = sum(n for value, n in hist.items() if value > 0)
 
     return count
 
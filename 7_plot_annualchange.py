@@ -9,60 +9,33 @@ Generate for all years in a single chart.
 @author: dzelenak
 """
 import os
-import glob
-import re
 import argparse
 import numpy as np
 import matplotlib
 
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt
-from osgeo import gdal
 
+import catalog
+import histogram
 
-def get_rasters(indir, y1='1984', y2='2017'):
-
-    infiles = glob.glob(indir + os.sep + "*.tif")
-
-    yearlist = []
-
-    for f in range(len(infiles) - 1, -1, -1):
-
-        temp_r = os.path.basename(infiles[f])
-
-        temp_year = re.search("\d{4}", os.path.basename(infiles[f])).group(0)
-
-        assert(temp_year)
-
-        if int(y2) < int(temp_year):
 
-            del infiles[f]
-
-        elif int(y1) > int(temp_year):
-
-            del infiles[f]
-
-        else:
-
-            yearlist.append(temp_year)
+def get_rasters(indir, y1='1984', y2='2017'):
 
-    infiles.sort()
+    infiles = catalog.get_files(indir, years=range(int(y1), int(y2) + 1))
 
-    yearlist.sort()
+    yearlist = [catalog.get_year(f) for f in infiles]
 
     return infiles, yearlist
 
 
 def get_data(r):
-    src = gdal.Open(r, gdal.GA_ReadOnly)
-
-    srcdata = src.GetRasterBand(1).ReadAsArray()
-
-    srcdata = srcdata.flatten()
+    # retrieve count of unique values from the histogram catalog, the raster is only read if it changed
+    hist = histogram.get_histogram(r)
 
-    srcdata[srcdata > 0] = 1  # reclassify any change to value 1
+    changed = sum([count for value, count in hist.items() if value > 0])  # count any change as value 1
 
-    bins = np.bincount(srcdata)  # retrieve count of unique values
+    bins = np.array([hist.get(0, 0), changed]) if changed > 0 else np.array([hist.get(0, 0)])
 
     return bins
 
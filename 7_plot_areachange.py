@@ -19,7 +19,8 @@ import numpy as np
 import matplotlib
 matplotlib.use("agg")
 import matplotlib.pyplot as plt
-from osgeo import gdal
+
+import histogram
 
 
 def get_rasters(indir, y1, y2, name):
@@ -40,16 +41,10 @@ def get_rasters(indir, y1, y2, name):
 
 def get_data(r):
 
-    src = gdal.Open(r, gdal.GA_ReadOnly)
-
-    srcdata = src.GetRasterBand(1).ReadAsArray()
-
-    srcdata = srcdata.flatten()
-
-    a_unique = np.arange(np.amax(srcdata) + 1)
+    # retrieve count of unique values from the histogram catalog, the raster is only read if it changed
+    b = histogram.to_bincount(histogram.get_histogram(r))
 
-    # retrieve count of unique values in srcdata array
-    b = np.bincount(srcdata)
+    a_unique = np.arange(len(b))
 
     return b, a_unique
 
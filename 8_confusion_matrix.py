@@ -16,14 +16,16 @@ import datetime
 import os
 import sys
 import argparse
-import glob
 import pprint
 import string
-import re
 import numpy as np
 import pandas as pd
 from osgeo import gdal
 
+import catalog
+import cnf_matrix
+import cutline_mask
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
@@ -39,27 +41,12 @@ def get_file(path, year):
     :return:
     """
 
-    # All files in path ending in .tif
-    filelist = glob.glob("{p}{sep}*.tif".format(p=path, sep=os.sep))
-
-    filelist.sort()
-
-    target_file = None
-
-    # # All files in path containing year string
-    # templist = [item for item in filelist if year in os.path.basename(item)]
-
-    for f in filelist:
-
-        if re.search(r'\d+', os.path.basename(f)).group() == year:
-
-            target_file = f
+    # All .tif files in path for the year
+    filelist = catalog.get_files(path, years=[year])
 
-            break
-
-    if target_file is not None:
+    if len(filelist) > 0:
 
-        return target_file
+        return filelist[0]
 
     else:
 
@@ -114,7 +101,7 @@ def read_data(refdir, preddir, y, mask=None):
         return refdata, preddata_m, classes, reffile, predfile
 
     else:
-        mask_data = gdal.Open(mask, gdal.GA_ReadOnly).ReadAsArray()
+        mask_data = cutline_mask.read_mask(mask, reffile)
 
         try:
             return refdata[mask_data == 1], preddata_m[mask_data == 1], classes, reffile, predfile
@@ -124,106 +111,6 @@ def read_data(refdir, preddir, y, mask=None):
             sys.exit(1)
 
 
-def compute_confusion_matrix(reference, classified, classes):
-    """
-    Generate a confusion matrix that shows the classification accuracy.
-    Columns = Reference Data
-    Rows = Classification Results
-    :param reference:
-    :param classified:
-    :param classes:
-    :return:
-    """
-    total = float(len(classes) ** 2)
-
-    # create boolean arrays of all zeros
-    TP = np.zeros(reference.shape, np.bool)
-
-    FP = np.zeros(reference.shape, np.bool)
-
-    FN = np.zeros(reference.shape, np.bool)
-
-    # create the confusion matrix, for now containing all zeros
-    confusion_matrix = np.zeros((len(classes), len(classes)), np.int32)
-
-    print("generating %s by %s confusion matrix" % (len(classes), len(classes)))
-
-    counter = 1.0
-    # loop through columns
-    for c in classes:
-        # loop through rows
-        for r in classes:
-
-            current = counter / total * 100.0  # as percent
-
-            if c == r:  # TP case
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, TP)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(TP)
-
-            elif classes.index(r) > classes.index(c):
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, FP)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FP)
-
-            elif classes.index(r) < classes.index(c):
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, FN)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FN)
-
-            # show the percent complete
-            sys.stdout.write("\r%s%% Done " % str(current)[:5])
-
-            # needed to display the current percent complete
-            sys.stdout.flush()
-
-            counter += 1.0
-
-        sys.stdout.flush()
-
-    # add row totals in a new column at the end
-    x_sum = confusion_matrix.sum(axis=1)
-
-    x_sum = np.reshape(x_sum, (len(classes), 1))
-
-    confusion_matrix = np.append(arr=confusion_matrix, values=x_sum, axis=1)
-
-    # add column totals in a new row at the end
-    y_sum = confusion_matrix.sum(axis=0)
-
-    y_sum = np.reshape(y_sum, (1, len(classes) + 1))
-
-    confusion_matrix = np.append(arr=confusion_matrix, values=y_sum, axis=0)
-
-    # insert a blank row and column at the top/left to contain class values
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=0, values=0)
-
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=1, values=0)
-
-    # so len(classes) matches row/column shape of confusion matrix
-    classes.insert(0, 0)
-
-    # 99999999 instead of 'total' because can't have strings in array of numbers
-    classes.append(99999999)
-
-    # insert the class names into the blank columns/rows of the matrix
-    for c in range(len(classes)):
-        confusion_matrix[c, 0] = classes[c]
-
-        confusion_matrix[0, c] = classes[c]
-
-    return confusion_matrix
-
-
 def get_fname(ref, y):
     names = ["nlcd", "NLCD", "trends", "Trendsblock", "Trends", "QA", "CoverPrim", "CoverSec"]
 
@@ -460,7 +347,7 @@ def write_to_excel(loc, df, basename, y, startrow=3, startcol=2):
     return None
 
 
-def main_work(ref, pred, output, year, mask=None):
+def main_work(ref, pred, output, year, mask=None, blocksize=None):
     """
 
     :param ref:
@@ -468,14 +355,21 @@ def main_work(ref, pred, output, year, mask=None):
     :param output:
     :param year:
     :param mask:
+    :param blocksize: Optionally read the rasters in blocks of at most blocksize x blocksize pixels
     :return:
     """
     if not os.path.exists(output):
         os.makedirs(output)
 
-    refData, predData, Classes, ref_file, pred_file = read_data(ref, pred, year, mask)
+    if blocksize is None:
+        refData, predData, Classes, ref_file, pred_file = read_data(ref, pred, year, mask)
+
+        cnf_mat = cnf_matrix.compute_confusion_matrix(refData, predData, Classes)
 
-    cnf_mat = compute_confusion_matrix(refData, predData, Classes)
+    else:
+        ref_file, pred_file = get_file(ref, year), get_file(pred, year)
+
+        cnf_mat = cnf_matrix.compute_confusion_matrix_blocks(ref_file, pred_file, mask, blocksize)
 
     fname = get_fname(ref_file, year)
 
@@ -506,7 +400,10 @@ def main():
                         help='The year used to identify matching layers for comparing in the matrix')
 
     parser.add_argument('-m', '--mask', dest='mask', type=str, required=False,
-                        help='Optionally specify a processing mask raster')
+                        help='Optionally specify a processing mask raster or a clipping shapefile')
+
+    parser.add_argument('-bs', '--blocksize', dest='blocksize', type=int, required=False,
+                        help='Optionally read the rasters in blocks of this many rows and columns to limit memory use')
 
     args = parser.parse_args()
 
@@ -1,10 +1,15 @@
 """Clip all rasters in a folder with a specified shapefile"""
 
 import os
+import sys
 import glob
-import subprocess
 import argparse
 
+# the shared cutline_mask module lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cutline_mask
+
 
 def get_files(indir: str, ext: str=".tif") -> list:
     """
@@ -42,20 +47,15 @@ def get_outfile(outdir: str, in_file: str) -> str:
 
 def do_clipping(in_f: str, out_f: str, shp: str) -> None:
     """
-    Use gdalwarp to clip the input raster
+    Crop the input raster to the shapefile and mask the pixels outside of it, the same as gdalwarp -cutline
+    -crop_to_cutline.  The rasterized shapefile is cached, so clipping other rasters on the same grid doesn't
+    rasterize it again.
     :param in_f: Full path to the input raster
     :param out_f: Full path to the output raster
     :param shp: Full path to the clipping shapefile
     :return:
     """
-    subprocess.call([
-        "gdalwarp",
-        "-cutline",
-        shp,
-        "-crop_to_cutline",
-        in_f,
-        out_f
-    ])
+    cutline_mask.clip_raster(infile=in_f, outfile=out_f, shp=shp)
 
     return None
 
@@ -11,6 +11,11 @@ import argparse
 import numpy as np
 from osgeo import gdal
 
+# the shared output_profile module lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import output_profile
+
 
 def err_mesg(src):
     """
@@ -49,8 +54,6 @@ def get_raster(ref1, ref2, out_dir, value, mask):
     if not os.path.exists(out_dir):
         os.makedirs(out_dir)
 
-    driver = gdal.GetDriverByName("GTiff")
-
     basename1 = os.path.splitext(os.path.basename(ref1))[0]
 
     basename2 = os.path.splitext(os.path.basename(ref2))[0]
@@ -65,7 +68,7 @@ def get_raster(ref1, ref2, out_dir, value, mask):
     cols = src0.RasterXSize
     rows = src0.RasterYSize
 
-    outfile = driver.Create(outname, cols, rows, 1, gdal.GDT_Byte)
+    outfile = output_profile.create(outname, cols, rows, 1, gdal.GDT_Byte)
 
     if outfile is None:
         err_mesg(src=outfile)
@@ -76,20 +79,25 @@ def get_raster(ref1, ref2, out_dir, value, mask):
     outfile.SetGeoTransform(src0.GetGeoTransform())
     outfile.SetProjection(src0.GetProjection())
 
+    output_profile.finish(outfile, outname)
+
     src0, outfile, outband = None, None, None
 
     return None
 
 
-def main_work(input1, input2, values, output):
+def main_work(input1, input2, values, output, profile=None):
     """
 
     :param input1: <str>
     :param input2: <str>
     :param values: <int, list>
     :param output: <str>
+    :param profile: <str> The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     set1 = get_data(input1)
 
     set2 = get_data(input2)
@@ -125,6 +133,8 @@ if __name__ == "__main__":
     parser.add_argument("-o", dest="output", required=True, type=str,
                         help="The full path to the output folder")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
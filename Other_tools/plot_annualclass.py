@@ -9,7 +9,7 @@ Generate for all years in a single chart.
 @author: dzelenak
 """
 #%%
-import os, sys, glob, re
+import os, sys
 
 import matplotlib.pyplot as plt
 
@@ -17,7 +17,11 @@ import numpy as np
 
 # from pprint import pprint
 
-from osgeo import gdal
+# the shared catalog and histogram modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import histogram
 
 #%%
 def get_rasters(indir, y1, y2):
@@ -26,48 +30,19 @@ def get_rasters(indir, y1, y2):
 
     if y2 is None: y2 = '2015'
 
-    infiles = glob.glob(indir + os.sep + "*.tif")
-
-    yearlist = []
-
-    for f in range(len(infiles)-1, -1, -1):
-
-        temp_r = os.path.basename(infiles[f])
-
-        temp_year = ( re.split("[_ .]", temp_r)[1] )
+    infiles = catalog.get_files(indir, years=range(int(y1), int(y2) + 1))
 
-        if int(y2) < int(temp_year):
-
-            del infiles[f]
-
-        elif int(y1) > int(temp_year):
-
-            del infiles[f]
-
-        else:
-
-            yearlist.append(temp_year)
-
-    infiles.sort()
-
-    yearlist.sort()
+    yearlist = [catalog.get_year(f) for f in infiles]
 
     return infiles, yearlist
 
 #%%
 def get_data(r):
 
-    src = gdal.Open(r, gdal.GA_ReadOnly)
-
-    srcdata = src.GetRasterBand(1).ReadAsArray()
-
-    srcdata = srcdata.flatten()
-
     # srcdata[srcdata > 0] = 1 # reclassify any change to value 1
 
-    bins = np.bincount(srcdata) # retrieve count of unique values
-
-    src, srcdata = None, None # close these datasets
+    # retrieve count of unique values from the histogram catalog, the raster is only read if it changed
+    bins = histogram.to_bincount(histogram.get_histogram(r))
 
     return bins
 
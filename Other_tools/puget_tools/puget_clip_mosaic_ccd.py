@@ -3,13 +3,22 @@ an eco-region level-3 boundary shapefile, merge tiles for each year."""
 
 import datetime
 import os
-import subprocess
+import sys
 import argparse
 import osr
 import ogr
 import gdal
 import ast
+import traceback
 from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# the shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import band_math
+import cutline_mask
+import output_profile
 
 BBox = namedtuple("BBox", ["left", "right", "top", "bottom"])
 
@@ -49,21 +58,33 @@ def make_geotransform(srv, srr):
     return osr.CoordinateTransformation(srv, srr)
 
 
-def get_bounding_box(layer, raster_gt, coord_trans):
+def get_cutline(shp, srr):
     """
-
-    :param layer:
-    :param raster_gt:
-    :return:
+    Read the AOI boundary and reproject it to the spatial reference of the tiles
+    :param shp: <str> Full path to the AOI shapefile
+    :param srr: <osr.SpatialReference> Spatial reference of the tiles
+    :return: <ogr.Geometry>
     """
-    layer.ResetReading()
+    shp_src = ogr.Open(shp)
+
+    layer = shp_src.GetLayer(0)
 
     feature = layer.GetNextFeature()
 
-    geom = feature.GetGeometryRef()
+    geom = feature.GetGeometryRef().Clone()
+
+    geom.Transform(make_geotransform(srv=layer.GetSpatialRef(), srr=srr))
 
-    geom.Transform(coord_trans)
+    return geom
 
+
+def get_bounding_box(geom, raster_gt):
+    """
+    Snap the envelope of the cutline to the pixel grid of a tile
+    :param geom: <ogr.Geometry> The cutline in the spatial reference of the tile
+    :param raster_gt:
+    :return:
+    """
     min_x, max_x, min_y, max_y = geom.GetEnvelope()
 
     left = min_x - (min_x - raster_gt[0]) % raster_gt[1]
@@ -77,33 +98,38 @@ def get_bounding_box(layer, raster_gt, coord_trans):
     return BBox(left=left, right=right, bottom=bottom, top=top)
 
 
-def clip_and_mosaic(infiles, outdir, year, product, shp):
+def get_mosaic_bounds(jobs, shp):
     """
-
-    :param infiles:
-    :param outdir:
-    :param year:
-    :param product:
-    :param shp
-    :return:
+    Compute the mosaic extent and the cutline mask once for the tile set.  Every product and year is on the same tile
+    grids, so the geotransform of each tile is read from the first of its files that exists.  The mask comes from the
+    cutline_mask cache, so the AOI is only rasterized the first time a mosaic is built on this grid.
+    :param jobs: <list> (infiles, outfile) tuples, the infiles are in the same tile order for every job
+    :param shp: <str> Full path to the AOI shapefile
+    :return: <tuple> The cutline_mask.Mask, the mosaic BBox and the (x, y) resolution
     """
+    tile_files = []
 
+    for i in range(len(jobs[0][0])):
 
-    shp_src = ogr.Open(shp)
+        existing = [infiles[i] for infiles, outfile in jobs if os.path.exists(infiles[i])]
 
-    layer = shp_src.GetLayer(0)
+        if len(existing) == 0:
+            print("\nCould not find any files for tile {}".format(os.path.dirname(jobs[0][0][i])))
 
-    srv = layer.GetSpatialRef()
+            sys.exit(1)
 
-    bboxes = []
+        tile_files.append(existing[0])
 
-    for f in infiles:
+    geom, bboxes = None, []
+
+    for f in tile_files:
 
         gt, srr = get_raster_geoinfo(f)
 
-        bbox = get_bounding_box(layer=layer, raster_gt=gt, coord_trans=make_geotransform(srv=srv, srr=srr))
+        if geom is None:
+            geom = get_cutline(shp, srr)
 
-        bboxes.append(bbox)
+        bboxes.append(get_bounding_box(geom=geom, raster_gt=gt))
 
     left = min([box.left for box in bboxes])
     right = max([box.right for box in bboxes])
@@ -112,23 +138,131 @@ def clip_and_mosaic(infiles, outdir, year, product, shp):
 
     mainbox = BBox(left=left, right=right, top=top, bottom=bottom)
 
-    subprocess.call([
-        "gdalwarp",
-        "-cutline", shp,
-        "-tr", str(abs(gt[1])), str(abs(gt[5])),
-        "-te", str(mainbox.left), str(mainbox.bottom), str(mainbox.right), str(mainbox.top),
-        [" %s " % f for f in infiles],
-        "{outdir}{sep}puget_{year}_{product}.tif".format(outdir=outdir, sep=os.sep, year=year, product=product)
-    ])
+    res = (abs(gt[1]), abs(gt[5]))
 
-    return None
+    geo = (mainbox.left, res[0], 0, mainbox.top, 0, -res[1])
+
+    cols = int(round((mainbox.right - mainbox.left) / res[0]))
 
+    rows = int(round((mainbox.top - mainbox.bottom) / res[1]))
 
-def get_change(HV_list, indir, outdir, ovr, shp, years, products):
+    mask = cutline_mask.get_mask(os.path.abspath(shp), geo, cols, rows, srr.ExportToWkt())
+
+    return mask, mainbox, res
+
+
+def get_source_info(infiles):
     """
+    :param infiles: <list> Full paths to the tiles of one product and year
+    :return: <tuple> The NoData value and color table of the first tile that exists, None for either one it doesn't have
+    """
+    for f in infiles:
+        if os.path.exists(f):
+            band = gdal.Open(f, gdal.GA_ReadOnly).GetRasterBand(1)
+
+            ctable = band.GetRasterColorTable()
 
+            return band.GetNoDataValue(), None if ctable is None else ctable.Clone()
+
+    return None, None
+
+
+def clip_and_mosaic(infiles, outfile, mask, mainbox, res, threads=None, nodata=None, blocksize=1024):
+    """
+    Mosaic the tiles of one product and year through a warped VRT and write the pixels inside the cutline mask.  The
+    VRT is only warped one window at a time as it is read, so no mosaic is held in memory.
+    :param infiles:
+    :param outfile:
+    :param mask: <cutline_mask.Mask> The cutline mask from get_mosaic_bounds
+    :param mainbox: <BBox> The mosaic extent from get_mosaic_bounds
+    :param res: <tuple> The (x, y) output resolution
+    :param threads: <int> Number of threads used by each warp, None for a single threaded warp
+    :param nodata: Optional NoData value of the mosaic, the same as gdalwarp -dstnodata.  The default uses the NoData
+                   value of the tiles like gdalwarp does, or 0 without a NoData value if they don't have one.
+    :param blocksize: <int> Maximum number of rows and columns in a block
     :return:
     """
+    src_nodata, ctable = get_source_info(infiles)
+
+    if nodata is None:
+        nodata = src_nodata
+
+    fill = 0 if nodata is None else nodata
+
+    vrt = "/vsimem/clip_mosaic/{}.vrt".format(os.path.splitext(os.path.basename(outfile))[0])
+
+    options = gdal.WarpOptions(format="VRT",
+                               dstNodata=nodata,
+                               xRes=res[0], yRes=res[1],
+                               outputBounds=(mainbox.left, mainbox.bottom, mainbox.right, mainbox.top),
+                               multithread=threads is not None,
+                               warpOptions=[] if threads is None else ["NUM_THREADS={}".format(threads)])
+
+    mosaic = gdal.Warp(vrt, infiles, options=options)
+
+    if mosaic is None:
+        print("\nCould not mosaic the tiles for {}".format(os.path.basename(outfile)))
+
+        sys.exit(1)
+
+    band = mosaic.GetRasterBand(1)
+
+    out = output_profile.create(outfile, mask.cols, mask.rows, 1, band.DataType)
+
+    out.SetGeoTransform(mosaic.GetGeoTransform())
+    out.SetProjection(mosaic.GetProjection())
+
+    outband = out.GetRasterBand(1)
+
+    if nodata is not None:
+        outband.SetNoDataValue(nodata)
+
+    if ctable is not None:
+        outband.SetRasterColorTable(ctable)
+
+    for xoff, yoff, xsize, ysize in band_math.get_windows(mask.rows, mask.cols, blocksize):
+
+        data = band.ReadAsArray(xoff, yoff, xsize, ysize)
+
+        # pixels outside the cutline are NoData, the same as gdalwarp -cutline
+        data[~cutline_mask.window(mask, xoff, yoff, xsize, ysize)] = fill
+
+        outband.WriteArray(data, xoff, yoff)
+
+    output_profile.finish(out, outfile)
+
+    mosaic, band, out, outband = None, None, None, None
+
+    gdal.Unlink(vrt)
+
+    return None
+
+
+def run_job(job, mask, mainbox, res, threads=None):
+    """
+    Build one mosaic.  Any error is returned rather than raised so that one failed mosaic doesn't stop the rest of the
+    pool.
+    :param job: <tuple> (infiles, outfile)
+    :param mask: <cutline_mask.Mask>
+    :param mainbox: <BBox>
+    :param res: <tuple>
+    :param threads: <int>
+    :return: <str> The traceback of the error, None if the mosaic succeeded
+    """
+    try:
+        clip_and_mosaic(job[0], job[1], mask, mainbox, res, threads)
+
+    except (Exception, SystemExit):
+        return traceback.format_exc()
+
+    return None
+
+
+def get_change(HV_list, indir, outdir, ovr, years, products):
+    """
+
+    :return: <list> (infiles, outfile) for each mosaic that needs to be generated
+    """
     if years is None:
 
         years = [str(y) for y in range(1984, 2016)]
@@ -137,6 +271,8 @@ def get_change(HV_list, indir, outdir, ovr, shp, years, products):
 
         products = ['ChangeMap', 'LastChange', 'ChangeMagMap', 'QAMap', 'SegLength']
 
+    jobs = []
+
     for product in products:
 
         for year in years:
@@ -177,26 +313,25 @@ def get_change(HV_list, indir, outdir, ovr, shp, years, products):
             file_exists = os.path.exists(outfile)
 
             if (file_exists and ovr) or not file_exists:
-                print("Generating file")
-
                 try:
                     os.remove(outfile)
                 except:
                     pass
 
-                clip_and_mosaic(infiles=infiles, outdir=outdir + os.sep + product, year=year, product=product, shp=shp)
+                jobs.append((infiles, outfile))
 
             elif file_exists and not ovr:
                 print("Not overwriting existing files")
 
                 continue
 
-    return None
+    return jobs
+
 
-def get_cover(HV_list, indir, outdir, ovr, shp, years, products):
+def get_cover(HV_list, indir, outdir, ovr, years, products):
     """
 
-    :return:
+    :return: <list> (infiles, outfile) for each mosaic that needs to be generated
     """
     if years is None:
 
@@ -206,6 +341,8 @@ def get_cover(HV_list, indir, outdir, ovr, shp, years, products):
 
         products = ['CoverConfPrim', 'CoverConfSec', 'CoverPrim', 'CoverSec', 'SegChange']
 
+    jobs = []
+
     for product in products:
 
         for year in years:
@@ -232,29 +369,34 @@ def get_cover(HV_list, indir, outdir, ovr, shp, years, products):
             file_exists = os.path.exists(outfile)
 
             if (file_exists and ovr) or not file_exists:
-                print("Generating file")
-
                 try:
                     os.remove(outfile)
                 except:
                     pass
 
-                clip_and_mosaic(infiles=infiles, outdir=outdir + os.sep + product, year=year, product=product, shp=shp)
+                jobs.append((infiles, outfile))
 
             elif file_exists and not ovr:
                 print("Not overwriting existing files")
 
                 continue
-    return None
+
+    return jobs
 
 
-def main_work(indir, outdir, shp, flag, ovr='False', years=None, products=None):
+def main_work(indir, outdir, shp, flag, ovr='False', years=None, products=None, workers=1, threads=None,
+              profile=None):
     """
 
     :param indir:
     :param outdir:
+    :param workers: <int> Number of mosaics built at the same time
+    :param threads: <int> Number of threads used by each warp
+    :param profile: <str> The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     if not os.path.exists(outdir):
         os.makedirs(outdir)
 
@@ -266,15 +408,39 @@ def main_work(indir, outdir, shp, flag, ovr='False', years=None, products=None):
     HV_list = ["H03V01", "H03V02", "H03V03", "H04V01", "H04V02"]
 
     if flag == "change":
-        get_change(HV_list, indir, outdir, ovr, shp, years, products)
+        jobs = get_change(HV_list, indir, outdir, ovr, years, products)
 
-        return None
+    else:
+        jobs = get_cover(HV_list, indir, outdir, ovr, years, products)
 
-    if flag == "cover":
-        get_cover(HV_list, indir, outdir, ovr, shp, years, products)
+    if len(jobs) == 0:
+        print("All of the mosaics already exist")
 
         return None
 
+    mask, mainbox, res = get_mosaic_bounds(jobs, shp)
+
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+
+        futures = {pool.submit(run_job, job, mask, mainbox, res, threads): job[1] for job in jobs}
+
+        for future in as_completed(futures):
+
+            error = future.result()
+
+            if error is None:
+                print("Generated file ", futures[future])
+
+            else:
+                failed.append((futures[future], error))
+
+    for outfile, error in failed:
+        print("\nFAILED {}\n{}".format(outfile, error))
+
+    return failed
+
 
 def main():
     """
@@ -306,6 +472,14 @@ def main():
                         choices=['ChangeMap', 'LastChange', 'ChangeMagMap', 'QAMap', 'SegLength',
                                  'CoverConfPrim', 'CoverConfSec', 'CoverPrim', 'CoverSec', 'SegChange'])
 
+    parser.add_argument("-w", "--workers", dest="workers", required=False, type=int, default=1,
+                        help="The number of mosaics to build at the same time")
+
+    parser.add_argument("-threads", dest="threads", required=False, type=int, default=None,
+                        help="The number of threads used by each warp")
+
+    output_profile.add_argument(parser)
+
     # TODO make more customizable
     # parser.add_argument("-maps", "--maps", dest="products", type=str, nargs="*", default="CoverPrim", required=True,
     #                     choices=["CoverPrim", "CoverSec", "CoverConfPrim", "CoverConfSec", "QAMap",
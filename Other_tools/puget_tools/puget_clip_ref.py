@@ -3,16 +3,16 @@ an eco-region level-3 boundary shapefile, merge tiles for each year."""
 
 import datetime
 import os
-import subprocess
+import sys
 import argparse
-import osr
-import ogr
-import gdal
 import ast
 import glob
-from collections import namedtuple
 
-BBox = namedtuple("BBox", ["left", "right", "top", "bottom"])
+# the shared output_profile module lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import output_profile
+import puget_clip_mosaic_ccd as clip_mosaic
 
 
 def get_time():
@@ -23,105 +23,20 @@ def get_time():
     return(datetime.datetime.now())
 
 
-def get_raster_geoinfo(infile):
-    """
-
-    :param infile:
-    :return:
-    """
-    src = gdal.Open(infile, gdal.GA_ReadOnly)
-
-    gt = src.GetGeoTransform()
-
-    srr = osr.SpatialReference()
-
-    srr.ImportFromWkt(src.GetProjection())
-
-    return gt, srr
-
-
-def make_geotransform(srv, srr):
-    """
-
-    :param spatial_vector:
-    :param spatial_raster:
-    :return:
-    """
-    return osr.CoordinateTransformation(srv, srr)
-
-
-def get_bounding_box(layer, raster_gt, coord_trans):
-    """
-
-    :param layer:
-    :param raster_gt:
-    :return:
-    """
-    layer.ResetReading()
-
-    feature = layer.GetNextFeature()
-
-    geom = feature.GetGeometryRef()
-
-    geom.Transform(coord_trans)
-
-    min_x, max_x, min_y, max_y = geom.GetEnvelope()
-
-    left = min_x - (min_x - raster_gt[0]) % raster_gt[1]
-
-    right = max_x + (raster_gt[1] - ((max_x - raster_gt[0]) % raster_gt[1]))
-
-    bottom = min_y + (raster_gt[5] - ((min_y - raster_gt[3]) % raster_gt[5]))
-
-    top = max_y - (max_y - raster_gt[3]) % raster_gt[5]
-
-    return BBox(left=left, right=right, bottom=bottom, top=top)
-
-
 def clip_and_mosaic(infiles, outfile, year, product, shp):
     """
-
+    Mosaic the reference tiles and mask them with the cached cutline raster, NoData is 0 the same as gdalwarp
+    -dstnodata 0
     :param infiles:
-    :param outdir:
+    :param outfile:
     :param year:
     :param product:
     :param shp
     :return:
     """
+    mask, mainbox, res = clip_mosaic.get_mosaic_bounds([(infiles, outfile)], shp)
 
-
-    shp_src = ogr.Open(shp)
-
-    layer = shp_src.GetLayer(0)
-
-    srv = layer.GetSpatialRef()
-
-    bboxes = []
-
-    for f in infiles:
-
-        gt, srr = get_raster_geoinfo(f)
-
-        bbox = get_bounding_box(layer=layer, raster_gt=gt, coord_trans=make_geotransform(srv=srv, srr=srr))
-
-        bboxes.append(bbox)
-
-    left = min([box.left for box in bboxes])
-    right = max([box.right for box in bboxes])
-    top = max([box.top for box in bboxes])
-    bottom = min([box.bottom for box in bboxes])
-
-    mainbox = BBox(left=left, right=right, top=top, bottom=bottom)
-
-    subprocess.call([
-        "gdalwarp",
-        "-cutline", shp,
-        "-tr", str(abs(gt[1])), str(abs(gt[5])),
-        "-te", str(mainbox.left), str(mainbox.bottom), str(mainbox.right), str(mainbox.top),
-        "-dstnodata", "0",
-        [" %s " % f for f in infiles],
-        outfile
-    ])
+    clip_mosaic.clip_and_mosaic(infiles, outfile, mask, mainbox, res, nodata=0)
 
     return None
 
@@ -218,13 +133,16 @@ def get_nlcd(indir, outdir, product, hv_list, years, ovr, shp):
     return None
 
 
-def main_work(indir, outdir, shp, product, ovr='False'):
+def main_work(indir, outdir, shp, product, ovr='False', profile=None):
     """
 
     :param indir:
     :param outdir:
+    :param profile: <str> The output_profile name
     :return:
     """
+    output_profile.set_profile(profile)
+
     if not os.path.exists(outdir):
         os.makedirs(outdir)
 
@@ -270,6 +188,8 @@ def main():
     parser.add_argument("-ovr", dest="ovr", required=True, type=str, default='False',
                         help="Specify whether or not to overwrite existing outputs")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
     main_work(**vars(args))
@@ -24,6 +24,14 @@ import numpy as np
 import pandas as pd
 from osgeo import gdal
 
+import puget_region
+
+# the shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import cnf_matrix
+import cutline_mask
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
@@ -126,7 +134,7 @@ def read_data(reffile, predfile, mask=None):
         return refdata, preddata, classes # reffile, predfile
 
     else:
-        mask_data = gdal.Open(mask, gdal.GA_ReadOnly).ReadAsArray()
+        mask_data = cutline_mask.read_mask(mask, reffile)
 
         try:
             return refdata[mask_data == 1], preddata_m[mask_data == 1], classes #, reffile, predfile
@@ -136,106 +144,6 @@ def read_data(reffile, predfile, mask=None):
             sys.exit(1)
 
 
-def compute_confusion_matrix(reference, classified, classes):
-    """
-    Generate a confusion matrix that shows the classification accuracy.
-    Columns = Reference Data
-    Rows = Classification Results
-    :param reference:
-    :param classified:
-    :param classes:
-    :return:
-    """
-    total = float(len(classes) ** 2)
-
-    # create boolean arrays of all zeros
-    TP = np.zeros(reference.shape, np.bool)
-
-    FP = np.zeros(reference.shape, np.bool)
-
-    FN = np.zeros(reference.shape, np.bool)
-
-    # create the confusion matrix, for now containing all zeros
-    confusion_matrix = np.zeros((len(classes), len(classes)), np.int32)
-
-    print("generating %s by %s confusion matrix" % (len(classes), len(classes)))
-
-    counter = 1.0
-    # loop through columns
-    for c in classes:
-        # loop through rows
-        for r in classes:
-
-            current = counter / total * 100.0  # as percent
-
-            if c == r:  # TP case
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, TP)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(TP)
-
-            elif classes.index(r) > classes.index(c):
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, FP)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FP)
-
-            elif classes.index(r) < classes.index(c):
-
-                # print('column: ', c, '\trow: ', r)
-
-                np.logical_and(reference == r, classified == c, FN)
-
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FN)
-
-            # show the percent complete
-            sys.stdout.write("\r%s%% Done " % str(current)[:5])
-
-            # needed to display the current percent complete
-            sys.stdout.flush()
-
-            counter += 1.0
-
-        sys.stdout.flush()
-
-    # add row totals in a new column at the end
-    x_sum = confusion_matrix.sum(axis=1)
-
-    x_sum = np.reshape(x_sum, (len(classes), 1))
-
-    confusion_matrix = np.append(arr=confusion_matrix, values=x_sum, axis=1)
-
-    # add column totals in a new row at the end
-    y_sum = confusion_matrix.sum(axis=0)
-
-    y_sum = np.reshape(y_sum, (1, len(classes) + 1))
-
-    confusion_matrix = np.append(arr=confusion_matrix, values=y_sum, axis=0)
-
-    # insert a blank row and column at the top/left to contain class values
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=0, values=0)
-
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=1, values=0)
-
-    # so len(classes) matches row/column shape of confusion matrix
-    classes.insert(0, 0)
-
-    # 99999999 instead of 'total' because can't have strings in array of numbers
-    classes.append(99999999)
-
-    # insert the class names into the blank columns/rows of the matrix
-    for c in range(len(classes)):
-        confusion_matrix[c, 0] = classes[c]
-
-        confusion_matrix[0, c] = classes[c]
-
-    return confusion_matrix
-
-
 def get_fname(ref, block):
     names = ["nlcd", "NLCD", "trends", "Trendsblock", "Trends", "QA", "CoverPrim", "CoverSec"]
 
@@ -500,7 +408,34 @@ def get_block(ref, pred):
         sys.exit(1)
 
 
-def main_work(ref, pred, output, block=None, mask=None):
+def get_ref_block(ref):
+    """
+    :param ref: <str> Full path to a reference block
+    :return: <str> The block number
+    """
+    return re.search(r"\d+", re.search(r"block.\d*", os.path.basename(ref)).group()).group()
+
+
+def get_region_inputs(region, indir, ref, year, product):
+    """
+    Build the virtual mosaic of the prediction on the grid of a reference block.  The cutline shapefile is used as
+    the mask, so it is rasterized on the same grid or loaded from the cutline_mask cache.
+    :param region: <puget_region.Region>
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param ref: <str> Full path to the reference block
+    :param year: <str>
+    :param product: <str>
+    :return: <tuple> Paths of the prediction VRT and the mask shapefile
+    """
+    bounds = puget_region.get_raster_bounds(ref)
+
+    predfile = puget_region.build_vrt(region, indir, product, year, bounds)
+
+    return predfile, region.shp
+
+
+def main_work(ref, pred, output, block=None, mask=None, blocksize=None, shp=None, tiles=None, year=None,
+              product="CoverPrim"):
     """
 
     :param ref:
@@ -508,6 +443,12 @@ def main_work(ref, pred, output, block=None, mask=None):
     :param output:
     :param year:
     :param mask:
+    :param blocksize: Optionally read the rasters in blocks of at most blocksize x blocksize pixels
+    :param shp: Optional cutline shapefile, pred is then the tile directory and the prediction is read through a
+                virtual mosaic of the region.  The cutline replaces mask.
+    :param tiles: The tiles of the region, defaults to the Puget Sound tiles
+    :param year: The year of the prediction to read from the region
+    :param product: The prediction product to read from the region
     :return:
     """
     if not os.path.exists(output):
@@ -515,15 +456,37 @@ def main_work(ref, pred, output, block=None, mask=None):
 
     ref_files = get_files(ref)
 
-    pred_files = get_files(pred)
+    if shp is None:
+        region, pred_files = None, get_files(pred)
+
+    else:
+        if year is None:
+            print("A year is required to read the prediction of a region")
+            sys.exit(1)
+
+        region = puget_region.get_region(pred, shp, tiles or puget_region.HV_LIST, product)
+
+        pred_files = [None] * len(ref_files)
 
     for ref_file, pred_file in zip(ref_files, pred_files):
 
-        block = get_block(ref_file, pred_file)
+        if region is None:
+            block = get_block(ref_file, pred_file)
 
-        refData, predData, Classes = read_data(ref_file, pred_file, mask)
+        else:
+            block = get_ref_block(ref_file)
 
-        cnf_mat = compute_confusion_matrix(refData, predData, Classes)
+            # Read the prediction and the cutline mask on the grid of the reference block
+            pred_file, mask = get_region_inputs(region, pred, ref_file, year, product)
+
+        if blocksize is None:
+            refData, predData, Classes = read_data(ref_file, pred_file, mask)
+
+            cnf_mat = cnf_matrix.compute_confusion_matrix(refData, predData, Classes)
+
+        else:
+            cnf_mat = cnf_matrix.compute_confusion_matrix_blocks(ref_file, pred_file, mask, blocksize,
+                                                                 mask_pred=mask is not None)
 
         fname = get_fname(ref_file, block)
 
@@ -554,7 +517,22 @@ def main():
                         help='The block used to identify matching layers for comparing in the matrix')
 
     parser.add_argument('-m', '--mask', dest='mask', type=str, required=False,
-                        help='Optionally specify a processing mask raster')
+                        help='Optionally specify a processing mask raster or a clipping shapefile')
+
+    parser.add_argument('-bs', '--blocksize', dest='blocksize', type=int, required=False,
+                        help='Optionally read the rasters in blocks of this many rows and columns to limit memory use')
+
+    parser.add_argument('-shp', '--shapefile', dest='shp', type=str, required=False,
+                        help='Optionally read the prediction inside this cutline from the tiles in --prediction')
+
+    parser.add_argument('-hv', '--tiles', dest='tiles', type=str, required=False, nargs='+',
+                        help='The tiles of the region, defaults to the Puget Sound tiles')
+
+    parser.add_argument('-y', '--year', dest='year', type=str, required=False,
+                        help='The year of the prediction to read from the region')
+
+    parser.add_argument('-prod', '--product', dest='product', type=str, required=False, default='CoverPrim',
+                        help='The prediction product to read from the region')
 
     args = parser.parse_args()
 
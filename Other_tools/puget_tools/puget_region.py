@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Read a region of ARD tiles through a virtual mosaic instead of a clipped mosaic raster.
+
+A region is a list of H/V tiles plus a cutline shapefile.  The tiles of a product and year are combined into a VRT
+that covers the snapped extent of the cutline, and the cutline mask on that grid comes from the cutline_mask cache.
+The analysis tools read the VRT in blocks and keep only the pixels inside the cutline, so a new region can be analyzed
+without writing puget_{year}_{product}.tif mosaics first.
+"""
+
+import glob
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+from osgeo import gdal
+
+# the shared cutline_mask module lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import cutline_mask
+import puget_clip_mosaic_ccd as clip_mosaic
+
+gdal.UseExceptions()
+
+# The tiles of the Puget Sound eco-region
+HV_LIST = ["H03V01", "H03V02", "H03V03", "H04V01", "H04V02"]
+
+Region = namedtuple("Region", ["name", "shp", "tiles", "cutline", "srr", "bounds", "res"])
+
+
+def get_tile_file(indir, hv, product, year):
+    """
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param hv: <str> The tile name (e.g. H03V01)
+    :param product: <str> The mapped product (e.g. CoverPrim)
+    :param year: <str>
+    :return: <str> Full path to the product of one tile
+    """
+    return "{indir}{sep}{hv}{sep}maps{sep}{hv}_{prod}_{y}.tif".format(indir=indir, sep=os.sep, hv=hv, prod=product,
+                                                                        y=year)
+
+
+def get_years(indir, product, tiles=HV_LIST):
+    """
+    Find the years of a product that are available for every tile in the region
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param product: <str>
+    :param tiles: <list> The tile names
+    :return: <list> Sorted years
+    """
+    years = None
+
+    for hv in tiles:
+
+        found = set(os.path.splitext(f)[0].split("_")[-1] for f in glob.glob(get_tile_file(indir, hv, product, "*")))
+
+        years = found if years is None else years & found
+
+    if not years:
+        print("\nCould not locate any {} files for the tiles {}\n".format(product, ", ".join(tiles)))
+
+        sys.exit(1)
+
+    return sorted(years)
+
+
+def get_region(indir, shp, tiles=HV_LIST, product="CoverPrim"):
+    """
+    Reproject the cutline to the tile grid and compute the snapped extent of the region
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param shp: <str> Full path to the cutline shapefile
+    :param tiles: <list> The tile names
+    :param product: <str> Product used to read the grid of each tile
+    :return: <Region>
+    """
+    year = get_years(indir, product, tiles)[0]
+
+    cutline, srr, bboxes = None, None, []
+
+    for hv in tiles:
+
+        gt, srr = clip_mosaic.get_raster_geoinfo(get_tile_file(indir, hv, product, year))
+
+        if cutline is None:
+            cutline = clip_mosaic.get_cutline(shp, srr)
+
+        bboxes.append(clip_mosaic.get_bounding_box(geom=cutline, raster_gt=gt))
+
+    bounds = clip_mosaic.BBox(left=min([box.left for box in bboxes]),
+                              right=max([box.right for box in bboxes]),
+                              top=max([box.top for box in bboxes]),
+                              bottom=min([box.bottom for box in bboxes]))
+
+    return Region(name=os.path.splitext(os.path.basename(shp))[0], shp=shp, tiles=list(tiles), cutline=cutline,
+                  srr=srr, bounds=bounds, res=(abs(gt[1]), abs(gt[5])))
+
+
+def get_grid(region, bounds=None):
+    """
+    :param region: <Region>
+    :param bounds: <BBox> Optional extent on the region grid, defaults to the extent of the region
+    :return: <tuple> The geotransform, columns and rows of the grid
+    """
+    bounds = region.bounds if bounds is None else bounds
+
+    cols = int(round((bounds.right - bounds.left) / region.res[0]))
+
+    rows = int(round((bounds.top - bounds.bottom) / region.res[1]))
+
+    return (bounds.left, region.res[0], 0, bounds.top, 0, -region.res[1]), cols, rows
+
+
+def get_raster_bounds(infile):
+    """
+    :param infile: <str> Full path to a raster
+    :return: <BBox> The extent of the raster
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    gt = src.GetGeoTransform()
+
+    return clip_mosaic.BBox(left=gt[0], right=gt[0] + gt[1] * src.RasterXSize,
+                            top=gt[3], bottom=gt[3] + gt[5] * src.RasterYSize)
+
+
+def build_vrt(region, indir, product, year, bounds=None):
+    """
+    Mosaic the tiles of one product and year as an in-memory VRT
+    :param region: <Region>
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param product: <str>
+    :param year: <str>
+    :param bounds: <BBox> Optional extent of the VRT, defaults to the extent of the region
+    :return: <str> Path of the VRT, named like the clipped mosaics (puget_{year}_{product})
+    """
+    bounds = region.bounds if bounds is None else bounds
+
+    outfile = "/vsimem/{name}/puget_{year}_{product}.vrt".format(name=region.name, year=year, product=product)
+
+    infiles = [get_tile_file(indir, hv, product, year) for hv in region.tiles]
+
+    options = gdal.BuildVRTOptions(outputBounds=(bounds.left, bounds.bottom, bounds.right, bounds.top),
+                                   xRes=region.res[0], yRes=region.res[1], resolution="user")
+
+    vrt = gdal.BuildVRT(outfile, infiles, options=options)
+
+    if vrt is None:
+        print("\nCould not build the virtual mosaic {}".format(os.path.basename(outfile)))
+
+        sys.exit(1)
+
+    vrt = None
+
+    return outfile
+
+
+def get_mask(region, bounds=None):
+    """
+    Rasterize the cutline on the region grid, or load it from the cutline_mask cache if it was rasterized before
+    :param region: <Region>
+    :param bounds: <BBox> Optional extent on the region grid, defaults to the extent of the region
+    :return: <numpy.ndarray> UInt8 array, 1 inside the cutline and 0 outside
+    """
+    geo, cols, rows = get_grid(region, bounds)
+
+    mask = cutline_mask.get_mask(os.path.abspath(region.shp), geo, cols, rows, region.srr.ExportToWkt())
+
+    return cutline_mask.to_array(mask).astype(np.uint8)
+
+
+def read_masked(infile, mask, blocksize=1024):
+    """
+    Read the pixels of a raster that are inside the mask.  The raster is read in strips of rows so the values are in
+    the same order as infile_array[mask == 1].
+    :param infile: <str> Full path to a raster or VRT on the same grid as mask
+    :param mask: <numpy.ndarray> 1 for the pixels to keep
+    :param blocksize: <int> Number of rows in a strip
+    :return: <numpy.ndarray> 1D array of the masked values
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    rows, cols = src.RasterYSize, src.RasterXSize
+
+    if mask.shape != (rows, cols):
+        print("The mask is not compatible with the size of the input data")
+
+        sys.exit(1)
+
+    band = src.GetRasterBand(1)
+
+    # an empty selection keeps the data type of the raster if no pixels are inside the mask
+    values = [band.ReadAsArray(0, 0, 1, 1)[np.zeros((1, 1), dtype=bool)]]
+
+    for yoff in range(0, rows, blocksize):
+
+        ysize = min(blocksize, rows - yoff)
+
+        inside = mask[yoff:yoff + ysize] == 1
+
+        if np.any(inside):
+            values.append(band.ReadAsArray(0, yoff, cols, ysize)[inside])
+
+    src, band = None, None
+
+    return np.concatenate(values)
+
+
+def build_vrts(region, indir, product, years=None):
+    """
+    Build the virtual mosaic of a product for each year
+    :param region: <Region>
+    :param indir: <str> Full path to the directory containing the tile folders
+    :param product: <str>
+    :param years: <list> Optional years to include, defaults to every year available for all of the tiles
+    :return: <list> Paths of the VRTs sorted by year
+    """
+    return [build_vrt(region, indir, product, y) for y in get_years(indir, product, region.tiles)
+            if years is None or y in years]
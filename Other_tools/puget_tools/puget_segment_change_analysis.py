@@ -30,6 +30,8 @@ import numpy as np
 import pandas as pd
 from osgeo import gdal
 
+import puget_region
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
@@ -39,11 +41,10 @@ print(t1.strftime("%Y-%m-%d %H:%M:%S\n"))
 # pickle_file = "Other_tools%spuget_tools%spuget_mask.pickle" % (os.sep, os.sep)
 pickle_file = "/lcmap_data/dzelenak/puget/puget_mask.pickle"
 
-with open(pickle_file, "rb") as p:
-    MASK = pickle.load(p)
+# The eco-region mask and its number of pixels, set by main_work from pickle_file or from a region cutline
+MASK = None
 
-# Get the total number of pixels in the eco_region mosaic
-TOTAL = np.bincount(MASK.flatten())[1]
+TOTAL = None
 
 # RGB class colors
 colors = [(0.0, 0.0, 0.0),
@@ -77,6 +78,23 @@ def error_message(file):
     return None
 
 
+def set_mask(mask):
+    """
+    Set the eco-region mask used to select the pixels of each layer
+    :param mask: 1 inside the eco-region and 0 outside
+    :type mask: numpy.ndarray
+    :return:
+    """
+    global MASK, TOTAL
+
+    MASK = mask
+
+    # Get the total number of pixels in the eco_region mosaic
+    TOTAL = np.bincount(MASK.flatten())[1]
+
+    return None
+
+
 def get_files(path, lookfor, years=None):
     """
     Use glob to generate a list of all matching files in the specified path
@@ -188,46 +206,19 @@ def compute_confusion_matrix(fromto, f):
     from_vals = [0, 1, 2, 3, 4, 5, 6, 7, 8]
     to_vals = [0, 1, 2, 3, 4, 5, 6, 7, 8]
 
-    # Used for keeping track of progress for the current cnf matrix calculation
-    total = float(len(from_vals) * len(to_vals))
-
-    # Get the unique values present in the SegmentChange data
-    check_vals = np.unique(fromto)
-
-    # create the confusion matrix, for now containing all zeros
-    confusion_matrix = np.zeros((len(from_vals), len(to_vals)), np.int32)
-
     print(f"\ngenerating {len(to_vals)} by {len(from_vals)} confusion matrix for file {f}")
 
-    counter = 1.0
-
-    # loop through columns
-    for c in from_vals:
-
-        # loop through rows
-        for r in to_vals:
-            # val is concatenated from + to values
-            val = int(str(c) + str(r))
+    # Histogram the SegmentChange data once, the from-to values are at most 2 digits
+    counts = np.bincount(fromto.ravel(), minlength=100)
 
-            # Keep track of the progress relative to the number of total from-to combinations
-            current = counter / total * 100.0  # as percent
+    # The concatenated from + to value for each (from, to) cell, e.g. from 4 to 2 is stored as 42
+    fromto_vals = np.add.outer(np.array(from_vals) * 10, np.array(to_vals))
 
-            if val in check_vals and val != 0:
-                # (c, r) means 'from' is vertical axis and 'to' is the horizontal axis
-                confusion_matrix[to_vals.index(c), from_vals.index(r)] = np.bincount(fromto.flatten())[val]
+    # (c, r) means 'from' is vertical axis and 'to' is the horizontal axis
+    confusion_matrix = counts[fromto_vals].astype(np.int32)
 
-            else:
-                confusion_matrix[to_vals.index(c), from_vals.index(r)] = 0
-
-            # show the percent complete
-            sys.stdout.write("\r%s%% Done " % str(current)[:5])
-
-            # needed to display the current percent complete
-            sys.stdout.flush()
-
-            counter += 1.0
-
-        sys.stdout.flush()
+    # A value of 0 means there was no segment change
+    confusion_matrix[0, 0] = 0
 
     # add row totals in a new column at the end
     x_sum = confusion_matrix.sum(axis=1)
@@ -702,35 +693,54 @@ def get_annual_class_plot(sum_class, sum_class_seg, tile, out_img):
     return None
 
 
-def main_work(indir, outdir, years=None, overwrite=False):
+def main_work(indir, outdir, years=None, overwrite=False, shp=None, tiles=None):
     """
 
     :param indir:
     :param outdir:
     :param years:
     :param overwrite:
+    :param shp: Optional cutline shapefile, indir is then the tile directory and the region is read through virtual
+                mosaics instead of clipped mosaic files
+    :param tiles: The tiles of the region, defaults to the Puget Sound tiles
     :return:
     """
     if not os.path.exists(outdir):
         os.makedirs(outdir)
 
-    # Get list of the segment change files
-    seg_files = get_files(path=indir, years=years, lookfor="SegChange")
+    if shp is None:
+        with open(pickle_file, "rb") as p:
+            set_mask(pickle.load(p))
 
-    # Arbitrarily use the first file in the file list to obtain the tile name.  This assumes that all files in the
-    # directory are associated with the same H-V tile.
-    # tile = get_tile(seg_files[0])
-    tile = "Puget"
+        # Get list of the segment change files
+        seg_files = get_files(path=indir, years=years, lookfor="SegChange")
 
-    # Get list of the primary cover files
-    cover_files = get_files(path=indir, years=years, lookfor="CoverPrim")
+        # Arbitrarily use the first file in the file list to obtain the tile name.  This assumes that all files in the
+        # directory are associated with the same H-V tile.
+        # tile = get_tile(seg_files[0])
+        tile = "Puget"
+
+        # Get list of the primary cover files
+        cover_files = get_files(path=indir, years=years, lookfor="CoverPrim")
+
+    else:
+        region = puget_region.get_region(indir, shp, tiles or puget_region.HV_LIST)
+
+        # The cutline is rasterized once for every layer of the region
+        set_mask(puget_region.get_mask(region))
+
+        seg_files = puget_region.build_vrts(region, indir, "SegChange", years)
+
+        tile = region.name
+
+        cover_files = puget_region.build_vrts(region, indir, "CoverPrim", years)
 
     # Name the cover data pickle
     p_cover = f"{outdir}{os.sep}{tile}_cover_data.pickle"
 
     if not os.path.exists(p_cover):
         # Read in the Cover Data if it wasn't already pickled
-        cover_data = {os.path.basename(f): read_data(f)[MASK == 1] for f in cover_files}
+        cover_data = {os.path.basename(f): puget_region.read_masked(f, MASK) for f in cover_files}
 
         # Pickle the data structure
         with open(p_cover, "wb") as p:
@@ -757,7 +767,7 @@ def main_work(indir, outdir, years=None, overwrite=False):
 
     if not os.path.exists(p_seg):
         # Read in the Segment Change data if the data structure wasn't previously built
-        seg_data = {os.path.basename(f): read_data(f)[MASK == 1] for f in seg_files}
+        seg_data = {os.path.basename(f): puget_region.read_masked(f, MASK) for f in seg_files}
 
         # Pickle the data structure
         with open(p_seg, "wb") as p:
@@ -950,6 +960,12 @@ def main():
     parser.add_argument('-y', '--years', type=str, required=False, nargs="*", default=None,
                         help='Optionally specify a from-to year or years.  Otherwise process all available years')
 
+    parser.add_argument('-shp', '--shapefile', dest="shp", type=str, required=False, default=None,
+                        help='Optionally read the region inside this cutline from the tiles in --indir')
+
+    parser.add_argument('-hv', '--tiles', dest="tiles", type=str, required=False, nargs="+", default=None,
+                        help='The tiles of the region, defaults to the Puget Sound tiles')
+
     args = parser.parse_args()
 
     main_work(**vars(args))
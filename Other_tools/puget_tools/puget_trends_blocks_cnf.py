@@ -24,6 +24,13 @@ import numpy as np
 import pandas as pd
 from osgeo import gdal
 
+# the shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import band_math
+import cnf_matrix
+import cutline_mask
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
@@ -162,7 +169,7 @@ def read_data(reffile, predfile, mask=None):
         return refdata, preddata, classes  # reffile, predfile
 
     else:
-        mask_data = gdal.Open(mask, gdal.GA_ReadOnly).ReadAsArray()
+        mask_data = cutline_mask.read_mask(mask, reffile)
 
         try:
             return refdata[mask_data == 1], preddata[mask_data == 1], classes  # , reffile, predfile
@@ -172,104 +179,126 @@ def read_data(reffile, predfile, mask=None):
             sys.exit(1)
 
 
-def compute_confusion_matrix(reference, classified, classes):
+def zonal_histogram(zones, reffile, predfile, mask=None, field=None, blocksize=1024, nvalues=256):
     """
-    Generate a confusion matrix that shows the classification accuracy.
-    Columns = Reference Data
-    Rows = Classification Results
-    :param reference:
-    :param classified:
-    :param classes:
-    :return:
+    Count every (zone, reference, prediction) value triple in a single pass over the rasters.  The block IDs in a
+    window are mapped to a compact range with np.unique, each pixel is encoded into one index,
+    (compact zone * nvalues + reference) * nvalues + prediction, and the indices of the window are counted with one
+    call to np.bincount, so every Trends block in the region costs one read of each raster and only the blocks that
+    occur are counted, whatever their IDs.
+    :param zones: <str> Full path to a raster of block IDs or a shapefile of the blocks, 0 is outside every block
+    :param reffile: <str> Full path to the reference land cover
+    :param predfile: <str> Full path to the predicted land cover
+    :param mask: <str> Optional full path to a processing mask raster or a clipping shapefile
+    :param field: <str> The block ID attribute when zones is a shapefile
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :param nvalues: <int> The land cover values must be in the range [0, nvalues)
+    :return: Block ID -> counts[reference, prediction] of the pixels inside the mask, and block ID -> present[value]
+             the number of times a value occurs in the reference or prediction of the block including masked pixels
+    :rtype: dict, dict
     """
-    total = float(len(classes) ** 2)
+    print("The reference file is:\n\t{}\n".format(reffile))
+
+    print("The prediction file is:\n\t{}\n".format(predfile))
+
+    ref_src = gdal.Open(reffile, gdal.GA_ReadOnly)
+
+    pred_src = gdal.Open(predfile, gdal.GA_ReadOnly)
+
+    rows, cols = ref_src.RasterYSize, ref_src.RasterXSize
 
-    # create boolean arrays of all zeros
-    TP = np.zeros(reference.shape, np.bool)
+    if (pred_src.RasterYSize, pred_src.RasterXSize) != (rows, cols):
+        print("The prediction is not compatible with the size of the reference data")
+        sys.exit(1)
 
-    FP = np.zeros(reference.shape, np.bool)
+    read_zones = cutline_mask.open_zones(zones, reffile, field)
 
-    FN = np.zeros(reference.shape, np.bool)
+    read_mask = cutline_mask.open_mask(mask, reffile) if mask is not None else None
 
-    # create the confusion matrix, for now containing all zeros
-    confusion_matrix = np.zeros((len(classes), len(classes)), np.int32)
+    ref_band = ref_src.GetRasterBand(1)
 
-    print("generating %s by %s confusion matrix" % (len(classes), len(classes)))
+    pred_band = pred_src.GetRasterBand(1)
 
-    counter = 1.0
-    # loop through columns
-    for c in classes:
-        # loop through rows
-        for r in classes:
+    counts, present = dict(), dict()
 
-            current = counter / total * 100.0  # as percent
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
 
-            if c == r:  # TP case
+        zone = read_zones(xoff, yoff, xsize, ysize).astype(np.int64).ravel()
 
-                # print('column: ', c, '\trow: ', r)
+        ref = ref_band.ReadAsArray(xoff, yoff, xsize, ysize).astype(np.int64).ravel()
 
-                np.logical_and(reference == r, classified == c, TP)
+        pred = pred_band.ReadAsArray(xoff, yoff, xsize, ysize).astype(np.int64).ravel()
 
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(TP)
+        if min(ref.min(), pred.min()) < 0 or max(ref.max(), pred.max()) >= nvalues:
+            print("The land cover values must be between 0 and {}".format(nvalues - 1))
+            sys.exit(1)
 
-            elif classes.index(r) > classes.index(c):
+        keep = zone > 0
 
-                # print('column: ', c, '\trow: ', r)
+        if read_mask is not None:
+            inside = keep & (read_mask(xoff, yoff, xsize, ysize).ravel() == 1)
 
-                np.logical_and(reference == r, classified == c, FP)
+        else:
+            inside = keep
 
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FP)
+        zone, ref, pred, inside = zone[keep], ref[keep], pred[keep], inside[keep]
 
-            elif classes.index(r) < classes.index(c):
+        if zone.size == 0:
+            continue
 
-                # print('column: ', c, '\trow: ', r)
+        # Only the blocks in this window are counted, numbered 0 to len(ids) - 1
+        ids, zone = np.unique(zone, return_inverse=True)
 
-                np.logical_and(reference == r, classified == c, FN)
+        zone = zone.ravel()
 
-                confusion_matrix[classes.index(c), classes.index(r)] = np.sum(FN)
+        window_present = np.bincount(zone * nvalues + ref, minlength=len(ids) * nvalues)
 
-            # show the percent complete
-            sys.stdout.write("\r%s%% Done " % str(current)[:5])
+        window_present += np.bincount(zone * nvalues + pred, minlength=len(ids) * nvalues)
 
-            # needed to display the current percent complete
-            sys.stdout.flush()
+        index = (zone[inside] * nvalues + ref[inside]) * nvalues + pred[inside]
 
-            counter += 1.0
+        window_counts = np.bincount(index, minlength=len(ids) * nvalues * nvalues)
 
-        sys.stdout.flush()
+        for i, block in enumerate(ids.tolist()):
 
-    # add row totals in a new column at the end
-    x_sum = confusion_matrix.sum(axis=1)
+            if block not in counts:
+                counts[block] = np.zeros((nvalues, nvalues), np.int64)
 
-    x_sum = np.reshape(x_sum, (len(classes), 1))
+                present[block] = np.zeros(nvalues, np.int64)
 
-    confusion_matrix = np.append(arr=confusion_matrix, values=x_sum, axis=1)
+            counts[block] += window_counts[i * nvalues * nvalues:(i + 1) * nvalues * nvalues].reshape(nvalues, nvalues)
 
-    # add column totals in a new row at the end
-    y_sum = confusion_matrix.sum(axis=0)
+            present[block] += window_present[i * nvalues:(i + 1) * nvalues]
 
-    y_sum = np.reshape(y_sum, (1, len(classes) + 1))
+    return counts, present
 
-    confusion_matrix = np.append(arr=confusion_matrix, values=y_sum, axis=0)
 
-    # insert a blank row and column at the top/left to contain class values
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=0, values=0)
+def get_zonal_matrices(counts, present):
+    """
+    Build the confusion matrix of every block from the zonal histogram
+    Columns = Reference Data
+    Rows = Classification Results
+    :param counts: <dict> Block ID -> counts[reference, prediction] from zonal_histogram
+    :param present: <dict> Block ID -> present[value] from zonal_histogram
+    :return: <dict> Block ID -> confusion matrix, the same layout as cnf_matrix.compute_confusion_matrix
+    """
+    matrices = dict()
 
-    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=1, values=0)
+    for zone in sorted(counts):
 
-    # so len(classes) matches row/column shape of confusion matrix
-    classes.insert(0, 0)
+        classes = np.flatnonzero(present[zone]).tolist()
 
-    # 99999999 instead of 'total' because can't have strings in array of numbers
-    classes.append(99999999)
+        if len(classes) == 0:
+            continue
 
-    # insert the class names into the blank columns/rows of the matrix
-    for c in range(len(classes)):
-        confusion_matrix[c, 0] = classes[c]
+        print("generating %s by %s confusion matrix for block %s" % (len(classes), len(classes), zone))
 
-        confusion_matrix[0, c] = classes[c]
+        # counts are indexed [reference, prediction], the matrix rows are the classification results
+        matrix = counts[zone][np.ix_(classes, classes)].T
 
-    return confusion_matrix
+        matrices[zone] = cnf_matrix.add_matrix_totals(matrix.astype(np.int32), classes)
+
+    return matrices
 
 
 def get_fname(ref, block):
@@ -580,7 +609,42 @@ def get_block(block, file_list):
             return f
 
 
-def main_work(ref, pred, output, block=None, mask=None):
+def zonal_work(ref, pred, output, zones, field=None, mask=None, blocksize=1024):
+    """
+    Write the confusion matrix of every block from one reference and prediction raster of the whole region
+    :param ref: <str> Full path to the reference land cover
+    :param pred: <str> Full path to the predicted land cover
+    :param output: <str> Full path to the output folder
+    :param zones: <str> Full path to a raster of block IDs or a shapefile of the blocks
+    :param field: <str> The block ID attribute when zones is a shapefile
+    :param mask: <str> Optional full path to a processing mask raster or a clipping shapefile
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return:
+    """
+    if cutline_mask.is_shapefile(zones) and field is None:
+        print("The block ID attribute (-field) is required for a block shapefile")
+        sys.exit(1)
+
+    counts, present = zonal_histogram(zones, ref, pred, mask, field, blocksize)
+
+    for zone, cnf_mat in get_zonal_matrices(counts, present).items():
+
+        block = "block_{}_".format(zone)
+
+        fname = get_fname(ref, block)
+
+        write_to_csv(cnf_mat, output, fname)
+
+        df = array_to_dataframe(cnf_mat)
+
+        write_to_excel(output, df, fname, block=block)
+
+    print("\nAll done")
+
+    return None
+
+
+def main_work(ref, pred, output, block=None, mask=None, blocksize=None, zones=None, field=None):
     """
 
     :param ref:
@@ -589,32 +653,45 @@ def main_work(ref, pred, output, block=None, mask=None):
     :param block:
     :param year:
     :param mask:
+    :param blocksize: Optionally read the rasters in blocks of at most blocksize x blocksize pixels
+    :param zones: Optional raster of block IDs or shapefile of the blocks, ref and pred are then single rasters of the
+                  whole region and every block is counted in one pass
+    :param field: The block ID attribute when zones is a shapefile
     :return:
     """
     if not os.path.exists(output):
         os.makedirs(output)
 
+    if zones is not None:
+        return zonal_work(ref, pred, output, zones, field, mask, blocksize or 1024)
+
     ref_files = get_ref_files(ref)
 
     year = re.search(r"\d\d\d\d", os.path.basename(ref_files[0])).group()
 
     pred_files = get_pred_files(pred, year)
 
-    mask_files = get_mask_files(mask)
+    # a shapefile is used for every block instead of the block-clipped mask files
+    mask_files = None if mask is not None and cutline_mask.is_shapefile(mask) else get_mask_files(mask)
 
     for block in BLOCKS:
 
         # Determine the current files to compare based on the block ID
         ref_file = get_block(block, ref_files)
         pred_file = get_block(block, pred_files)
-        mask_file = get_block(block, mask_files)
+        mask_file = mask if mask_files is None else get_block(block, mask_files)
 
         # for ref_file, pred_file in zip(ref_files, pred_files):
         #     block = get_block(ref_file, pred_file)
 
-        ref_data, pred_data, classes = read_data(ref_file, pred_file, mask_file)
+        if blocksize is None:
+            ref_data, pred_data, classes = read_data(ref_file, pred_file, mask_file)
+
+            cnf_mat = cnf_matrix.compute_confusion_matrix(ref_data, pred_data, classes)
 
-        cnf_mat = compute_confusion_matrix(ref_data, pred_data, classes)
+        else:
+            cnf_mat = cnf_matrix.compute_confusion_matrix_blocks(ref_file, pred_file, mask_file, blocksize,
+                                                                 mask_pred=False)
 
         fname = get_fname(ref_file, block)
 
@@ -645,7 +722,17 @@ def main():
                         help='Optionally, the block used to identify matching layers for comparing in the matrix')
 
     parser.add_argument('-m', '--mask', dest='mask', type=str, required=False,
-                        help='Optionally specify the directory containing block-masks')
+                        help='Optionally specify the directory containing block-masks, or a clipping shapefile')
+
+    parser.add_argument('-bs', '--blocksize', dest='blocksize', type=int, required=False,
+                        help='Optionally read the rasters in blocks of this many rows and columns to limit memory use')
+
+    parser.add_argument('-z', '--zones', dest='zones', type=str, required=False,
+                        help='Optionally specify a raster of block IDs or a shapefile of the blocks, then --reference '
+                             'and --prediction are single rasters of the whole region')
+
+    parser.add_argument('-field', dest='field', type=str, required=False,
+                        help='The block ID attribute of the --zones shapefile')
 
     args = parser.parse_args()
 
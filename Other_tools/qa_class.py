@@ -9,6 +9,11 @@ import sys
 import numpy as np
 from osgeo import gdal
 
+# the shared output_profile module lives in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import output_profile
+
 
 def get_file(infolder, year=None):
     """
@@ -61,13 +66,11 @@ def make_raster(in_file, out_data, outfolder):
     cols = in_src.RasterXSize
     rows = in_src.RasterYSize
 
-    driver = gdal.GetDriverByName("GTiff")
-
     year = in_file[-8:-4]
 
     out_r = f"{outfolder}{os.sep}QA_Cover{year}.tif"
 
-    outfile = driver.Create(out_r, cols, rows, 1, gdal.GDT_UInt16)
+    outfile = output_profile.create(out_r, cols, rows, 1, gdal.GDT_UInt16)
 
     if outfile is None:
         print(f"\nCould not create image file {os.path.basename(out_r)}")
@@ -83,6 +86,8 @@ def make_raster(in_file, out_data, outfolder):
     outfile.SetGeoTransform(in_src.GetGeoTransform())
     outfile.SetProjection(in_src.GetProjection())
 
+    output_profile.finish(outfile, out_r)
+
     in_src, outfile = None, None
 
     return None
@@ -129,8 +134,12 @@ def main():
                         help="The target year for comparing QA and Cover maps.  "
                              "If no year is supplied, then all available years will be processed.")
 
+    output_profile.add_argument(parser)
+
     args = parser.parse_args()
 
+    output_profile.set_profile(args.profile)
+
     main_work(args.qa, args.cover, args.output, args.year)
 
 
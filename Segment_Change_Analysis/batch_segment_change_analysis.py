@@ -7,14 +7,44 @@ Created on Mon Nov 20 15:05:08 2017
 
 import os
 import argparse
-import subprocess
 import datetime
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import segment_change_analysis
 
 t1 = datetime.datetime.now()
 print("Processing started at: ", t1.strftime("%Y-%m-%d %H:%M:%S\n"))
 
 
-def main(rootdir, outdir, tile=None, years=None):
+def run_tile(indir, outfolder, years=None):
+    """
+    Run the segment change analysis for one tile.  Any error is returned rather than raised so that one failed tile
+    doesn't stop the rest of the batch.
+    :param indir: Full path to the tile's maps folder
+    :type indir: str
+    :param outfolder: Full path to the tile's output folder
+    :type outfolder: str
+    :param years: Optionally the years to process
+    :type years: list
+    :return: The traceback of the error (None if the tile succeeded) and the processing time
+    :rtype: str, datetime.timedelta
+    """
+    start = datetime.datetime.now()
+
+    error = None
+
+    try:
+        segment_change_analysis.main_work(indir=indir, outdir=outfolder, years=years)
+
+    # get_files calls sys.exit if a tile has no inputs, so SystemExit has to be caught as well
+    except (Exception, SystemExit):
+        error = traceback.format_exc()
+
+    return error, datetime.datetime.now() - start
+
+
+def main_work(rootdir, outdir, tile=None, years=None, workers=1):
     input_list = []
 
     # Get a list of all the tile subfolders in the root input directory
@@ -30,24 +60,49 @@ def main(rootdir, outdir, tile=None, years=None):
                 if tile in folder:
                     input_list.append(os.path.join(root, folder))
 
-    for f in input_list:
-        # Create the output subfolder within the output root directory
-        outfolder = outdir + os.sep + os.path.basename(f)
+    results = dict()
 
-        if not os.path.exists(outfolder):
-            os.makedirs(outfolder)
+    # Run the tiles in-process across a pool of worker processes
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = dict()
 
-        # Run with the years argument if it was passed any values
-        if years is not None:
-            subprocess.call(f"python segment_change_analysis.py -i {f}{os.sep}maps -o {outfolder} -y {years}",
-                            shell=True)
+        for f in input_list:
+            # Create the output subfolder within the output root directory
+            outfolder = outdir + os.sep + os.path.basename(f)
 
-        # Otherwise, run for all available years in the time series
-        else:
-            subprocess.call(f"python segment_change_analysis.py -i {f}{os.sep}maps -o {outfolder}", shell=True)
+            if not os.path.exists(outfolder):
+                os.makedirs(outfolder)
 
+            jobs[pool.submit(run_tile, f"{f}{os.sep}maps", outfolder, years)] = os.path.basename(f)
 
-if __name__ == "__main__":
+        for job in as_completed(jobs):
+            try:
+                error, elapsed = job.result()
+
+            # The worker process itself failed (e.g. it was killed), record the failure and keep going
+            except Exception:
+                error, elapsed = traceback.format_exc(), None
+
+            results[jobs[job]] = (error, elapsed)
+
+            print(f"\nFinished tile {jobs[job]}: {'FAILED' if error else 'OK'} ({elapsed})")
+
+    failed = [t for t in sorted(results.keys()) if results[t][0] is not None]
+
+    print("\nSummary:")
+
+    for t in sorted(results.keys()):
+        print(f"\t{t}\t{'FAILED' if results[t][0] else 'OK'}\t{results[t][1]}")
+
+    for t in failed:
+        print(f"\nTile {t} failed with:\n{results[t][0]}")
+
+    print(f"\n{len(results) - len(failed)} of {len(results)} tiles completed successfully")
+
+    return failed
+
+
+def main():
     parser = argparse.ArgumentParser()
 
     parser.add_argument("-i", dest="rootdir", type=str, required=True,
@@ -62,9 +117,16 @@ if __name__ == "__main__":
     parser.add_argument("-y", dest="years", type=str, required=False, default=None, nargs="*",
                         help="Optionally specify one or more years to process")
 
+    parser.add_argument("-j", "--workers", dest="workers", type=int, required=False, default=1,
+                        help="The number of tiles to process at the same time")
+
     args = parser.parse_args()
 
-    main(**vars(args))
+    return main_work(**vars(args))
+
+
+if __name__ == "__main__":
+    main()
 
 t2 = datetime.datetime.now()
 print("\nCompleted at: ", t2.strftime("%Y-%m-%d %H:%M:%S"))
@@ -14,12 +14,11 @@ Vertical Axis = Origin classes
 
 import argparse
 import datetime
-import glob
+import json
 import os
 import sys
 import traceback
 import matplotlib
-import pickle
 
 matplotlib.use("agg")
 import matplotlib.patches as mpatches
@@ -30,6 +29,12 @@ import numpy as np
 import pandas as pd
 from osgeo import gdal
 
+# the shared catalog and histogram modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import catalog
+import histogram
+
 gdal.UseExceptions()
 gdal.AllRegister()
 
@@ -70,7 +75,7 @@ def error_message(file):
 
 def get_files(path, lookfor, years=None):
     """
-    Use glob to generate a list of all matching files in the specified path
+    Look up all matching files in the specified path in the product catalog
     :param path: Full path to the location of the From-To layers
     :type path: str
     :param year: Year to look for in the file names
@@ -81,20 +86,14 @@ def get_files(path, lookfor, years=None):
     :rtype: list
     """
     # All files in path ending in .tif
-    filelist = glob.glob(f"{path}{os.sep}*_{lookfor}*.tif")
-
-    filelist.sort()
+    filelist = catalog.get_files(path, product=lookfor, years=years)
 
     if len(filelist) == 0:
         print("\nCould not locate any files {}\n".format(path))
 
         sys.exit(1)
 
-    if years is None:
-        return filelist
-
-    else:
-        return [f for f in filelist for y in years if y in f]
+    return filelist
 
 
 def read_data(infile):
@@ -108,6 +107,87 @@ def read_data(infile):
     return gdal.Open(infile, gdal.GA_ReadOnly).ReadAsArray()
 
 
+def get_source_stamp(infile):
+    """
+    Describe the current state of an input file so that cached results derived from it can be checked for staleness
+    :param infile: The full path to the input raster
+    :type infile: str
+    :return: The absolute path, size in bytes, and modification time of the file
+    :rtype: dict
+    """
+    stat = os.stat(infile)
+
+    return {"path": os.path.abspath(infile), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_manifest(cache_dir):
+    """
+    Load the manifest that records which input file each cached array was built from
+    :param cache_dir: Full path to the cache directory
+    :type cache_dir: str
+    :return: Mapping of cached .npy file name to the source stamp of its input
+    :rtype: dict
+    """
+    manifest_file = os.path.join(cache_dir, "manifest.json")
+
+    if not os.path.exists(manifest_file):
+        return dict()
+
+    with open(manifest_file, "r") as m:
+        return json.load(m)
+
+
+def save_manifest(cache_dir, manifest):
+    """
+    Write the cache manifest, replacing any previous version
+    :param cache_dir: Full path to the cache directory
+    :type cache_dir: str
+    :param manifest: Mapping of cached .npy file name to the source stamp of its input
+    :type manifest: dict
+    :return:
+    """
+    manifest_file = os.path.join(cache_dir, "manifest.json")
+
+    with open(manifest_file + ".tmp", "w") as m:
+        json.dump(manifest, m, indent=1, sort_keys=True)
+
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+    return None
+
+
+def get_cached_array(cache_dir, manifest, kind, infile, func):
+    """
+    Return the array computed from infile by func, using the cached .npy copy if infile has not changed since the
+    cache was built.  Cached arrays are memory-mapped so only the parts that are used are read from disk.
+    :param cache_dir: Full path to the cache directory
+    :type cache_dir: str
+    :param manifest: Mapping of cached .npy file name to the source stamp of its input, updated in place
+    :type manifest: dict
+    :param kind: The type of cached data (e.g. cover or segchange)
+    :type kind: str
+    :param infile: The full path to the input raster the array is derived from
+    :type infile: str
+    :param func: Function that computes the array from infile
+    :return: Array object
+    :rtype: numpy.ndarray
+    """
+    key = f"{kind}_{os.path.splitext(os.path.basename(infile))[0]}.npy"
+
+    npy = os.path.join(cache_dir, key)
+
+    stamp = get_source_stamp(infile)
+
+    if manifest.get(key) == stamp and os.path.exists(npy):
+        return np.load(npy, mmap_mode="r")
+
+    np.save(npy, func(infile))
+
+    manifest[key] = stamp
+
+    return np.load(npy, mmap_mode="r")
+
+
 def get_tile(infile):
     """
     Get the name of the H-V tile by looking at one of the files in the file list
@@ -116,21 +196,7 @@ def get_tile(infile):
     :return: The tile name (e.g. H25V42)
     :rtype: str
     """
-    looking = infile.split(sep=os.sep)
-
-    L = ""
-
-    for l in looking:
-        if ("h" in l or "H" in l) and ("v" in l or "V" in l):
-            L = l
-            break
-
-    try:
-        tile = L.split(sep="_")[1]
-    except IndexError:
-        tile = L
-
-    return tile.upper()
+    return catalog.get_tile(infile)
 
 
 def get_fname(infile):
@@ -146,14 +212,38 @@ def get_fname(infile):
     return basename, basename[-4:]
 
 
-def get_cover_table(indata):
+def get_cover_counts(infile, refresh=False):
     """
-    Create pandas DataFrames from the thematic land cover product
-    :param indata:
-    :return:
+    Count the pixels of each class in a thematic land cover product.  The counts come from the shared histogram
+    catalog, so the raster is only read if it changed since it was last counted.
+    :param infile: The full path to the input raster
+    :type infile: str
+    :param refresh: Read the raster even if the catalog has a current histogram
+    :type refresh: bool
+    :return: The number of pixels of each class value
+    :rtype: numpy.ndarray
+    """
+    return histogram.to_bincount(histogram.get_histogram(infile, refresh=refresh))
+
+
+def get_segchange_matrix(infile):
     """
-    val_counts = np.bincount(indata.flatten())
+    Read a Segment Change layer and calculate its from-to confusion matrix.  Only the matrix is kept, the raster itself
+    is released as soon as the matrix has been calculated.
+    :param infile: The full path to the input raster
+    :type infile: str
+    :return: The from-to confusion matrix
+    :rtype: numpy.ndarray
+    """
+    return compute_confusion_matrix(read_data(infile), os.path.basename(infile))
+
 
+def get_cover_table(val_counts):
+    """
+    Create pandas DataFrames from the class counts of the thematic land cover product
+    :param val_counts: The number of pixels of each class value
+    :return:
+    """
     total = np.sum(val_counts)
 
     val_percents = np.zeros_like(val_counts, dtype=np.float)
@@ -178,46 +268,19 @@ def compute_confusion_matrix(fromto, f):
     from_vals = [0, 1, 2, 3, 4, 5, 6, 7, 8]
     to_vals = [0, 1, 2, 3, 4, 5, 6, 7, 8]
 
-    # Used for keeping track of progress for the current cnf matrix calculation
-    total = float(len(from_vals) * len(to_vals))
-
-    # Get the unique values present in the SegmentChange data
-    check_vals = np.unique(fromto)
-
-    # create the confusion matrix, for now containing all zeros
-    confusion_matrix = np.zeros((len(from_vals), len(to_vals)), np.int32)
-
     print(f"\ngenerating {len(to_vals)} by {len(from_vals)} confusion matrix for file {f}")
 
-    counter = 1.0
-
-    # loop through columns
-    for c in from_vals:
-
-        # loop through rows
-        for r in to_vals:
-            # val is concatenated from + to values
-            val = int(str(c) + str(r))
-
-            # Keep track of the progress relative to the number of total from-to combinations
-            current = counter / total * 100.0  # as percent
-
-            if val in check_vals and val != 0:
-                # (c, r) means 'from' is vertical axis and 'to' is the horizontal axis
-                confusion_matrix[to_vals.index(c), from_vals.index(r)] = np.bincount(fromto.flatten())[val]
+    # Histogram the SegmentChange data once, the from-to values are at most 2 digits
+    counts = np.bincount(fromto.ravel(), minlength=100)
 
-            else:
-                confusion_matrix[to_vals.index(c), from_vals.index(r)] = 0
-
-            # show the percent complete
-            sys.stdout.write("\r%s%% Done " % str(current)[:5])
-
-            # needed to display the current percent complete
-            sys.stdout.flush()
+    # The concatenated from + to value for each (from, to) cell, e.g. from 4 to 2 is stored as 42
+    fromto_vals = np.add.outer(np.array(from_vals) * 10, np.array(to_vals))
 
-            counter += 1.0
+    # (c, r) means 'from' is vertical axis and 'to' is the horizontal axis
+    confusion_matrix = counts[fromto_vals].astype(np.int32)
 
-        sys.stdout.flush()
+    # A value of 0 means there was no segment change
+    confusion_matrix[0, 0] = 0
 
     # add row totals in a new column at the end
     x_sum = confusion_matrix.sum(axis=1)
@@ -711,64 +774,30 @@ def main_work(indir, outdir, years=None, overwrite=False):
     # Get list of the primary cover files
     cover_files = get_files(path=indir, years=years, lookfor="CoverPrim")
 
-    # Name the cover data pickle
-    p_cover = f"{outdir}{os.sep}{tile}_cover_data.pickle"
-
-    if not os.path.exists(p_cover):
-        # Read in the Cover Data if it wasn't already pickled
-        cover_data = {os.path.basename(f): read_data(f) for f in cover_files}
-
-        # Pickle the data structure
-        with open(p_cover, "wb") as p:
-            pickle.dump(cover_data, p)
-
-    # This block of code was previously used to over-write any pre-existing pickles
-    # elif os.path.exists(p_cover):
-    #     os.remove(p_cover)
-    #
-    #     # Read in the Cover Data
-    #     cover_data = {os.path.basename(f): read_data(f) for f in cover_files}
-    #
-    #     # Pickle the data structure
-    #     with open(p_cover, "wb") as p:
-    #         pickle.dump(cover_data, p)
-
-    else:
-        # If the data structure was previously built, save time by reading it in rather than recreating it
-        with open(p_cover, "rb") as p:
-            cover_data = pickle.load(p)
-
-    # Name the segment change pickle
-    p_seg = f"{outdir}{os.sep}{tile}_segchange_data.pickle"
-
-    if not os.path.exists(p_seg):
-        # Read in the Segment Change data if the data structure wasn't previously built
-        seg_data = {os.path.basename(f): read_data(f) for f in seg_files}
-
-        # Pickle the data structure
-        with open(p_seg, "wb") as p:
-            pickle.dump(seg_data, p)
-
-    else:
-        # If the data structure was previously built, save time by reading it in rather than recreating it
-        with open(p_seg, "rb") as p:
-            seg_data = pickle.load(p)
-
-    # Name the segment change confusion matrix pickle
-    p_cnf = f"{outdir}{os.sep}{tile}_segchange_cnf.pickle"
-
-    if not os.path.exists(p_cnf):
-        # Calculate the Segment Change confusion matrices
-        seg_confusion = {f: compute_confusion_matrix(seg_data[f], f) for f in seg_data.keys()}
-
-        # Pickle the data structure
-        with open(p_cnf, "wb") as p:
-            pickle.dump(seg_confusion, p)
-
-    else:
-        # If the data structure was previously built, save time by reading it in rather than recreating it
-        with open(p_cnf, "rb") as p:
-            seg_confusion = pickle.load(p)
+    # Cached per-year results are kept in one directory along with a manifest of the inputs they were built from
+    cache_dir = f"{outdir}{os.sep}{tile}_cache"
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    # Start from an empty manifest when overwriting so that every cached result is rebuilt
+    manifest = load_manifest(cache_dir) if not overwrite else dict()
+
+    # Work through the years one at a time so that only one raster is held in memory.  Only the small per-year
+    # results are kept, and these are only recomputed if their input changed.  The class counts are shared with the
+    # other stages through the histogram catalog.
+    cover_counts = dict()
+
+    for f in cover_files:
+        cover_counts[os.path.basename(f)] = get_cover_counts(f, refresh=overwrite)
+
+    seg_confusion = dict()
+
+    for f in seg_files:
+        seg_confusion[os.path.basename(f)] = get_cached_array(cache_dir, manifest, "segchange_cnf", f,
+                                                              get_segchange_matrix)
+
+    save_manifest(cache_dir, manifest)
 
     # Get the Originating Class values
     seg_from = {f: seg_confusion[f][1:, -1:].flatten() for f in seg_confusion.keys()}
@@ -799,31 +828,9 @@ def main_work(indir, outdir, years=None, overwrite=False):
     # Create a dict of the class quantities that had segment change
     seg_class_totals = {key: list(seg_confusion[key][:, -1][1:-1]) for key in seg_confusion.keys()}
 
-    # Name the class totals pickle
-    p_class_totals = f"{outdir}{os.sep}{tile}_class_totals.pickle"
-
-    if not os.path.exists(p_class_totals):
-        # Create a dict of the overall class quantities
-        class_totals = {key: [np.bincount(cover_data[key].flatten())[c] for c in classes] for key in cover_data.keys()}
-
-        # Pickle the data structure
-        with open(p_class_totals, "wb") as p:
-            pickle.dump(class_totals, p)
-
-
-    # elif os.path.exists(p_class_totals):
-    #     os.remove(p_class_totals)
-    #
-    #     # Create a dict of the overall class quantities
-    #     class_totals = {key: [np.bincount(cover_data[key].flatten())[c] for c in classes] for key in cover_data.keys()}
-    #
-    #     # Pickle the data structure
-    #     with open(p_class_totals, "wb") as p:
-    #         pickle.dump(class_totals, p)
-
-    else:
-        with open(p_class_totals, "rb") as p:
-            class_totals = pickle.load(p)
+    # Create a dict of the overall class quantities
+    class_totals = {key: [cover_counts[key][c] if c < len(cover_counts[key]) else 0 for c in classes]
+                    for key in cover_counts.keys()}
 
     # Create an XlsxWriter object to create a workbook with multiple sheets
     xlsx_name = outdir + os.sep + tile + "_segment_analysis.xlsx"
@@ -876,14 +883,13 @@ def main_work(indir, outdir, years=None, overwrite=False):
         seg_df = array_to_dataframe(seg_confusion[segkey])
 
         # Get DataFrame for the quantity of cover and percentage of cover classes
-        cover_table, cover_perc_table = get_cover_table(indata=cover_data[coverkey])
+        cover_table, cover_perc_table = get_cover_table(val_counts=cover_counts[coverkey])
 
         # Make the annual segment change plots
         seg_class_areas, cover_areas, cover_percents, seg_total = get_seg_change_plots(seg_matrix=seg_confusion[segkey],
                                                                                        seg_table=seg_df,
-                                                                                       cover_matrix=np.bincount(
-                                                                                           cover_data[
-                                                                                               coverkey].flatten()),
+                                                                                       cover_matrix=cover_counts[
+                                                                                           coverkey],
                                                                                        tile=tile, year=current_year,
                                                                                        out_img=img_name)
 
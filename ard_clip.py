@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Clip ARD grid tiles out of a larger raster in-process.
+
+The extent of an H/V tile is converted to a pixel window of the source raster once, only that window is read, and the
+clip is written directly with the current output_profile.  Windows that are entirely NoData are detected from the
+array that was read, so empty tiles are never written.  The source raster is opened once for any number of tiles.
+"""
+
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+from osgeo import gdal
+
+import output_profile
+
+gdal.UseExceptions()
+
+GeoExtent = namedtuple('GeoExtent', ['x_min', 'y_max', 'x_max', 'y_min'])
+
+CONUS_EXTENT = GeoExtent(x_min=-2565585,
+                         y_min=14805,
+                         x_max=2384415,
+                         y_max=3314805)
+
+# ARD tiles are 5000 x 5000 pixels of 30 m
+TILE_SIZE = 5000 * 30
+
+# WKT of the ARD Albers projection, kept in the repository root
+WKT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ard_srs.wkt")
+
+
+def geospatial_hv(h, v, loc=CONUS_EXTENT):
+    """
+    Geospatial extent and 30m affine for a given ARD grid location.
+
+    :param h:
+    :param v:
+    :param loc:
+    :return:
+    """
+
+    xmin = loc.x_min + h * TILE_SIZE
+    xmax = loc.x_min + h * TILE_SIZE + TILE_SIZE
+    ymax = loc.y_max - v * TILE_SIZE
+    ymin = loc.y_max - v * TILE_SIZE - TILE_SIZE
+
+    return GeoExtent(x_min=xmin, x_max=xmax, y_max=ymax, y_min=ymin)
+
+
+def get_tiles(values):
+    """
+    Pair up a flat list of H and V values from the command line
+    :param values: <list> HH VV [HH VV ...]
+    :return: <list> (h, v) tuples
+    """
+    if len(values) % 2 != 0:
+        print("\nThe H/V tiles must be given as pairs of HH VV values")
+
+        sys.exit(1)
+
+    return [(int(values[i]), int(values[i + 1])) for i in range(0, len(values), 2)]
+
+
+def get_srs(wkt=WKT):
+    """
+    Read the ARD projection, the same WKT file that was passed to gdal_translate -a_srs
+    :param wkt: <str> Full path to the WKT file
+    :return: <str> The projection WKT, or None if the file doesn't exist
+    """
+    if not os.path.exists(wkt):
+        return None
+
+    with open(wkt, "r") as txt:
+        return txt.read()
+
+
+def get_window(geo, extent):
+    """
+    Convert a geospatial extent to a pixel window of a raster, the window may extend past the edges of the raster
+    :param geo: <tuple> Geotransform of the raster
+    :param extent: <GeoExtent>
+    :return: <tuple> (xoff, yoff, xsize, ysize)
+    """
+    xoff = int(round((extent.x_min - geo[0]) / geo[1]))
+    yoff = int(round((extent.y_max - geo[3]) / geo[5]))
+
+    xsize = int(round((extent.x_max - extent.x_min) / geo[1]))
+    ysize = int(round((extent.y_min - extent.y_max) / geo[5]))
+
+    return xoff, yoff, xsize, ysize
+
+
+def read_window(band, window, fill=0):
+    """
+    Read a pixel window of a band.  The part of the window that falls outside the raster is set to fill, the way
+    gdal_translate -projwin fills a partially overlapping window.
+    :param band: <gdal.Band>
+    :param window: <tuple> (xoff, yoff, xsize, ysize) from get_window
+    :param fill: The value for pixels outside the raster
+    :return: <numpy.ndarray> The window, or None if it doesn't overlap the raster
+    """
+    xoff, yoff, xsize, ysize = window
+
+    x0, y0 = max(xoff, 0), max(yoff, 0)
+    x1, y1 = min(xoff + xsize, band.XSize), min(yoff + ysize, band.YSize)
+
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    data = band.ReadAsArray(x0, y0, x1 - x0, y1 - y0)
+
+    if (x0, y0, x1, y1) == (xoff, yoff, xoff + xsize, yoff + ysize):
+        return data
+
+    out = np.full((ysize, xsize), fill, dtype=data.dtype)
+
+    out[y0 - yoff:y1 - yoff, x0 - xoff:x1 - xoff] = data
+
+    return out
+
+
+def is_empty(data, nodata=None):
+    """
+    :param data: <numpy.ndarray>
+    :param nodata: The NoData value of the raster, 0 if it has none
+    :return: <bool> True if every pixel is NoData
+    """
+    return not np.any(data != (0 if nodata is None else nodata))
+
+
+def clip_tiles(infile, tiles, get_outfile, srs=None, keep_empty=False, empty_value=None):
+    """
+    Clip ARD tiles out of a single band raster
+    :param infile: <str> Full path to the input raster
+    :param tiles: <list> (h, v) tuples
+    :param get_outfile: <function> Takes h and v and returns the full path of the output raster
+    :param srs: <str> Projection WKT assigned to the outputs, the default keeps the input projection
+    :param keep_empty: <bool> Write tiles that are entirely NoData
+    :param empty_value: The value that makes a tile empty when every pixel has it, the default is the NoData value of
+                        the input (0 if it has none)
+    :return: <list> The outputs that were written
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    if src is None:
+        print("Could not open image file {a}".format(a=os.path.basename(infile)))
+
+        sys.exit(1)
+
+    geo = src.GetGeoTransform()
+
+    band = src.GetRasterBand(1)
+
+    nodata = band.GetNoDataValue()
+
+    ctable = band.GetRasterColorTable()
+
+    written = []
+
+    for h, v in tiles:
+        extent = geospatial_hv(h, v)
+
+        window = get_window(geo, extent)
+
+        data = read_window(band, window, fill=0 if nodata is None else nodata)
+
+        if data is None:
+            print("\tH{:02d}V{:02d} doesn't overlap the input and was skipped".format(h, v))
+
+            continue
+
+        if not keep_empty and is_empty(data, nodata if empty_value is None else empty_value):
+            print("\tH{:02d}V{:02d} is entirely no data and was skipped".format(h, v))
+
+            continue
+
+        outfile = get_outfile(h, v)
+
+        if not os.path.exists(os.path.dirname(outfile)):
+            os.makedirs(os.path.dirname(outfile))
+
+        print("\tProducing output {}".format(outfile))
+
+        out = output_profile.create(outfile, window[2], window[3], 1, band.DataType)
+
+        out.SetGeoTransform((extent.x_min, geo[1], 0, extent.y_max, 0, geo[5]))
+        out.SetProjection(src.GetProjection() if srs is None else srs)
+
+        outband = out.GetRasterBand(1)
+
+        if nodata is not None:
+            outband.SetNoDataValue(nodata)
+
+        if ctable is not None:
+            outband.SetRasterColorTable(ctable)
+
+        outband.WriteArray(data)
+
+        output_profile.finish(out, outfile)
+
+        out, outband, data = None, None, None
+
+        written.append(outfile)
+
+    src, band = None, None
+
+    return written
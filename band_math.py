@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Evaluate gdal_calc style band-math expressions in-process on NumPy blocks.
+
+An expression such as "A != B" is evaluated for each set of input rasters, one block at a time, and the results are
+summed.  The running sum can be written after any set, so a chain of gdal_calc calls that compares year pairs and adds
+the result to the previous output becomes a single pass that only writes the final rasters.  Like gdal_calc, a pixel
+that is NoData in any input is NoData in the output, and the output NoData defaults to the gdal_calc value for its type.
+"""
+
+import os
+import sys
+
+import numpy as np
+from osgeo import gdal
+
+import output_profile
+
+gdal.UseExceptions()
+
+# NumPy types used to hold the result for each GDAL output type
+NP_TYPES = {gdal.GDT_Byte: np.uint8,
+            gdal.GDT_UInt16: np.uint16,
+            gdal.GDT_Int16: np.int16,
+            gdal.GDT_UInt32: np.uint32,
+            gdal.GDT_Int32: np.int32,
+            gdal.GDT_Float32: np.float32,
+            gdal.GDT_Float64: np.float64}
+
+# The NoData value gdal_calc gives an output of each GDAL type when --NoDataValue isn't used
+DEFAULT_NODATA = {gdal.GDT_Byte: 255,
+                  gdal.GDT_UInt16: 65535,
+                  gdal.GDT_Int16: -32767,
+                  gdal.GDT_UInt32: 4294967293,
+                  gdal.GDT_Int32: -2147483647,
+                  gdal.GDT_Float32: 3.402823466E+38,
+                  gdal.GDT_Float64: 1.7976931348623158E+308}
+
+
+def get_windows(rows, cols, blocksize):
+    """
+    Generate the read/write windows that cover a raster in blocks of at most blocksize x blocksize pixels
+    :param rows: <int> Number of rows in the raster
+    :param cols: <int> Number of columns in the raster
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return: Generator of (xoff, yoff, xsize, ysize) tuples
+    """
+    for yoff in range(0, rows, blocksize):
+
+        ysize = min(blocksize, rows - yoff)
+
+        for xoff in range(0, cols, blocksize):
+
+            yield xoff, yoff, min(blocksize, cols - xoff), ysize
+
+
+def create_output(outfile, fformat, cols, rows, dtype, geo, prj, nodata=None):
+    """
+    Create the single band output raster.  GTiff outputs use the current output_profile, other formats that GDAL can
+    only write with CreateCopy (e.g. AAIGrid) are built in memory first and copied to outfile by finish_output.
+    :param outfile: <str> Full path to the output raster
+    :param fformat: <str> GDAL driver name
+    :param cols: <int>
+    :param rows: <int>
+    :param dtype: <int> GDAL data type
+    :param geo: <tuple> Geotransform
+    :param prj: <str> Projection WKT
+    :param nodata: Optional NoData value
+    :return: <gdal.Dataset>
+    """
+    driver = gdal.GetDriverByName(fformat)
+
+    if fformat == "GTiff":
+        out = output_profile.create(outfile, cols, rows, 1, dtype)
+
+    elif driver.GetMetadataItem(gdal.DCAP_CREATE) == "YES":
+        out = driver.Create(outfile, cols, rows, 1, dtype)
+
+    else:
+        out = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, dtype)
+
+    if out is None:
+        print("\nCould not create image file {}".format(os.path.basename(outfile)))
+
+        sys.exit(1)
+
+    out.SetGeoTransform(geo)
+    out.SetProjection(prj)
+
+    if nodata is not None:
+        out.GetRasterBand(1).SetNoDataValue(nodata)
+
+    return out
+
+
+def finish_output(out, outfile, fformat):
+    """
+    Flush the output raster to disk, copying it from memory for formats that don't support Create
+    :param out: <gdal.Dataset>
+    :param outfile: <str> Full path to the output raster
+    :param fformat: <str> GDAL driver name
+    :return:
+    """
+    if fformat == "GTiff":
+        return output_profile.finish(out, outfile)
+
+    out.GetRasterBand(1).FlushCache()
+
+    if out.GetDriver().ShortName == "MEM":
+        gdal.GetDriverByName(fformat).CreateCopy(outfile, out)
+
+    return None
+
+
+def band_calc(calc, input_sets, outfiles, fformat="GTiff", dtype=gdal.GDT_Int16, nodata=None, blocksize=1024,
+              mask_nodata=True):
+    """
+    Evaluate calc for every set of input rasters and write the running sum of the results.  Each raster is read once
+    per block even if it appears in more than one set, and only the requested outputs are written.
+    :param calc: <str> Expression using NumPy syntax and the names in input_sets (e.g. "A != B")
+    :param input_sets: <list> Dicts that map each name used in calc to the full path of a raster
+    :param outfiles: <list> Output raster paths aligned with input_sets.  The sum of the results for input_sets[0]
+                     through input_sets[i] is written to outfiles[i], use None to skip writing an output.
+    :param fformat: <str> GDAL driver name for the outputs
+    :param dtype: <int> GDAL data type for the outputs
+    :param nodata: NoData value for the outputs, the default is the gdal_calc value for dtype if mask_nodata is set
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :param mask_nodata: <bool> Set an output pixel to nodata if it is NoData in any input of input_sets[0] through
+                        input_sets[i], the way a chain of gdal_calc calls does
+    :return: <list> The outputs that were written
+    """
+    code = compile(calc, "<calc>", "eval")
+
+    paths = sorted(set(p for inputs in input_sets for p in inputs.values()))
+
+    srcs = {p: gdal.Open(p, gdal.GA_ReadOnly) for p in paths}
+
+    src0 = srcs[input_sets[0][sorted(input_sets[0].keys())[0]]]
+
+    rows, cols = src0.RasterYSize, src0.RasterXSize
+
+    for p, src in srcs.items():
+        if (src.RasterYSize, src.RasterXSize) != (rows, cols):
+            print("\nThe raster {} is not the same size as the other inputs".format(p))
+
+            sys.exit(1)
+
+    nodatas = {p: src.GetRasterBand(1).GetNoDataValue() for p, src in srcs.items()} if mask_nodata else dict()
+
+    if mask_nodata and nodata is None:
+        nodata = DEFAULT_NODATA[dtype]
+
+    outs = {i: create_output(outfile, fformat, cols, rows, dtype, src0.GetGeoTransform(), src0.GetProjection(),
+                             nodata)
+            for i, outfile in enumerate(outfiles) if outfile is not None}
+
+    for xoff, yoff, xsize, ysize in get_windows(rows, cols, blocksize):
+
+        blocks = {p: srcs[p].GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize) for p in paths}
+
+        total = np.zeros((ysize, xsize), dtype=np.float64 if dtype in (gdal.GDT_Float32, gdal.GDT_Float64)
+                         else np.int64)
+
+        invalid = np.zeros((ysize, xsize), dtype=bool)
+
+        for i, inputs in enumerate(input_sets):
+
+            arrays = {name: blocks[p] for name, p in inputs.items()}
+
+            total += eval(code, {"np": np, "numpy": np, "__builtins__": {}}, arrays)
+
+            for p in inputs.values():
+                if nodatas.get(p) is not None:
+                    invalid |= blocks[p] == nodatas[p]
+
+            if i in outs:
+                result = total.astype(NP_TYPES[dtype])
+
+                if mask_nodata:
+                    result[invalid] = nodata
+
+                outs[i].GetRasterBand(1).WriteArray(result, xoff, yoff)
+
+        blocks = None
+
+    for i, out in outs.items():
+        finish_output(out, outfiles[i], fformat)
+
+    srcs, outs = None, None
+
+    return [outfile for outfile in outfiles if outfile is not None]
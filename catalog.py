@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Index the product rasters under a directory tree once instead of globbing and parsing file names in every
+script.
+
+Each raster name is parsed into an ARD tile, a product and a year.  H03V01_CoverPrim_1985.tif is tile H03V01, product
+CoverPrim and year 1985, and nlcd1992.tif is product nlcd and year 1992 with the tile taken from the nearest directory
+name that has one.  The index of every directory is saved in .lcmap_catalog/index.json at the root of the tree along
+with the modification time of the directory.  Adding, removing or renaming a file changes the modification time of its
+directory, so only the directories that changed are listed again and an unchanged tree is resolved with one stat per
+directory.  A lookup that isn't recursive only checks the directory it looks in.  Directories are listed with
+os.scandir in a thread pool.
+"""
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# The index is kept in its own directory so that saving it doesn't change the modification time of the root
+CATALOG = os.path.join(".lcmap_catalog", "index.json")
+
+# Raster extensions that are indexed
+EXTENSIONS = (".tif", ".img")
+
+# Number of directories that are listed at the same time
+WORKERS = 8
+
+TILE = re.compile(r"(?<![A-Za-z0-9])[Hh](\d{1,3})[Vv](\d{1,3})(?!\d)")
+
+YEAR = re.compile(r"(?<!\d)(?:19|20)\d{2}(?!\d)")
+
+# Indexes loaded by this process, keyed by the catalog root
+_indexes = dict()
+
+
+def format_tile(match):
+    """
+    :param match: <re.Match> A match of TILE
+    :return: <str> The tile name (e.g. H03V01)
+    """
+    return "H{:02d}V{:02d}".format(int(match.group(1)), int(match.group(2)))
+
+
+def get_tile(path):
+    """
+    :param path: <str> A file name or full path
+    :return: <str> The tile name from the file name or the nearest directory that has one, or "" if there is none
+    """
+    for piece in reversed(os.path.normpath(path).split(os.sep)):
+        match = TILE.search(piece)
+
+        if match:
+            return format_tile(match)
+
+    return ""
+
+
+def parse_name(path):
+    """
+    Split a raster name into its tile, product and year
+    :param path: <str> A file name or full path
+    :return: <tuple> (tile, product, year) as strings, the tile and year are "" if the name doesn't have them
+    """
+    stem = os.path.splitext(os.path.basename(path))[0]
+
+    tile, year = "", ""
+
+    match = TILE.search(stem)
+
+    if match:
+        tile = format_tile(match)
+
+        stem = stem[:match.start()] + "_" + stem[match.end():]
+
+    match = YEAR.search(stem)
+
+    if match:
+        year = match.group()
+
+        stem = stem[:match.start()] + "_" + stem[match.end():]
+
+    return tile, re.sub(r"[_\-. ]+", "_", stem).strip("_"), year
+
+
+def get_year(path):
+    """
+    :param path: <str> A file name or full path
+    :return: <str> The year in the file name, or "" if there is none
+    """
+    return parse_name(path)[2]
+
+
+def is_under(rel, top):
+    """
+    :param rel: <str> A directory relative to the catalog root
+    :param top: <str> A directory relative to the catalog root
+    :return: <bool> True if rel is top or one of its subdirectories
+    """
+    return top == os.curdir or rel == top or rel.startswith(top + os.sep)
+
+
+def list_dir(path):
+    """
+    :param path: <str> Full path to a directory
+    :return: <dict> The modification time, subdirectory names and [name, tile, product, year] of each raster
+    """
+    mtime = os.stat(path).st_mtime_ns
+
+    dir_tile = get_tile(path)
+
+    dirs, files = [], []
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+
+            if entry.name == os.path.dirname(CATALOG):
+                continue
+
+            if entry.is_dir():
+                dirs.append(entry.name)
+
+            elif os.path.splitext(entry.name)[1].lower() in EXTENSIONS:
+                tile, product, year = parse_name(entry.name)
+
+                files.append([entry.name, tile or dir_tile, product, year])
+
+    return {"mtime": mtime, "dirs": sorted(dirs), "files": sorted(files)}
+
+
+def refresh_dir(root, rel, entry, force=False):
+    """
+    :param root: <str> Full path to the catalog root
+    :param rel: <str> The directory relative to root
+    :param entry: <dict> The saved index of the directory, or None
+    :param force: <bool> List the directory even if it didn't change
+    :return: <tuple> The current index of the directory (None if it no longer exists) and True if it was listed again
+    """
+    path = os.path.join(root, rel)
+
+    try:
+        mtime = os.stat(path).st_mtime_ns
+
+        if not force and entry is not None and entry["mtime"] == mtime:
+            return entry, False
+
+        return list_dir(path), True
+
+    except OSError:
+        return None, True
+
+
+def update_index(root, index, top=os.curdir, workers=WORKERS, force=False, recursive=True):
+    """
+    Bring the index of top and every directory below it up to date, one level of the tree at a time
+    :param root: <str> Full path to the catalog root
+    :param index: <dict> Directory relative to root -> directory index, updated in place
+    :param top: <str> The directory relative to root to start from
+    :param workers: <int> Number of directories listed at the same time
+    :param force: <bool> List every directory even if it didn't change
+    :param recursive: <bool> Also update the directories below top, otherwise only top is checked
+    :return: <bool> True if the index changed
+    """
+    if not recursive:
+        entry, listed = refresh_dir(root, top, index.get(top), force)
+
+        if entry is None:
+            index.pop(top, None)
+
+        else:
+            index[top] = entry
+
+        return listed
+
+    changed, visited = False, set()
+
+    level = [top]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while level:
+
+            results = list(pool.map(lambda rel: refresh_dir(root, rel, index.get(rel), force), level))
+
+            next_level = []
+
+            for rel, (entry, listed) in zip(level, results):
+
+                visited.add(rel)
+
+                changed = changed or listed
+
+                if entry is None:
+                    index.pop(rel, None)
+
+                    continue
+
+                index[rel] = entry
+
+                next_level.extend(os.path.normpath(os.path.join(rel, d)) for d in entry["dirs"])
+
+            level = next_level
+
+    # directories that were removed or renamed
+    for rel in [rel for rel in index if is_under(rel, top) and rel not in visited]:
+        del index[rel]
+
+        changed = True
+
+    return changed
+
+
+def get_root(folder):
+    """
+    :param folder: <str> Full path to a directory
+    :return: <str> The nearest directory at or above folder with a saved catalog, or folder if there is none
+    """
+    folder = path = os.path.abspath(folder)
+
+    while not os.path.exists(os.path.join(path, CATALOG)):
+
+        if os.path.dirname(path) == path:
+            return folder
+
+        path = os.path.dirname(path)
+
+    return path
+
+
+def load_index(root):
+    """
+    :param root: <str> Full path to the catalog root
+    :return: <dict> The saved index, or an empty index if there is none
+    """
+    try:
+        with open(os.path.join(root, CATALOG), "r") as c:
+            return json.load(c)["dirs"]
+
+    except (OSError, ValueError, KeyError):
+        return dict()
+
+
+def save_index(root, index):
+    """
+    Save the index, replacing any previous version.  A tree that can't be written to is still indexed, it just isn't
+    saved.
+    :param root: <str> Full path to the catalog root
+    :param index: <dict>
+    :return:
+    """
+    outfile = os.path.join(root, CATALOG)
+
+    try:
+        if not os.path.exists(os.path.dirname(outfile)):
+            os.makedirs(os.path.dirname(outfile))
+
+        with open("{}.{}.tmp".format(outfile, os.getpid()), "w") as c:
+            json.dump({"dirs": index}, c)
+
+        os.replace("{}.{}.tmp".format(outfile, os.getpid()), outfile)
+
+    except OSError:
+        pass
+
+    return None
+
+
+def get_index(folder, workers=WORKERS, refresh=False, recursive=True):
+    """
+    :param folder: <str> Full path to a directory
+    :param workers: <int> Number of directories listed at the same time
+    :param refresh: <bool> List every directory below folder even if it didn't change
+    :param recursive: <bool> Bring the subdirectories of folder up to date as well, otherwise only folder itself is
+                      checked, with a single stat if it didn't change
+    :return: <tuple> The catalog root, the directory of folder relative to it, and the index with the entries of folder
+             (and its subdirectories if recursive) up to date
+    """
+    root = get_root(folder)
+
+    top = os.path.relpath(os.path.abspath(folder), root)
+
+    if root not in _indexes:
+        _indexes[root] = load_index(root)
+
+    if update_index(root, _indexes[root], top, workers, refresh, recursive):
+        save_index(root, _indexes[root])
+
+    return root, top, _indexes[root]
+
+
+def get_files(folder, product=None, tile=None, years=None, ext=".tif", recursive=False):
+    """
+    Look up rasters in the catalog
+    :param folder: <str> Full path to the directory to search
+    :param product: <str> Only include products whose name contains this string, like the glob *product*
+    :param tile: <str> Only include this tile (e.g. H03V01)
+    :param years: <list> Only include these years, as strings or ints
+    :param ext: <str> Only include this extension, None for every indexed extension
+    :param recursive: <bool> Include the subdirectories of folder
+    :return: <list> Full paths sorted by year and then by name
+    """
+    root, top, index = get_index(folder, recursive=recursive)
+
+    years = None if years is None else set(str(y) for y in years)
+
+    found = []
+
+    for rel, entry in index.items():
+
+        if rel != top and not (recursive and is_under(rel, top)):
+            continue
+
+        for name, t, p, y in entry["files"]:
+
+            if (product is not None and product not in p) or (tile is not None and t != tile.upper()):
+                continue
+
+            if (years is not None and y not in years) or (ext is not None and not name.lower().endswith(ext)):
+                continue
+
+            found.append((y, os.path.normpath(os.path.join(root, rel, name))))
+
+    return [path for y, path in sorted(found)]
+
+
+def get_years(folder, product=None, tile=None, ext=".tif", recursive=False):
+    """
+    :param folder: <str> Full path to the directory to search
+    :param product: <str> Only include products whose name contains this string
+    :param tile: <str> Only include this tile
+    :param ext: <str> Only include this extension
+    :param recursive: <bool> Include the subdirectories of folder
+    :return: <list> The sorted years that have a raster
+    """
+    return sorted(set(get_year(f) for f in get_files(folder, product, tile, None, ext, recursive)) - {""})
+
+
+def get_products(folder, ext=".tif", recursive=True):
+    """
+    :param folder: <str> Full path to the directory to search
+    :param ext: <str> Only include this extension
+    :param recursive: <bool> Include the subdirectories of folder
+    :return: <dict> tile -> product -> year -> full path, the last path in name order wins if there are duplicates
+    """
+    tree = dict()
+
+    for path in get_files(folder, ext=ext, recursive=recursive):
+
+        tile, product, year = parse_name(path)
+
+        tree.setdefault(tile or get_tile(os.path.dirname(path)), dict()).setdefault(product, dict())[year] = path
+
+    return tree
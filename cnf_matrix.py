@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Build the confusion matrices of the confusion matrix scripts, either from whole arrays or one block at a time.
+
+Columns = Reference Data
+Rows = Classification Results
+
+The class values and the row/column totals are added as a header row/column and a last row/column, the totals are
+labelled 99999999 because the matrix can only hold numbers.
+"""
+
+import sys
+
+import numpy as np
+from osgeo import gdal
+
+import band_math
+import cutline_mask
+
+
+def get_pair_counts(reference, classified, classes):
+    """
+    Count every (classified, reference) class pair in a single pass.  Each pixel's pair of class positions is encoded
+    into one index, row * len(classes) + column, and all of the indices are counted with one call to np.bincount.
+    Values that are not in classes are ignored.
+    :param reference: <numpy.ndarray> The reference land cover values
+    :param classified: <numpy.ndarray> The classified land cover values
+    :param classes: <list> Sorted list of class values
+    :return: <numpy.ndarray> Square array of counts, rows = classification results, columns = reference data
+    """
+    n = len(classes)
+
+    class_values = np.asarray(classes)
+
+    ref = np.ravel(reference)
+
+    pred = np.ravel(classified)
+
+    # Position of each pixel value within the sorted class list
+    ref_ind = np.searchsorted(class_values, ref).clip(max=n - 1)
+
+    pred_ind = np.searchsorted(class_values, pred).clip(max=n - 1)
+
+    # Only keep pixels whose reference and classified values both appear in the class list
+    valid = (class_values[ref_ind] == ref) & (class_values[pred_ind] == pred)
+
+    pairs = pred_ind[valid] * n + ref_ind[valid]
+
+    return np.bincount(pairs, minlength=n * n).reshape((n, n))
+
+
+def add_matrix_totals(confusion_matrix, classes):
+    """
+    Add the row/column totals and the class value header row/column to the square matrix of pair counts
+    :param confusion_matrix: <numpy.ndarray> Square array of counts, rows = classification results,
+                             columns = reference data
+    :param classes: <list> Sorted list of class values, modified in place to match the bordered matrix
+    :return: <numpy.ndarray>
+    """
+    # add row totals in a new column at the end
+    x_sum = confusion_matrix.sum(axis=1)
+
+    x_sum = np.reshape(x_sum, (len(classes), 1))
+
+    confusion_matrix = np.append(arr=confusion_matrix, values=x_sum, axis=1)
+
+    # add column totals in a new row at the end
+    y_sum = confusion_matrix.sum(axis=0)
+
+    y_sum = np.reshape(y_sum, (1, len(classes) + 1))
+
+    confusion_matrix = np.append(arr=confusion_matrix, values=y_sum, axis=0)
+
+    # insert a blank row and column at the top/left to contain class values
+    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=0, values=0)
+
+    confusion_matrix = np.insert(arr=confusion_matrix, obj=0, axis=1, values=0)
+
+    # so len(classes) matches row/column shape of confusion matrix
+    classes.insert(0, 0)
+
+    # 99999999 instead of 'total' because can't have strings in array of numbers
+    classes.append(99999999)
+
+    # insert the class names into the blank columns/rows of the matrix
+    for c in range(len(classes)):
+        confusion_matrix[c, 0] = classes[c]
+
+        confusion_matrix[0, c] = classes[c]
+
+    return confusion_matrix
+
+
+def compute_confusion_matrix(reference, classified, classes):
+    """
+    Generate a confusion matrix that shows the classification accuracy.
+    Columns = Reference Data
+    Rows = Classification Results
+    :param reference:
+    :param classified:
+    :param classes:
+    :return:
+    """
+    print("generating %s by %s confusion matrix" % (len(classes), len(classes)))
+
+    confusion_matrix = get_pair_counts(reference, classified, classes).astype(np.int32)
+
+    return add_matrix_totals(confusion_matrix, classes)
+
+
+def read_blocks(reffile, predfile, mask=None, blocksize=1024):
+    """
+    Read aligned blocks from the reference, prediction, and optional mask rasters.  Only one block of each input is
+    held in memory at a time.
+    :param reffile: <str> Full path to the reference land cover
+    :param predfile: <str> Full path to the predicted land cover
+    :param mask: <str> Optional full path to a processing mask raster or a clipping shapefile
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return: Generator of (reference block, prediction block, mask block or None)
+    """
+    ref_src = gdal.Open(reffile, gdal.GA_ReadOnly)
+
+    pred_src = gdal.Open(predfile, gdal.GA_ReadOnly)
+
+    rows, cols = ref_src.RasterYSize, ref_src.RasterXSize
+
+    if (pred_src.RasterYSize, pred_src.RasterXSize) != (rows, cols):
+        print("The prediction is not compatible with the size of the reference data")
+        sys.exit(1)
+
+    # a shapefile mask is rasterized on the grid of the reference, or loaded from the cutline_mask cache
+    read_mask = cutline_mask.open_mask(mask, reffile) if mask is not None else None
+
+    ref_band = ref_src.GetRasterBand(1)
+
+    pred_band = pred_src.GetRasterBand(1)
+
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
+
+        ref_block = ref_band.ReadAsArray(xoff, yoff, xsize, ysize)
+
+        pred_block = pred_band.ReadAsArray(xoff, yoff, xsize, ysize)
+
+        if read_mask is None:
+            yield ref_block, pred_block, None
+
+        else:
+            yield ref_block, pred_block, read_mask(xoff, yoff, xsize, ysize)
+
+
+def update_pair_counts(matrix, classes, reference, classified, block_classes):
+    """
+    Add the pair counts of one block to the running matrix.  The running matrix is expanded first if the block
+    contains class values that were not seen in any previous block.
+    :param matrix: <numpy.ndarray> The running square array of pair counts
+    :param classes: <list> Sorted list of the class values represented by matrix
+    :param reference: <numpy.ndarray> The reference values for the current block
+    :param classified: <numpy.ndarray> The classified values for the current block
+    :param block_classes: <list> The class values present in the current block
+    :return: The updated matrix and class list
+    :rtype: numpy.ndarray, list
+    """
+    new_classes = sorted(set(classes) | set(block_classes))
+
+    if new_classes != classes:
+        # Move the existing counts into their positions within the expanded matrix
+        expanded = np.zeros((len(new_classes), len(new_classes)), np.int64)
+
+        ind = [new_classes.index(c) for c in classes]
+
+        expanded[np.ix_(ind, ind)] = matrix
+
+        matrix, classes = expanded, new_classes
+
+    matrix += get_pair_counts(reference, classified, classes)
+
+    return matrix, classes
+
+
+def compute_confusion_matrix_blocks(reffile, predfile, mask=None, blocksize=1024, mask_pred=True):
+    """
+    Generate the same confusion matrix as compute_confusion_matrix, but accumulate the pair counts one block at a time
+    so that peak memory use is bounded by blocksize rather than by the size of the rasters.
+    Columns = Reference Data
+    Rows = Classification Results
+    :param reffile: <str> Full path to the reference land cover
+    :param predfile: <str> Full path to the predicted land cover
+    :param mask: <str> Optional full path to a processing mask raster or a clipping shapefile
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :param mask_pred: <bool> Set the prediction to 0 where the reference is 0, as the read_data of the calling script
+                      does
+    :return: <numpy.ndarray>
+    """
+    print("The reference file is:\n\t{}\n".format(reffile))
+
+    print("The prediction file is:\n\t{}\n".format(predfile))
+
+    matrix = np.zeros((0, 0), np.int64)
+
+    classes = list()
+
+    for ref_block, pred_block, mask_block in read_blocks(reffile, predfile, mask, blocksize):
+
+        # Class values are taken from the unmasked data, the same as in read_data
+        block_classes = np.union1d(np.unique(ref_block), np.unique(pred_block)).tolist()
+
+        if mask_pred:
+            pred_block[ref_block == 0] = 0
+
+        if mask_block is not None:
+            ref_block, pred_block = ref_block[mask_block == 1], pred_block[mask_block == 1]
+
+        matrix, classes = update_pair_counts(matrix, classes, ref_block, pred_block, block_classes)
+
+    print("generating %s by %s confusion matrix" % (len(classes), len(classes)))
+
+    return add_matrix_totals(matrix.astype(np.int32), classes)
@@ -0,0 +1,455 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Rasterize clipping shapefiles once per grid and reuse the masks from an on-disk cache.
+
+A cutline is burned onto a target grid (geotransform, size and projection) with the pixel center rule used by
+gdalwarp -cutline, packed to one bit per pixel and saved under a key built from the content hash of the shapefile and
+the grid.  Later runs on the same shapefile and grid load the bits instead of rasterizing the polygons again, and the
+clip, mask and confusion matrix tools read the mask as boolean windows that line up with their blocks.
+
+The cache is kept in $LCMAP_MASK_CACHE, or ~/.cache/lcmap_eval/masks if that isn't set.
+"""
+
+import functools
+import hashlib
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+from osgeo import gdal, ogr, osr
+
+import ard_clip
+import band_math
+import output_profile
+
+gdal.UseExceptions()
+
+CACHE_DIR = os.environ.get("LCMAP_MASK_CACHE",
+                           os.path.join(os.path.expanduser("~"), ".cache", "lcmap_eval", "masks"))
+
+# the files of a shapefile that change the rasterized polygons
+SHP_PARTS = (".shp", ".shx", ".dbf", ".prj")
+
+# bits: rows x ceil(cols / 8) UInt8 array, each row packed with np.packbits
+Mask = namedtuple("Mask", ["bits", "rows", "cols"])
+
+
+def is_shapefile(path):
+    """
+    :param path: <str>
+    :return: <bool> True if path is an ESRI shapefile rather than a mask raster
+    """
+    return os.path.splitext(path)[1].lower() == ".shp"
+
+
+@functools.lru_cache(maxsize=None)
+def _hash_shapefile(shp, stamp):
+    """
+    :param shp: <str> Full path to the .shp file
+    :param stamp: <tuple> Modification time and size of each part, so an edited shapefile is hashed again
+    :return: <str>
+    """
+    sha = hashlib.sha1()
+
+    base = os.path.splitext(shp)[0]
+
+    for ext in SHP_PARTS:
+
+        if os.path.exists(base + ext):
+
+            with open(base + ext, "rb") as part:
+                for chunk in iter(functools.partial(part.read, 1 << 20), b""):
+                    sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+def hash_shapefile(shp):
+    """
+    Hash the content of the .shp, .shx, .dbf and .prj files of a shapefile
+    :param shp: <str> Full path to the .shp file
+    :return: <str> Hex digest
+    """
+    base = os.path.splitext(os.path.abspath(shp))[0]
+
+    stamp = tuple((os.path.getmtime(base + ext), os.path.getsize(base + ext)) if os.path.exists(base + ext) else None
+                  for ext in SHP_PARTS)
+
+    return _hash_shapefile(base + ".shp", stamp)
+
+
+def get_key(shp, geo, cols, rows, wkt):
+    """
+    :param shp: <str> Full path to the .shp file
+    :param geo: <tuple> Geotransform of the target grid
+    :param cols: <int>
+    :param rows: <int>
+    :param wkt: <str> Projection of the target grid
+    :return: <str> The cache key of the mask
+    """
+    grid = "{}|{}|{}|{}".format(",".join("{:.6f}".format(g) for g in geo), cols, rows, wkt)
+
+    return hashlib.sha1((hash_shapefile(shp) + "|" + grid).encode("utf-8")).hexdigest()
+
+
+def rasterize(shp, geo, cols, rows, wkt):
+    """
+    Burn every feature of the shapefile onto the target grid, reprojecting the features if needed
+    :param shp: <str> Full path to the .shp file
+    :param geo: <tuple> Geotransform of the target grid
+    :param cols: <int>
+    :param rows: <int>
+    :param wkt: <str> Projection of the target grid
+    :return: <numpy.ndarray> Boolean array, True inside the cutline
+    """
+    shp_src = ogr.Open(shp)
+
+    if shp_src is None:
+        print("\nCould not open the shapefile {}".format(shp))
+
+        sys.exit(1)
+
+    out = gdal.GetDriverByName("MEM").Create("", cols, rows, 1, gdal.GDT_Byte)
+
+    out.SetGeoTransform(geo)
+    out.SetProjection(wkt)
+
+    gdal.RasterizeLayer(out, [1], shp_src.GetLayer(0), burn_values=[1])
+
+    mask = out.GetRasterBand(1).ReadAsArray() == 1
+
+    out, shp_src = None, None
+
+    return mask
+
+
+@functools.lru_cache(maxsize=32)
+def get_mask(shp, geo, cols, rows, wkt, cache_dir=None):
+    """
+    Return the mask of a shapefile on a grid, rasterizing it only if it isn't in the cache
+    :param shp: <str> Full path to the .shp file
+    :param geo: <tuple> Geotransform of the target grid
+    :param cols: <int>
+    :param rows: <int>
+    :param wkt: <str> Projection of the target grid
+    :param cache_dir: <str> Cache folder, defaults to CACHE_DIR
+    :return: <Mask>
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+
+    cache_file = os.path.join(cache_dir, get_key(shp, tuple(geo), cols, rows, wkt) + ".npy")
+
+    if os.path.exists(cache_file):
+        bits = np.load(cache_file)
+
+        if bits.shape == (rows, (cols + 7) // 8):
+            return Mask(bits=bits, rows=rows, cols=cols)
+
+    bits = np.packbits(rasterize(shp, geo, cols, rows, wkt), axis=1)
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # write to a temporary name first so a concurrent run never loads a partial file
+    temp_file = "{}.{}.tmp.npy".format(os.path.splitext(cache_file)[0], os.getpid())
+
+    np.save(temp_file, bits)
+
+    os.replace(temp_file, cache_file)
+
+    return Mask(bits=bits, rows=rows, cols=cols)
+
+
+def rasterize_zones(shp, field, geo, cols, rows, wkt, outfile, blocksize=1024):
+    """
+    Burn the value of an attribute of every feature onto the target grid, pixels outside the features are 0.  The grid
+    is burned blocksize rows at a time into a memory mapped .npy file, so the zone IDs of the whole grid are never held
+    in memory.
+    :param shp: <str> Full path to the .shp file
+    :param field: <str> Integer attribute holding the zone ID of each feature
+    :param geo: <tuple> Geotransform of the target grid
+    :param cols: <int>
+    :param rows: <int>
+    :param wkt: <str> Projection of the target grid
+    :param outfile: <str> Full path to the .npy file that receives the Int32 zone IDs
+    :param blocksize: <int> Number of rows burned at a time
+    :return:
+    """
+    shp_src = ogr.Open(shp)
+
+    if shp_src is None:
+        print("\nCould not open the shapefile {}".format(shp))
+
+        sys.exit(1)
+
+    zones = np.lib.format.open_memmap(outfile, mode="w+", dtype=np.int32, shape=(rows, cols))
+
+    for yoff in range(0, rows, blocksize):
+
+        ysize = min(blocksize, rows - yoff)
+
+        out = gdal.GetDriverByName("MEM").Create("", cols, ysize, 1, gdal.GDT_Int32)
+
+        out.SetGeoTransform((geo[0] + yoff * geo[2], geo[1], geo[2], geo[3] + yoff * geo[5], geo[4], geo[5]))
+        out.SetProjection(wkt)
+
+        gdal.RasterizeLayer(out, [1], shp_src.GetLayer(0), options=["ATTRIBUTE={}".format(field)])
+
+        zones[yoff:yoff + ysize] = out.GetRasterBand(1).ReadAsArray()
+
+        out = None
+
+    zones.flush()
+
+    zones, shp_src = None, None
+
+    return None
+
+
+def get_zones(shp, field, geo, cols, rows, wkt, cache_dir=None):
+    """
+    Return the zone IDs of a shapefile on a grid, rasterizing them only if they aren't in the cache.  The IDs are
+    memory mapped from the cache file rather than loaded, so only the windows that are read are held in memory.
+    :param shp: <str> Full path to the .shp file
+    :param field: <str> Integer attribute holding the zone ID of each feature
+    :param geo: <tuple> Geotransform of the target grid
+    :param cols: <int>
+    :param rows: <int>
+    :param wkt: <str> Projection of the target grid
+    :param cache_dir: <str> Cache folder, defaults to CACHE_DIR
+    :return: <numpy.memmap> Read only Int32 array of zone IDs
+    """
+    cache_dir = CACHE_DIR if cache_dir is None else cache_dir
+
+    cache_file = os.path.join(cache_dir, "{}_{}.npy".format(get_key(shp, tuple(geo), cols, rows, wkt), field))
+
+    if os.path.exists(cache_file):
+        zones = np.load(cache_file, mmap_mode="r")
+
+        if zones.shape == (rows, cols):
+            return zones
+
+        zones = None
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+
+    temp_file = "{}.{}.tmp.npy".format(os.path.splitext(cache_file)[0], os.getpid())
+
+    rasterize_zones(shp, field, geo, cols, rows, wkt, temp_file)
+
+    os.replace(temp_file, cache_file)
+
+    return np.load(cache_file, mmap_mode="r")
+
+
+def open_zones(zones, like, field):
+    """
+    Open a zone layer as a window reader.  The zones are either a raster of zone IDs or a shapefile whose field is
+    rasterized (or loaded from the cache) on the grid of the like raster.
+    :param zones: <str> Full path to a zone raster or a .shp file
+    :param like: <str> Full path to the raster the zones are applied to
+    :param field: <str> Integer attribute holding the zone ID of each feature, only used for shapefiles
+    :return: <function> Takes (xoff, yoff, xsize, ysize) and returns the zone IDs of the window
+    """
+    if not is_shapefile(zones):
+        return open_mask(zones, like)
+
+    src = gdal.Open(like, gdal.GA_ReadOnly)
+
+    ids = get_zones(os.path.abspath(zones), field, tuple(src.GetGeoTransform()), src.RasterXSize, src.RasterYSize,
+                    src.GetProjection())
+
+    def read(xoff, yoff, xsize, ysize):
+        return np.array(ids[yoff:yoff + ysize, xoff:xoff + xsize])
+
+    return read
+
+
+def get_raster_mask(shp, infile, cache_dir=None):
+    """
+    :param shp: <str> Full path to the .shp file
+    :param infile: <str> Full path to a raster, the mask is built on its grid
+    :param cache_dir: <str> Cache folder, defaults to CACHE_DIR
+    :return: <Mask>
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    if src is None:
+        print("\nCould not open image file {}".format(os.path.basename(infile)))
+
+        sys.exit(1)
+
+    return get_mask(os.path.abspath(shp), tuple(src.GetGeoTransform()), src.RasterXSize, src.RasterYSize,
+                    src.GetProjection(), cache_dir)
+
+
+def window(mask, xoff, yoff, xsize, ysize):
+    """
+    Unpack a window of the mask
+    :param mask: <Mask>
+    :param xoff: <int>
+    :param yoff: <int>
+    :param xsize: <int>
+    :param ysize: <int>
+    :return: <numpy.ndarray> Boolean array, True inside the cutline
+    """
+    first, last = xoff // 8, (xoff + xsize + 7) // 8
+
+    block = np.unpackbits(mask.bits[yoff:yoff + ysize, first:last], axis=1)
+
+    start = xoff - first * 8
+
+    return block[:, start:start + xsize].astype(bool)
+
+
+def to_array(mask):
+    """
+    :param mask: <Mask>
+    :return: <numpy.ndarray> The whole mask as a boolean array
+    """
+    return window(mask, 0, 0, mask.cols, mask.rows)
+
+
+def open_mask(mask, like):
+    """
+    Open a processing mask as a window reader.  The mask is either a raster, where 1 marks the pixels to keep, or a
+    shapefile that is rasterized (or loaded from the cache) on the grid of the like raster.
+    :param mask: <str> Full path to a mask raster or a .shp file
+    :param like: <str> Full path to the raster the mask is applied to
+    :return: <function> Takes (xoff, yoff, xsize, ysize) and returns the mask window, 1/True for the pixels to keep
+    """
+    if is_shapefile(mask):
+        bits = get_raster_mask(mask, like)
+
+        return functools.partial(window, bits)
+
+    like_src, mask_src = gdal.Open(like, gdal.GA_ReadOnly), gdal.Open(mask, gdal.GA_ReadOnly)
+
+    if (mask_src.RasterYSize, mask_src.RasterXSize) != (like_src.RasterYSize, like_src.RasterXSize):
+        print("The mask is not compatible with the size of the input data")
+
+        sys.exit(1)
+
+    def read(xoff, yoff, xsize, ysize):
+        # keeps mask_src open for as long as the reader is used
+        return mask_src.GetRasterBand(1).ReadAsArray(xoff, yoff, xsize, ysize)
+
+    return read
+
+
+def read_mask(mask, like):
+    """
+    :param mask: <str> Full path to a mask raster or a .shp file
+    :param like: <str> Full path to the raster the mask is applied to
+    :return: <numpy.ndarray> The whole mask, 1/True for the pixels to keep
+    """
+    src = gdal.Open(like, gdal.GA_ReadOnly)
+
+    return open_mask(mask, like)(0, 0, src.RasterXSize, src.RasterYSize)
+
+
+def get_cutline_extent(shp, geo, wkt):
+    """
+    The envelope of the shapefile in the projection of a raster, snapped outward to the raster's pixel grid
+    :param shp: <str> Full path to the .shp file
+    :param geo: <tuple> Geotransform of the raster
+    :param wkt: <str> Projection of the raster
+    :return: <ard_clip.GeoExtent>
+    """
+    shp_src = ogr.Open(shp)
+
+    layer = shp_src.GetLayer(0)
+
+    srr = osr.SpatialReference()
+
+    srr.ImportFromWkt(wkt)
+
+    transform = None if layer.GetSpatialRef() is None else osr.CoordinateTransformation(layer.GetSpatialRef(), srr)
+
+    envelopes = []
+
+    for feature in layer:
+
+        geom = feature.GetGeometryRef().Clone()
+
+        if transform is not None:
+            geom.Transform(transform)
+
+        envelopes.append(geom.GetEnvelope())
+
+    min_x, max_x = min(e[0] for e in envelopes), max(e[1] for e in envelopes)
+    min_y, max_y = min(e[2] for e in envelopes), max(e[3] for e in envelopes)
+
+    x_min = geo[0] + np.floor((min_x - geo[0]) / geo[1]) * geo[1]
+    x_max = geo[0] + np.ceil((max_x - geo[0]) / geo[1]) * geo[1]
+    y_max = geo[3] + np.floor((max_y - geo[3]) / geo[5]) * geo[5]
+    y_min = geo[3] + np.ceil((min_y - geo[3]) / geo[5]) * geo[5]
+
+    return ard_clip.GeoExtent(x_min=float(x_min), y_max=float(y_max), x_max=float(x_max), y_min=float(y_min))
+
+
+def clip_raster(infile, outfile, shp, blocksize=1024):
+    """
+    Crop a raster to the extent of a shapefile and set the pixels outside the cutline to NoData (0 if the raster has
+    no NoData value), the same result as gdalwarp -cutline shp -crop_to_cutline.  The NoData value and color table
+    of each band are copied to the output.
+    :param infile: <str> Full path to the input raster
+    :param outfile: <str> Full path to the output raster
+    :param shp: <str> Full path to the .shp file
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return: <str> The output raster
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    if src is None:
+        print("\nCould not open image file {}".format(os.path.basename(infile)))
+
+        sys.exit(1)
+
+    geo, wkt = src.GetGeoTransform(), src.GetProjection()
+
+    extent = get_cutline_extent(shp, geo, wkt)
+
+    xoff, yoff, cols, rows = ard_clip.get_window(geo, extent)
+
+    out_geo = (extent.x_min, geo[1], 0, extent.y_max, 0, geo[5])
+
+    mask = get_mask(os.path.abspath(shp), out_geo, cols, rows, wkt)
+
+    out = output_profile.create(outfile, cols, rows, src.RasterCount, src.GetRasterBand(1).DataType)
+
+    out.SetGeoTransform(out_geo)
+    out.SetProjection(wkt)
+
+    for b in range(1, src.RasterCount + 1):
+
+        band, outband = src.GetRasterBand(b), out.GetRasterBand(b)
+
+        nodata = band.GetNoDataValue()
+
+        fill = 0 if nodata is None else nodata
+
+        if nodata is not None:
+            outband.SetNoDataValue(nodata)
+
+        if band.GetRasterColorTable() is not None:
+            outband.SetRasterColorTable(band.GetRasterColorTable())
+
+        for x, y, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
+
+            data = ard_clip.read_window(band, (xoff + x, yoff + y, xsize, ysize), fill)
+
+            if data is None:
+                data = np.full((ysize, xsize), fill, dtype=band.ReadAsArray(0, 0, 1, 1).dtype)
+
+            data[~window(mask, x, y, xsize, ysize)] = fill
+
+            outband.WriteArray(data, x, y)
+
+    output_profile.finish(out, outfile)
+
+    src, out = None, None
+
+    return outfile
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Count the pixel values of a raster in a single pass.
+
+The raster is read one block at a time and the values of each block are tallied with np.bincount, so every value is
+counted with one read of the raster and no per-class copies or masks.  The graph and summary scripts look up the counts
+of the classes they report in the resulting value -> count histogram.
+
+Histograms are kept in a SQLite catalog next to the rasters (histograms.sqlite, or the file named by
+$LCMAP_HIST_CATALOG).  Each entry records the size and modification time of its raster and is only used while the
+raster is unchanged, so re-plotting a tile reads the catalog instead of the rasters.  Scripts that already see every
+block of an output while writing it can save its histogram with add_block and save_histogram.
+"""
+
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+from osgeo import gdal
+
+import band_math
+
+gdal.UseExceptions()
+
+CATALOG = "histograms.sqlite"
+
+
+def count_block(data):
+    """
+    :param data: <numpy.ndarray>
+    :return: <dict> value -> number of pixels
+    """
+    data = np.ravel(data)
+
+    if data.size == 0:
+        return dict()
+
+    if np.issubdtype(data.dtype, np.integer) and data.min() >= 0:
+        counts = np.bincount(data)
+
+        values = np.flatnonzero(counts)
+
+        return dict(zip(values.tolist(), counts[values].tolist()))
+
+    if np.issubdtype(data.dtype, np.floating):
+        data = data[~np.isnan(data)]
+
+    values, counts = np.unique(data, return_counts=True)
+
+    return dict(zip(values.tolist(), counts.tolist()))
+
+
+def add_block(hist, data):
+    """
+    Add the counts of one block to a running histogram
+    :param hist: <dict> value -> number of pixels, updated in place
+    :param data: <numpy.ndarray>
+    :return:
+    """
+    for value, count in count_block(data).items():
+
+        hist[value] = hist.get(value, 0) + count
+
+    return None
+
+
+def get_catalog(infile):
+    """
+    :param infile: <str> Full path to a raster
+    :return: <str> Full path to the catalog that holds the histogram of infile
+    """
+    return os.environ.get("LCMAP_HIST_CATALOG") or os.path.join(os.path.dirname(os.path.abspath(infile)), CATALOG)
+
+
+def get_stamp(infile):
+    """
+    :param infile: <str> Full path to a raster
+    :return: <tuple> The size in bytes and modification time in nanoseconds, a histogram is stale if these change
+    """
+    stat = os.stat(infile)
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def connect(catalog):
+    """
+    Open a histogram catalog, creating it if it doesn't exist
+    :param catalog: <str> Full path to the SQLite file
+    :return: <sqlite3.Connection>
+    """
+    conn = sqlite3.connect(catalog, timeout=60)
+
+    conn.execute("CREATE TABLE IF NOT EXISTS histograms (path TEXT, band INTEGER, size INTEGER, mtime INTEGER, "
+                 "counts TEXT, PRIMARY KEY (path, band))")
+
+    return conn
+
+
+def load_histogram(infile, band=1):
+    """
+    :param infile: <str> Full path to a raster
+    :param band: <int> The band number
+    :return: <dict> The catalog histogram of the band, or None if there is none or the raster changed since it was saved
+    """
+    try:
+        conn = connect(get_catalog(infile))
+
+        try:
+            row = conn.execute("SELECT size, mtime, counts FROM histograms WHERE path = ? AND band = ?",
+                               (os.path.abspath(infile), band)).fetchone()
+
+        finally:
+            conn.close()
+
+    except sqlite3.Error:
+        return None
+
+    if row is None or tuple(row[:2]) != get_stamp(infile):
+        return None
+
+    return {value: count for value, count in json.loads(row[2])}
+
+
+def save_histogram(infile, hist, band=1):
+    """
+    Record the histogram of a raster in its catalog.  The raster must be complete and closed so that the saved stamp
+    matches the file on disk.
+    :param infile: <str> Full path to a raster
+    :param hist: <dict> value -> number of pixels
+    :param band: <int> The band number
+    :return:
+    """
+    size, mtime = get_stamp(infile)
+
+    try:
+        conn = connect(get_catalog(infile))
+
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO histograms VALUES (?, ?, ?, ?, ?)",
+                             (os.path.abspath(infile), band, size, mtime, json.dumps(sorted(hist.items()))))
+
+        finally:
+            conn.close()
+
+    except sqlite3.Error as e:
+        print("Could not record the histogram of {} in {}: {}".format(os.path.basename(infile), get_catalog(infile), e))
+
+    return None
+
+
+def read_histogram(infile, band=1, blocksize=1024):
+    """
+    Count every value of a raster band by reading the raster
+    :param infile: <str> Full path to the raster
+    :param band: <int> The band number
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return: <dict> value -> number of pixels, only values that occur are included
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    if src is None:
+        print("Could not open image file {a}".format(a=os.path.basename(infile)))
+
+        sys.exit(1)
+
+    src_band = src.GetRasterBand(band)
+
+    hist = dict()
+
+    for xoff, yoff, xsize, ysize in band_math.get_windows(src.RasterYSize, src.RasterXSize, blocksize):
+
+        add_block(hist, src_band.ReadAsArray(xoff, yoff, xsize, ysize))
+
+    src, src_band = None, None
+
+    return hist
+
+
+def get_histogram(infile, band=1, blocksize=1024, refresh=False):
+    """
+    Count every value of a raster band, using the catalog histogram if the raster hasn't changed since it was saved
+    :param infile: <str> Full path to the raster
+    :param band: <int> The band number
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :param refresh: <bool> Read the raster even if the catalog has a current histogram
+    :return: <dict> value -> number of pixels, only values that occur are included
+    """
+    hist = None if refresh else load_histogram(infile, band)
+
+    if hist is None:
+        hist = read_histogram(infile, band, blocksize)
+
+        save_histogram(infile, hist, band)
+
+    return hist
+
+
+def get_counts(hist, values):
+    """
+    :param hist: <dict> value -> number of pixels from get_histogram
+    :param values: <list> The values to look up
+    :return: <list> The number of pixels of each value, 0 for values that don't occur
+    """
+    return [hist.get(v, 0) for v in values]
+
+
+def to_bincount(hist):
+    """
+    :param hist: <dict> value -> number of pixels of a raster with non-negative integer values
+    :return: <numpy.ndarray> The counts indexed by value, the same as np.bincount of the raster
+    """
+    counts = np.zeros(int(max(hist.keys())) + 1 if hist else 0, dtype=np.int64)
+
+    for value, count in hist.items():
+        counts[int(value)] = count
+
+    return counts
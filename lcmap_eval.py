@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Run the numbered product scripts as stages of one command, in one Python process.
+
+    python lcmap_eval.py <stage> [stage arguments]
+    python lcmap_eval.py -batch <file>
+
+A stage is named by its script without the extension and, optionally, the number prefix (e.g. ccdc_cover_changes or
+5_ccdc_cover_changes).  The script of a stage is only imported when that stage runs, so GDAL, NumPy and the shared
+modules are loaded once per process and matplotlib and pandas are only loaded by the plotting and Excel stages.  Each
+stage module is imported once and its main() is called with the stage arguments as sys.argv, so a batch file with one
+stage invocation per line runs every invocation without starting a new interpreter.  The version and timestamps that
+the scripts print when they are imported are suppressed, the run time of each invocation is printed instead.
+"""
+
+import contextlib
+import datetime
+import glob
+import importlib.util
+import io
+import os
+import shlex
+import sys
+import traceback
+
+import output_profile
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+# Stages that are not numbered scripts in the repository root
+EXTRA_STAGES = {"segment_change_analysis": os.path.join("Segment_Change_Analysis", "segment_change_analysis.py"),
+                "batch_segment_change_analysis": os.path.join("Segment_Change_Analysis",
+                                                              "batch_segment_change_analysis.py")}
+
+
+def get_stages():
+    """
+    :return: <dict> Stage name -> full path to its script, every numbered script is listed with and without its number
+    """
+    stages = {name: os.path.join(REPO, path) for name, path in EXTRA_STAGES.items()}
+
+    for script in sorted(glob.glob(os.path.join(REPO, "[0-9]_*.py"))):
+
+        name = os.path.splitext(os.path.basename(script))[0]
+
+        stages[name] = script
+
+        stages[name.split("_", 1)[1]] = script
+
+    return stages
+
+
+def load_stage(name):
+    """
+    Import the script of a stage, or return it if it was already imported by this process
+    :param name: <str> The stage name
+    :return: <module>
+    """
+    stages = get_stages()
+
+    if name not in stages:
+        print("\nUnknown stage {}, try -list\n".format(name))
+
+        sys.exit(1)
+
+    module_name = "lcmap_eval_" + os.path.splitext(os.path.basename(stages[name]))[0]
+
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+
+    # scripts outside the repository root import their neighbors
+    if os.path.dirname(stages[name]) not in sys.path:
+        sys.path.insert(0, os.path.dirname(stages[name]))
+
+    spec = importlib.util.spec_from_file_location(module_name, stages[name])
+
+    module = importlib.util.module_from_spec(spec)
+
+    sys.modules[module_name] = module
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            spec.loader.exec_module(module)
+
+    except BaseException:
+        del sys.modules[module_name]
+
+        raise
+
+    return module
+
+
+def run(name, args):
+    """
+    Run one stage invocation in this process
+    :param name: <str> The stage name
+    :param args: <list> The command line arguments of the stage
+    :return: <int> The exit status of the stage, 0 if it succeeded
+    """
+    t1 = datetime.datetime.now()
+
+    argv, profile = sys.argv, output_profile.get_profile()
+
+    try:
+        module = load_stage(name)
+
+        sys.argv = [module.__file__] + list(args)
+
+        module.main()
+
+        code = 0
+
+    except SystemExit as e:
+        code = 0 if e.code is None else e.code if isinstance(e.code, int) else 1
+
+    except Exception:
+        traceback.print_exc()
+
+        code = 1
+
+    finally:
+        # a -profile option only applies to the invocation that gave it
+        sys.argv = argv
+
+        output_profile.set_profile(profile)
+
+    print("\n{} finished with status {}, processing time: {}".format(name, code, datetime.datetime.now() - t1))
+
+    return code
+
+
+def read_batch(batch):
+    """
+    :param batch: <str> Full path to a file with one stage invocation per line, or - for stdin
+    :return: <list> (stage name, arguments) for each line that isn't blank or a # comment
+    """
+    lines = sys.stdin.readlines() if batch == "-" else open(batch, "r").readlines()
+
+    return [(words[0], words[1:]) for words in (shlex.split(line, comments=True) for line in lines) if words]
+
+
+def usage():
+    print("\n\tpython lcmap_eval.py <stage> [stage arguments]\n"
+          "\tpython lcmap_eval.py -batch <file with one '<stage> [stage arguments]' per line, - for stdin>\n"
+          "\tpython lcmap_eval.py -list\n"
+          "\tpython lcmap_eval.py <stage> -h for the arguments of a stage\n")
+
+    return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+
+    if len(argv) == 0 or argv[0] in ("-h", "-help", "--help"):
+        usage()
+
+        sys.exit(0 if argv else 1)
+
+    if argv[0] == "-list":
+        stages = get_stages()
+
+        for name in sorted(stages):
+            print("{:32s}{}".format(name, os.path.relpath(stages[name], REPO)))
+
+        return None
+
+    if argv[0] == "-batch":
+        if len(argv) != 2:
+            usage()
+
+            sys.exit(1)
+
+        invocations = read_batch(argv[1])
+
+    else:
+        invocations = [(argv[0], argv[1:])]
+
+    failed = [" ".join([name] + args) for name, args in invocations if run(name, args) != 0]
+
+    if len(failed) > 0:
+        print("\n{} of {} stage invocations failed:\n\t{}".format(len(failed), len(invocations), "\n\t".join(failed)))
+
+        sys.exit(1)
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Shared creation settings for the GeoTIFF products written by the scripts.
+
+A profile names the driver, creation options and internal overviews used for every output raster:
+
+    none     - untiled, uncompressed GTiff (the original output, default)
+    tiled    - 256 x 256 tiles, uncompressed, with internal overviews
+    lzw      - tiled, LZW with a predictor, with internal overviews
+    deflate  - tiled, DEFLATE with a predictor, with internal overviews
+    cog      - Cloud Optimized GeoTIFF, tiled DEFLATE with internal overviews (needs the COG driver of GDAL >= 3.1)
+
+The default leaves the products byte-for-byte as they were, compression is only used when a profile is chosen with
+-profile.  Writers call create() in place of driver.Create() and finish() once the raster has been written and
+georeferenced, finish() builds the nearest neighbor overviews of the tiled profiles.  Outputs written by
+gdal_translate with get_co_args() get theirs from add_overviews().
+"""
+
+import os
+import sys
+
+from osgeo import gdal
+
+gdal.UseExceptions()
+
+TILED = ["TILED=YES", "BLOCKXSIZE=256", "BLOCKYSIZE=256"]
+
+# name: (driver, creation options, predictor creation option)
+PROFILES = {"none": ("GTiff", [], None),
+            "tiled": ("GTiff", TILED, None),
+            "lzw": ("GTiff", TILED + ["COMPRESS=LZW"], "PREDICTOR"),
+            "deflate": ("GTiff", TILED + ["COMPRESS=DEFLATE", "ZLEVEL=6"], "PREDICTOR"),
+            "cog": ("COG", ["BLOCKSIZE=256", "COMPRESS=DEFLATE", "LEVEL=6", "OVERVIEW_RESAMPLING=NEAREST"],
+                    "PREDICTOR")}
+
+DEFAULT = "none"
+
+# GTiff profiles that get internal overviews, the COG driver builds its own
+OVERVIEW_PROFILES = ("tiled", "lzw", "deflate")
+
+# overview levels are added until the smallest one fits in a single tile
+OVERVIEW_MIN_SIZE = 256
+
+# GDAL version number (e.g. 3010000 for 3.1.0) that added the COG driver
+COG_VERSION = 3010000
+
+FLOAT_TYPES = (gdal.GDT_Float32, gdal.GDT_Float64)
+
+# the profile used when a writer doesn't pass one, changed with set_profile
+_current = {"name": DEFAULT}
+
+
+def set_profile(name):
+    """
+    Select the profile used by create() and finish() for the rest of the process
+    :param name: <str> Profile name, None leaves the current profile in place
+    :return:
+    """
+    if name is None:
+        return None
+
+    if name not in get_available():
+        print("\nUnknown output profile {}, choose one of {}".format(name, ", ".join(get_available())))
+
+        sys.exit(1)
+
+    _current["name"] = name
+
+    return None
+
+
+def get_profile(name=None):
+    """
+    :param name: <str> Profile name, defaults to the current profile
+    :return: <str> The profile name
+    """
+    return _current["name"] if name is None else name
+
+
+def get_options(dtype, name=None):
+    """
+    The creation options of a profile for an output data type.  Floating point outputs use the floating point
+    predictor, everything else uses horizontal differencing.
+    :param dtype: <int> GDAL data type of the output
+    :param name: <str> Profile name, defaults to the current profile
+    :return: <list> Creation options
+    """
+    fformat, options, predictor = PROFILES[get_profile(name)]
+
+    if predictor is None:
+        return list(options)
+
+    if fformat == "COG":
+        return options + ["PREDICTOR=YES"]
+
+    return options + ["{}={}".format(predictor, 3 if dtype in FLOAT_TYPES else 2)]
+
+
+def get_co_args(dtype, name=None):
+    """
+    The creation options of a profile as command line arguments for gdal_translate/gdalwarp
+    :param dtype: <int> GDAL data type of the output
+    :param name: <str> Profile name, defaults to the current profile
+    :return: <str>
+    """
+    fformat = PROFILES[get_profile(name)][0]
+
+    return " ".join(["-of {}".format(fformat)] + ["-co {}".format(co) for co in get_options(dtype, name)])
+
+
+def create(outfile, cols, rows, bands, dtype, name=None):
+    """
+    Create an output raster with the profile's creation options.  COG rasters can only be written with CreateCopy, so
+    they are built in memory and copied to outfile by finish().
+    :param outfile: <str> Full path to the output raster
+    :param cols: <int>
+    :param rows: <int>
+    :param bands: <int>
+    :param dtype: <int> GDAL data type
+    :param name: <str> Profile name, defaults to the current profile
+    :return: <gdal.Dataset>
+    """
+    fformat = PROFILES[get_profile(name)][0]
+
+    driver = gdal.GetDriverByName(fformat)
+
+    if driver is not None and driver.GetMetadataItem(gdal.DCAP_CREATE) == "YES":
+        out = driver.Create(outfile, cols, rows, bands, dtype, options=get_options(dtype, name))
+
+    else:
+        out = gdal.GetDriverByName("MEM").Create("", cols, rows, bands, dtype)
+
+    if out is None:
+        print("\nCould not create image file {}".format(os.path.basename(outfile)))
+
+        sys.exit(1)
+
+    return out
+
+
+def get_overview_levels(cols, rows):
+    """
+    :param cols: <int>
+    :param rows: <int>
+    :return: <list> Overview decimation factors (2, 4, 8, ...) down to the first level that fits in one tile
+    """
+    levels = []
+
+    while max(cols, rows) // 2 ** len(levels) > OVERVIEW_MIN_SIZE:
+        levels.append(2 ** (len(levels) + 1))
+
+    return levels
+
+
+def build_overviews(out, name=None):
+    """
+    Build the internal nearest neighbor overviews of a GTiff opened for writing, if its profile has them
+    :param out: <gdal.Dataset>
+    :param name: <str> Profile name, defaults to the current profile
+    :return:
+    """
+    if get_profile(name) not in OVERVIEW_PROFILES:
+        return None
+
+    levels = get_overview_levels(out.RasterXSize, out.RasterYSize)
+
+    if len(levels) > 0:
+        out.BuildOverviews("NEAREST", levels)
+
+    return None
+
+
+def add_overviews(outfile, name=None):
+    """
+    Build the internal overviews of a raster that was written outside of create()/finish(), e.g. by gdal_translate
+    with get_co_args()
+    :param outfile: <str> Full path to the output raster
+    :param name: <str> Profile name, defaults to the current profile
+    :return:
+    """
+    if get_profile(name) not in OVERVIEW_PROFILES or not os.path.exists(outfile):
+        return None
+
+    out = gdal.Open(outfile, gdal.GA_Update)
+
+    build_overviews(out, name)
+
+    out = None
+
+    return None
+
+
+def finish(out, outfile, name=None):
+    """
+    Flush an output raster from create() to disk, building its internal overviews first if the profile has them
+    :param out: <gdal.Dataset> The raster returned by create(), written and georeferenced
+    :param outfile: <str> Full path to the output raster
+    :param name: <str> Profile name, defaults to the current profile
+    :return:
+    """
+    for b in range(1, out.RasterCount + 1):
+        out.GetRasterBand(b).FlushCache()
+
+    if out.GetDriver().ShortName != "MEM":
+        build_overviews(out, name)
+
+    if out.GetDriver().ShortName == "MEM":
+        fformat = PROFILES[get_profile(name)][0]
+
+        driver = gdal.GetDriverByName(fformat)
+
+        if driver is None:
+            print("\nThe {} driver is not available in this version of GDAL".format(fformat))
+
+            sys.exit(1)
+
+        driver.CreateCopy(outfile, out, options=get_options(out.GetRasterBand(1).DataType, name))
+
+    return None
+
+
+def get_available():
+    """
+    :return: <list> The names of the profiles this version of GDAL can write, cog needs GDAL >= 3.1
+    """
+    cog = int(gdal.VersionInfo()) >= COG_VERSION and gdal.GetDriverByName("COG") is not None
+
+    return [name for name in PROFILES.keys() if name != "cog" or cog]
+
+
+def add_argument(parser):
+    """
+    Add the -profile option to an argparse parser
+    :param parser: <argparse.ArgumentParser>
+    :return:
+    """
+    parser.add_argument("-profile", dest="profile", type=str, required=False, default=None,
+                        choices=get_available(),
+                        help="The output raster profile, default is {}".format(DEFAULT))
+
+    return None
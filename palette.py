@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Read the Color_tables/*.txt palettes into GDAL color tables.
+
+Each .txt file holds the <ColorTable> entries that used to be spliced into a VRT before running gdal_translate.  The
+entries are parsed once per process into a gdal.ColorTable, which is attached to the output band while the raster is
+written, so a colored product no longer needs temporary VRT/TIFF copies.
+"""
+
+import functools
+import os
+import re
+import sys
+
+from osgeo import gdal
+
+gdal.UseExceptions()
+
+# Default location of the color table .txt files
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Color_tables")
+
+ENTRY = re.compile(r'<Entry\s+c1="(\d+)"\s+c2="(\d+)"\s+c3="(\d+)"(?:\s+c4="(\d+)")?\s*/>')
+
+
+def get_table_path(clr_table):
+    """
+    Find the color table file, either as given or by name in Color_tables
+    :param clr_table: <str> Path or file name of the color table (e.g. color_covermap.txt)
+    :return: <str> Full path to the color table
+    """
+    if os.path.exists(clr_table):
+        return os.path.abspath(clr_table)
+
+    path = os.path.join(TABLE_DIR, os.path.basename(clr_table))
+
+    if not os.path.exists(path):
+        print("\nCould not find color table {}".format(clr_table))
+
+        sys.exit(1)
+
+    return path
+
+
+def read_entries(clr_table):
+    """
+    Parse the <Entry> elements of a color table file, the nth entry is the color of pixel value n
+    :param clr_table: <str> Path or file name of the color table
+    :return: <list> (red, green, blue, alpha) tuples
+    """
+    with open(get_table_path(clr_table), "r") as txt:
+        matches = ENTRY.findall(txt.read())
+
+    return [(int(c1), int(c2), int(c3), int(c4) if c4 else 255) for c1, c2, c3, c4 in matches]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_color_table(path):
+    """
+    Build the gdal.ColorTable for a color table file, cached by full path
+    :param path: <str> Full path to the color table
+    :return: <gdal.ColorTable>
+    """
+    table = gdal.ColorTable()
+
+    for value, entry in enumerate(read_entries(path)):
+        table.SetColorEntry(value, entry)
+
+    return table
+
+
+def get_color_table(clr_table):
+    """
+    Return the gdal.ColorTable for a color table file, the file is only parsed the first time it is requested
+    :param clr_table: <str> Path or file name of the color table (e.g. color_covermap.txt)
+    :return: <gdal.ColorTable>
+    """
+    return _get_color_table(get_table_path(clr_table))
+
+
+def set_color_table(band, clr_table):
+    """
+    Attach a color table to a raster band and mark the band as palette indexed
+    :param band: <gdal.Band> Byte or UInt16 band of a raster opened for writing
+    :param clr_table: <str> Path or file name of the color table
+    :return:
+    """
+    band.SetRasterColorTable(get_color_table(clr_table))
+
+    band.SetRasterColorInterpretation(gdal.GCI_PaletteIndex)
+
+    return None
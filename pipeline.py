@@ -0,0 +1,462 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Run the numbered evaluation stages for every tile as a dependency graph.
+
+Each stage is one of the numbered scripts with its command line, input patterns and output paths written as templates
+of {root}, {tile}, {from}, {to} and the pipeline variables.  A stage depends on every stage of the same run that
+writes a file matched by one of its input patterns.  A stage is only run if one of its outputs is missing, its command
+changed, or the files matched by its inputs changed since it last succeeded.  Inputs are compared by size and
+modification time, or by content hash with -hash so that an upstream rebuild that writes identical files doesn't
+cascade.  Stages whose dependencies are complete run in parallel across stages and tiles, up to the worker limit.
+
+The state of the last successful run of each stage, and a log of each run, are kept in .lcmap_pipeline under the root.
+The default pipeline runs the CCDC summaries and graphs of each tile, -config replaces it with a JSON file of the same
+structure as DEFAULT_PIPELINE.
+"""
+
+import argparse
+import fnmatch
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import catalog
+
+# The numbered scripts live next to this module and are run from here so that their relative Color_tables paths work
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+STATE_DIR = ".lcmap_pipeline"
+
+DEFAULT_PIPELINE = {
+    "vars": {
+        "maps": "{root}/{tile}/CCDCMap",
+        "eval": "{root}/{tile}/eval"
+    },
+    "stages": [
+        {
+            "name": "lc_change",
+            "script": "4_ccdc_lc_change.py",
+            "args": ["-i", "{maps}", "-o", "{eval}/lc_change", "-n", "CoverPrim", "-y1", "{from}", "-y2", "{to}"],
+            "inputs": ["{maps}/*CoverPrim*.tif"],
+            "outputs": ["{eval}/lc_change/{from}_{to}/ccdc{from}to{to}lcc.tif"]
+        },
+        {
+            "name": "cover_changes",
+            "script": "5_ccdc_cover_changes.py",
+            "args": ["-i", "{maps}", "-o", "{eval}/cover_changes", "-name", "CoverPrim", "-from", "{from}",
+                     "-to", "{to}"],
+            "inputs": ["{maps}/*CoverPrim*.tif"],
+            "outputs": ["{eval}/cover_changes/{from}_{to}/CoverPrim{from}to{to}ct.tif"]
+        },
+        {
+            "name": "num_changes",
+            "script": "5_ccdc_num_changes.py",
+            "args": ["-i", "{maps}", "-o", "{eval}/num_changes", "-from", "{from}", "-to", "{to}"],
+            "inputs": ["{maps}/*ChangeMap*.tif"],
+            "outputs": ["{eval}/num_changes/{from}_{to}/ccdc{from}to{to}ct.tif"]
+        },
+        {
+            "name": "plot_cover_area",
+            "script": "7_plot_areachange.py",
+            "args": ["-i", "{eval}/cover_changes/{from}_{to}", "-o", "{eval}/graphs/cover", "-type", "cover",
+                     "-tile", "{tile}", "-from", "{from}", "-to", "{to}"],
+            "inputs": ["{eval}/cover_changes/{from}_{to}/CoverPrim{from}to{to}ct.tif"],
+            "outputs": ["{eval}/graphs/cover/area_change.png"]
+        },
+        {
+            "name": "plot_change_area",
+            "script": "7_plot_areachange.py",
+            "args": ["-i", "{eval}/num_changes/{from}_{to}", "-o", "{eval}/graphs/change", "-type", "change",
+                     "-tile", "{tile}", "-from", "{from}", "-to", "{to}"],
+            "inputs": ["{eval}/num_changes/{from}_{to}/ccdc{from}to{to}ct.tif"],
+            "outputs": ["{eval}/graphs/change/area_change.png"]
+        }
+    ]
+}
+
+Task = namedtuple("Task", ["id", "stage", "tile", "script", "args", "inputs", "outputs"])
+
+
+def get_config(config=None):
+    """
+    :param config: <str> Full path to a JSON pipeline, defaults to DEFAULT_PIPELINE
+    :return: <dict>
+    """
+    if config is None:
+        return DEFAULT_PIPELINE
+
+    with open(config, "r") as c:
+        return json.load(c)
+
+
+def get_tiles(root):
+    """
+    :param root: <str> Full path to the directory containing a folder for each tile
+    :return: <list> The names of the folders that are named for a tile
+    """
+    tiles = sorted(entry.name for entry in os.scandir(root) if entry.is_dir() and catalog.get_tile(entry.name))
+
+    if len(tiles) == 0:
+        print("\nCould not locate any tile folders in {}\n".format(root))
+
+        sys.exit(1)
+
+    return tiles
+
+
+def get_tasks(config, root, tiles, y1, y2):
+    """
+    Fill in the stage templates for every tile
+    :param config: <dict> The pipeline
+    :param root: <str>
+    :param tiles: <list>
+    :param y1: <str> The 'from' year
+    :param y2: <str> The 'to' year
+    :return: <list> Task for each stage and tile
+    """
+    tasks = []
+
+    for tile in tiles:
+
+        values = {"root": root, "tile": tile, "from": y1, "to": y2}
+
+        for name, template in config.get("vars", dict()).items():
+            values[name] = template.format(**values)
+
+        for stage in config["stages"]:
+
+            def fill(templates):
+                return [t.format(**values) for t in templates]
+
+            tasks.append(Task(id="{}/{}".format(tile, stage["name"]), stage=stage["name"], tile=tile,
+                              script=stage["script"], args=fill(stage.get("args", [])),
+                              inputs=[os.path.normpath(p) for p in fill(stage.get("inputs", []))],
+                              outputs=[os.path.normpath(p) for p in fill(stage.get("outputs", []))]))
+
+    return tasks
+
+
+def get_dependencies(tasks):
+    """
+    :param tasks: <list> Task
+    :return: <dict> Task id -> set of the ids of the tasks that write one of its inputs
+    """
+    writers = dict()
+
+    for task in tasks:
+        for outfile in task.outputs:
+            writers.setdefault(os.path.dirname(outfile), []).append((outfile, task.id))
+
+    deps = dict()
+
+    for task in tasks:
+        deps[task.id] = set()
+
+        for pattern in task.inputs:
+
+            folder = os.path.dirname(pattern)
+
+            candidates = writers.get(folder, []) if not glob.has_magic(folder) else \
+                [w for ws in writers.values() for w in ws]
+
+            deps[task.id].update(tid for outfile, tid in candidates
+                                 if tid != task.id and fnmatch.fnmatch(outfile, pattern))
+
+    return deps
+
+
+def get_hash(infile):
+    """
+    :param infile: <str>
+    :return: <str> SHA-1 of the file contents
+    """
+    sha = hashlib.sha1()
+
+    with open(infile, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+
+    return sha.hexdigest()
+
+
+class State(object):
+    """
+    The inputs and command of the last successful run of each task, saved under the pipeline root
+    """
+
+    def __init__(self, root, use_hash=False):
+        self.file = os.path.join(root, STATE_DIR, "state.json")
+
+        self.use_hash = use_hash
+
+        self.lock = threading.Lock()
+
+        try:
+            with open(self.file, "r") as s:
+                data = json.load(s)
+
+        except (OSError, ValueError):
+            data = dict()
+
+        self.tasks = data.get("tasks", dict())
+
+        # size, modification time and hash of each input, so unchanged files are not hashed again
+        self.files = data.get("files", dict())
+
+    def get_stamp(self, infile):
+        """
+        :param infile: <str>
+        :return: <list> The size and modification time, or the content hash
+        """
+        stat = os.stat(infile)
+
+        if not self.use_hash:
+            return [stat.st_size, stat.st_mtime_ns]
+
+        with self.lock:
+            known = self.files.get(infile)
+
+        if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return [known[2]]
+
+        digest = get_hash(infile)
+
+        with self.lock:
+            self.files[infile] = [stat.st_size, stat.st_mtime_ns, digest]
+
+        return [digest]
+
+    def get_inputs(self, task):
+        """
+        :param task: <Task>
+        :return: <dict> Each file matched by the input patterns -> its stamp
+        """
+        return {f: self.get_stamp(f) for pattern in task.inputs for f in sorted(glob.glob(pattern))}
+
+    def is_current(self, task, command, inputs):
+        """
+        :param task: <Task>
+        :param command: <list>
+        :param inputs: <dict> From get_inputs
+        :return: <bool> True if the outputs exist and were built from the same command and inputs
+        """
+        with self.lock:
+            last = self.tasks.get(task.id)
+
+        return last is not None and last["command"] == command and last["inputs"] == inputs and \
+            all(os.path.exists(outfile) for outfile in task.outputs)
+
+    def record(self, task, command, inputs):
+        """
+        Save a successful run of a task
+        :param task: <Task>
+        :param command: <list>
+        :param inputs: <dict> The input stamps from before the task ran
+        :return:
+        """
+        with self.lock:
+            self.tasks[task.id] = {"command": command, "inputs": inputs}
+
+            if not os.path.exists(os.path.dirname(self.file)):
+                os.makedirs(os.path.dirname(self.file))
+
+            with open(self.file + ".tmp", "w") as s:
+                json.dump({"tasks": self.tasks, "files": self.files}, s, indent=1, sort_keys=True)
+
+            os.replace(self.file + ".tmp", self.file)
+
+        return None
+
+
+def get_command(task):
+    """
+    :param task: <Task>
+    :return: <list> The command line of the task, the interpreter is left out so a new Python doesn't force a rebuild
+    """
+    return [task.script] + task.args
+
+
+def run_task(task, state, root, dry_run=False):
+    """
+    Run a task if it is out of date
+    :param task: <Task>
+    :param state: <State>
+    :param root: <str> Full path to the pipeline root
+    :param dry_run: <bool> Only report whether the task would run
+    :return: <str> "current", "ran", "would run" or "failed"
+    """
+    command = get_command(task)
+
+    inputs = state.get_inputs(task)
+
+    if state.is_current(task, command, inputs):
+        return "current"
+
+    if dry_run:
+        return "would run"
+
+    # the scripts skip outputs that already exist, so stale outputs are removed first, and some scripts only create
+    # the last level of their output directory, so the parents are created here
+    for outfile in task.outputs:
+        if os.path.isfile(outfile):
+            os.remove(outfile)
+
+        os.makedirs(os.path.dirname(outfile), exist_ok=True)
+
+    log = os.path.join(root, STATE_DIR, "logs", task.tile, "{}.log".format(task.stage))
+
+    if not os.path.exists(os.path.dirname(log)):
+        os.makedirs(os.path.dirname(log))
+
+    print("Running {}".format(task.id))
+
+    with open(log, "w") as out:
+        code = subprocess.call([sys.executable, os.path.join(REPO, task.script)] + task.args, cwd=REPO, stdout=out,
+                               stderr=subprocess.STDOUT)
+
+    missing = [outfile for outfile in task.outputs if not os.path.exists(outfile)]
+
+    if code != 0 or len(missing) > 0:
+        print("\n{} failed, see {}".format(task.id, log))
+
+        return "failed"
+
+    state.record(task, command, inputs)
+
+    return "ran"
+
+
+def run_pipeline(tasks, state, root, workers=4, dry_run=False):
+    """
+    Run the tasks in dependency order, starting each one as soon as the tasks it depends on are complete
+    :param tasks: <list> Task
+    :param state: <State>
+    :param root: <str> Full path to the pipeline root
+    :param workers: <int> Maximum number of tasks running at the same time
+    :param dry_run: <bool> Only report which tasks would run
+    :return: <dict> Task id -> result
+    """
+    deps = get_dependencies(tasks)
+
+    pending = {task.id: task for task in tasks}
+
+    results, running = dict(), dict()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while pending or running:
+
+            for tid in sorted(pending):
+
+                if not deps[tid] <= set(results):
+                    continue
+
+                task = pending.pop(tid)
+
+                # a task that depends on a failed or skipped task is skipped too
+                if any(results[d] in ("failed", "skipped") for d in deps[tid]):
+                    results[tid] = "skipped"
+
+                # in a dry run a task is out of date if anything it depends on would run
+                elif dry_run and any(results[d] == "would run" for d in deps[tid]):
+                    results[tid] = "would run"
+
+                else:
+                    running[pool.submit(run_task, task, state, root, dry_run)] = tid
+
+            if not running:
+                if pending:
+                    print("\nThe stages {} depend on each other".format(", ".join(sorted(pending))))
+
+                    sys.exit(1)
+
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                results[running.pop(future)] = future.result()
+
+    return results
+
+
+def main_work(root, tiles=None, from_year="1984", to_year="2015", config=None, stages=None, workers=4,
+              use_hash=False, dry_run=False):
+    """
+    :param root: <str> Full path to the directory containing a folder for each tile
+    :param tiles: <list> Tile folders to process, defaults to every tile folder in root
+    :param from_year: <str>
+    :param to_year: <str>
+    :param config: <str> Full path to a JSON pipeline, defaults to DEFAULT_PIPELINE
+    :param stages: <list> Only run these stages, the stages they depend on must already be complete
+    :param workers: <int> Maximum number of tasks running at the same time
+    :param use_hash: <bool> Compare inputs by content hash instead of size and modification time
+    :param dry_run: <bool> Only report which tasks would run
+    :return:
+    """
+    root = os.path.abspath(root)
+
+    tasks = get_tasks(get_config(config), root, tiles or get_tiles(root), from_year, to_year)
+
+    if stages is not None:
+        tasks = [task for task in tasks if task.stage in stages]
+
+    results = run_pipeline(tasks, State(root, use_hash), root, workers, dry_run)
+
+    for result in ("current", "ran", "would run", "skipped", "failed"):
+
+        ids = sorted(tid for tid, r in results.items() if r == result)
+
+        if ids:
+            print("\n{} ({}):\n\t{}".format(result.capitalize(), len(ids), "\n\t".join(ids)))
+
+    if "failed" in results.values():
+        sys.exit(1)
+
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the out of date evaluation products of each tile")
+
+    parser.add_argument("-i", "--root", dest="root", type=str, required=True,
+                        help="Full path to the directory containing a folder for each tile")
+
+    parser.add_argument("-tiles", dest="tiles", type=str, nargs="+", required=False, default=None,
+                        help="Tile folders to process, defaults to every tile folder in the root")
+
+    parser.add_argument("-from", dest="from_year", type=str, required=False, default="1984",
+                        help="The beginning year")
+
+    parser.add_argument("-to", dest="to_year", type=str, required=False, default="2015",
+                        help="The ending year")
+
+    parser.add_argument("-config", dest="config", type=str, required=False, default=None,
+                        help="Full path to a JSON pipeline with the same structure as the default pipeline")
+
+    parser.add_argument("-stages", dest="stages", type=str, nargs="+", required=False, default=None,
+                        help="Only run these stages")
+
+    parser.add_argument("-w", "--workers", dest="workers", type=int, required=False, default=4,
+                        help="Maximum number of stages running at the same time")
+
+    parser.add_argument("-hash", dest="use_hash", action="store_true",
+                        help="Compare inputs by content hash instead of size and modification time")
+
+    parser.add_argument("-n", "--dry-run", dest="dry_run", action="store_true",
+                        help="Only list the stages that are out of date")
+
+    args = parser.parse_args()
+
+    main_work(**vars(args))
+
+    return None
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Purpose: Reclassify raster values with break points or a value -> class lookup table.
+
+Both methods are applied to each block in a single vectorized pass: break points with np.searchsorted and lookup
+tables with fancy indexing.  This replaces the chains of boolean masks (one full pass per class) used by the
+reclassify and recode scripts.
+"""
+
+import os
+import sys
+
+import numpy as np
+from osgeo import gdal
+
+import band_math
+
+gdal.UseExceptions()
+
+
+def classify(array, breaks):
+    """
+    Bin the array values with the break points.  Values <= breaks[0] become class 0, values in the range
+    (breaks[i - 1], breaks[i]] become class i and values > breaks[-1] become class len(breaks).
+    :param array: <numpy.ndarray>
+    :param breaks: <list> or <numpy.ndarray> Ascending upper bound of each class
+    :return: <numpy.ndarray> UInt8 array of class values
+    """
+    out = np.searchsorted(breaks, array, side="left").astype(np.uint8)
+
+    if np.issubdtype(array.dtype, np.floating):
+        out[np.isnan(array)] = 0
+
+    return out
+
+
+def get_lut(table, size=256, default=None, dtype=np.uint8):
+    """
+    Build a lookup table from a dict of value -> class
+    :param table: <dict> Input value -> output class
+    :param size: <int> Number of entries, must be greater than the largest input value
+    :param default: The class for values not in table, use None to keep the input value
+    :param dtype: NumPy type of the lookup table
+    :return: <numpy.ndarray>
+    """
+    if default is None:
+        lut = np.arange(size).astype(dtype)
+
+    else:
+        lut = np.full(size, default, dtype=dtype)
+
+    for value, cls in table.items():
+        lut[value] = cls
+
+    return lut
+
+
+def recode(array, lut):
+    """
+    Replace every value in array with its lookup table entry.  Values outside the range of the lookup table are left
+    unchanged.
+    :param array: <numpy.ndarray> Integer array
+    :param lut: <numpy.ndarray> Lookup table from get_lut
+    :return: <numpy.ndarray>
+    """
+    if array.dtype == np.uint8 and lut.size >= 256:
+        return lut[array]
+
+    out = array.copy()
+
+    inside = (array >= 0) & (array < lut.size)
+
+    out[inside] = lut[array[inside]]
+
+    return out
+
+
+def reclassify_raster(infile, outfile, func, fformat=None, dtype=gdal.GDT_Byte, nodata=None, blocksize=1024):
+    """
+    Apply func to the input raster one block at a time and write the result to a single band output raster
+    :param infile: <str> Full path to the input raster
+    :param outfile: <str> Full path to the output raster
+    :param func: <function> Takes a block of the input raster and returns the reclassified block
+    :param fformat: <str> GDAL driver name for the output, the default uses the driver of the input raster
+    :param dtype: <int> GDAL data type for the output
+    :param nodata: Optional NoData value for the output
+    :param blocksize: <int> Maximum number of rows and columns in a block
+    :return: <str> The output raster
+    """
+    src = gdal.Open(infile, gdal.GA_ReadOnly)
+
+    if src is None:
+        print("Could not open image file {a}".format(a=os.path.basename(infile)))
+
+        sys.exit(1)
+
+    if fformat is None:
+        fformat = src.GetDriver().ShortName
+
+    rows, cols = src.RasterYSize, src.RasterXSize
+
+    out = band_math.create_output(outfile, fformat, cols, rows, dtype, src.GetGeoTransform(), src.GetProjection(),
+                                  nodata)
+
+    inband, outband = src.GetRasterBand(1), out.GetRasterBand(1)
+
+    for xoff, yoff, xsize, ysize in band_math.get_windows(rows, cols, blocksize):
+
+        # GDAL converts the block to the output type the same way it would a whole array
+        outband.WriteArray(func(inband.ReadAsArray(xoff, yoff, xsize, ysize)), xoff, yoff)
+
+    band_math.finish_output(out, outfile, fformat)
+
+    src, inband, out, outband = None, None, None, None
+
+    return outfile
@@ -0,0 +1,57 @@
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the scripts import the shared modules from the repository root
+sys.path.insert(0, REPO)
+
+
+@pytest.fixture
+def load_script():
+    """
+    :return: <function> Imports a script of the repository root whose name isn't a valid module name (e.g.
+             5_ccdc_num_changes) and returns the module
+    """
+    def load(name):
+        spec = importlib.util.spec_from_file_location("script_" + name, os.path.join(REPO, name + ".py"))
+
+        module = importlib.util.module_from_spec(spec)
+
+        spec.loader.exec_module(module)
+
+        return module
+
+    return load
+
+
+@pytest.fixture
+def write_raster(tmp_path):
+    """
+    :return: <function> Writes a single band GTiff from an array and returns its path
+    """
+    gdal = pytest.importorskip("osgeo.gdal")
+
+    types = {"uint8": gdal.GDT_Byte, "uint16": gdal.GDT_UInt16, "int16": gdal.GDT_Int16, "int32": gdal.GDT_Int32,
+             "float32": gdal.GDT_Float32}
+
+    def write(name, data, nodata=None):
+        path = str(tmp_path / name)
+
+        out = gdal.GetDriverByName("GTiff").Create(path, data.shape[1], data.shape[0], 1, types[data.dtype.name])
+
+        out.SetGeoTransform((0, 30, 0, 0, 0, -30))
+
+        if nodata is not None:
+            out.GetRasterBand(1).SetNoDataValue(nodata)
+
+        out.GetRasterBand(1).WriteArray(data)
+
+        out = None
+
+        return path
+
+    return write
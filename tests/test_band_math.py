@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+import band_math
+
+
+def read(path):
+    band = gdal.Open(path).GetRasterBand(1)
+
+    return band.ReadAsArray(), band.GetNoDataValue()
+
+
+def test_get_windows_cover_raster():
+    windows = list(band_math.get_windows(5, 7, 3))
+
+    covered = np.zeros((5, 7), int)
+
+    for xoff, yoff, xsize, ysize in windows:
+        covered[yoff:yoff + ysize, xoff:xoff + xsize] += 1
+
+    assert (covered == 1).all()
+    assert max(max(w[2], w[3]) for w in windows) == 3
+
+
+def test_band_calc_matches_pair_loop(write_raster, tmp_path):
+    rng = np.random.default_rng(0)
+
+    years = [rng.integers(1, 4, (9, 11)).astype(np.uint8) for _ in range(4)]
+
+    paths = [write_raster("y{}.tif".format(i), y) for i, y in enumerate(years)]
+
+    pairs = [{"A": paths[i], "B": paths[i + 1]} for i in range(len(paths) - 1)]
+
+    outfiles = [str(tmp_path / "out{}.tif".format(i)) for i in range(len(pairs))]
+
+    band_math.band_calc("A != B", pairs, outfiles, blocksize=4)
+
+    # the loop of RasterChangeGrid1 in the baseline
+    expected = np.zeros((9, 11), int)
+
+    for i in range(len(years) - 1):
+        expected += (years[i] != years[i + 1]).astype(int)
+
+        data, nodata = read(outfiles[i])
+
+        assert (data == expected).all()
+        assert nodata == band_math.DEFAULT_NODATA[gdal.GDT_Int16]
+
+
+def test_band_calc_masks_input_nodata(write_raster, tmp_path):
+    y1 = np.array([[1, 2, 3], [4, 5, 6]], np.uint8)
+
+    y2 = np.array([[1, 0, 3], [4, 6, 6]], np.uint8)
+
+    y3 = np.array([[2, 3, 3], [4, 6, 7]], np.uint8)
+
+    # the second year is NoData in one pixel, the chain of gdal_calc calls made that pixel NoData in every later sum
+    paths = [write_raster("y1.tif", y1, 0), write_raster("y2.tif", y2, 0), write_raster("y3.tif", y3, 0)]
+
+    outfiles = [str(tmp_path / "out1.tif"), str(tmp_path / "out2.tif")]
+
+    band_math.band_calc("A != B", [{"A": paths[0], "B": paths[1]}, {"A": paths[1], "B": paths[2]}], outfiles,
+                        dtype=gdal.GDT_Byte)
+
+    out1, nodata1 = read(outfiles[0])
+
+    out2, nodata2 = read(outfiles[1])
+
+    assert nodata1 == nodata2 == 255
+
+    assert out1.tolist() == [[0, 255, 0], [0, 1, 0]]
+    assert out2.tolist() == [[1, 255, 0], [0, 1, 1]]
+
+
+def test_band_calc_without_mask_counts_nodata(write_raster, tmp_path):
+    y1 = np.array([[1, 2]], np.uint8)
+
+    y2 = np.array([[1, 0]], np.uint8)
+
+    paths = [write_raster("y1.tif", y1, 0), write_raster("y2.tif", y2, 0)]
+
+    outfile = str(tmp_path / "out.tif")
+
+    band_math.band_calc("A != B", [{"A": paths[0], "B": paths[1]}], [outfile], dtype=gdal.GDT_Byte, nodata=255,
+                        mask_nodata=False)
+
+    assert read(outfile)[0].tolist() == [[0, 1]]
@@ -0,0 +1,149 @@
+import glob
+import os
+
+import pytest
+
+import catalog
+
+
+@pytest.mark.parametrize("name, expected", [("H03V01_CoverPrim_1985.tif", ("H03V01", "CoverPrim", "1985")),
+                                            ("/data/h3v1/nlcd1992.tif", ("", "nlcd", "1992")),
+                                            ("ccdc_H5V2_ChangeMap_2001.tif", ("H05V02", "ccdc_ChangeMap", "2001")),
+                                            ("Trendsblock_1986.img", ("", "Trendsblock", "1986")),
+                                            ("Legend.tif", ("", "Legend", ""))])
+def test_parse_name(name, expected):
+    assert catalog.parse_name(name) == expected
+
+
+def test_get_tile_from_directory():
+    assert catalog.get_tile(os.path.join("ard", "h5v2", "nlcd1992.tif")) == "H05V02"
+
+    assert catalog.get_tile(os.path.join("ard", "nlcd1992.tif")) == ""
+
+
+def touch_dir(path):
+    """
+    Move the modification time of a directory forward, changes made within the timestamp granularity of the file
+    system can otherwise leave it unchanged
+    """
+    mtime = os.stat(path).st_mtime_ns + 10 ** 9
+
+    os.utime(path, ns=(mtime, mtime))
+
+
+def make_files(folder, names):
+    os.makedirs(folder, exist_ok=True)
+
+    for name in names:
+        open(os.path.join(folder, name), "w").close()
+
+    touch_dir(folder)
+
+
+def baseline_get_layers(infolder, y1=None, y2=None):
+    """
+    The baseline get_layers of 5_ccdc_num_changes
+    """
+    templist = glob.glob("{a}{b}*ChangeMap*.tif".format(a=infolder, b=os.sep))
+
+    templist.sort()
+
+    if y1 is None or y2 is None:
+        return templist
+
+    return [r for y in range(int(y1), int(y2) + 1) for r in templist if str(y) in r]
+
+
+def baseline_get_year(path):
+    """
+    The baseline year parsing of 5_ccdc_num_changes, the 4 digit piece of the name
+    """
+    pieces = os.path.splitext(os.path.basename(path))[0].split("_")
+
+    return [piece for piece in pieces if len(piece) == 4 and piece.isdigit()][0]
+
+
+@pytest.fixture
+def tree(tmp_path):
+    folder = str(tmp_path / "H05V02")
+
+    make_files(folder, ["H05V02_ChangeMap_{}.tif".format(y) for y in range(1985, 1992)] +
+               ["H05V02_CoverPrim_{}.tif".format(y) for y in range(1985, 1992)] +
+               ["H05V02_ChangeMap_1992.img", "readme.txt"])
+
+    make_files(os.path.join(folder, "sub"), ["H05V02_ChangeMap_2000.tif"])
+
+    return folder
+
+
+def test_get_files_matches_baseline_glob(tree):
+    assert catalog.get_files(tree, product="ChangeMap") == baseline_get_layers(tree)
+
+    assert catalog.get_files(tree, product="ChangeMap", years=range(1987, 1990)) == baseline_get_layers(tree, 1987,
+                                                                                                         1989)
+
+    assert [catalog.get_year(f) for f in catalog.get_files(tree, product="ChangeMap")] == \
+           [baseline_get_year(f) for f in baseline_get_layers(tree)]
+
+
+def test_get_files_filters(tree):
+    assert len(catalog.get_files(tree)) == 14
+
+    assert len(catalog.get_files(tree, ext=None)) == 15
+
+    assert catalog.get_files(tree, tile="h5v2") == []
+
+    assert len(catalog.get_files(tree, tile="H05V02")) == 14
+
+    assert catalog.get_files(tree, product="ChangeMap", recursive=True)[-1] == \
+           os.path.join(tree, "sub", "H05V02_ChangeMap_2000.tif")
+
+    assert catalog.get_years(tree, product="CoverPrim") == [str(y) for y in range(1985, 1992)]
+
+    assert sorted(catalog.get_products(tree)["H05V02"]) == ["ChangeMap", "CoverPrim"]
+
+
+def test_index_follows_changes(tree):
+    assert len(catalog.get_files(tree, product="ChangeMap")) == 7
+
+    os.remove(os.path.join(tree, "H05V02_ChangeMap_1985.tif"))
+
+    make_files(tree, ["H05V02_ChangeMap_1995.tif"])
+
+    assert catalog.get_files(tree, product="ChangeMap") == baseline_get_layers(tree)
+
+    # a new lookup in another process loads the saved index
+    catalog._indexes.clear()
+
+    assert catalog.get_files(tree, product="ChangeMap") == baseline_get_layers(tree)
+
+
+def test_update_index_lists_only_changed_directories(tree):
+    root, index = os.path.dirname(tree), dict()
+
+    top = os.path.basename(tree)
+
+    assert catalog.update_index(root, index, top)
+
+    assert sorted(index) == [top, os.path.join(top, "sub")]
+
+    assert not catalog.update_index(root, index, top)
+
+    make_files(os.path.join(tree, "sub"), ["H05V02_ChangeMap_2001.tif"])
+
+    # a lookup that isn't recursive only checks top
+    assert not catalog.update_index(root, index, top, recursive=False)
+
+    assert len(index[os.path.join(top, "sub")]["files"]) == 1
+
+    assert catalog.update_index(root, index, top)
+
+    assert len(index[os.path.join(top, "sub")]["files"]) == 2
+
+    os.rename(os.path.join(tree, "sub"), os.path.join(tree, "moved"))
+
+    touch_dir(tree)
+
+    assert catalog.update_index(root, index, top)
+
+    assert sorted(index) == [top, os.path.join(top, "moved")]
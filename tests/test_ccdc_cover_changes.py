@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+
+def read(path):
+    return gdal.Open(path).GetRasterBand(1).ReadAsArray()
+
+
+def baseline_cover_changes(stack):
+    """
+    The whole-array loop of 5_ccdc_cover_changes.do_calc before the blockwise scan
+    """
+    holder = np.copy(stack[0])
+
+    sum_change = np.zeros_like(holder, dtype=np.int8)
+
+    for index in range(1, len(stack)):
+        tempdata = np.copy(stack[index])
+
+        if index == 1:
+            holder[holder == 9] = tempdata[holder == 9]
+
+            holder[holder == 0] = tempdata[holder == 0]
+
+        tempdata[tempdata == 9] = holder[tempdata == 9]
+
+        tempdata[tempdata == 0] = holder[tempdata == 0]
+
+        tempmask = (tempdata != holder).astype(np.int8)
+
+        holder[tempdata != holder] = tempdata[tempdata != holder]
+
+        sum_change = sum_change + tempmask
+
+    return sum_change
+
+
+def test_cover_changes_match_baseline(load_script, write_raster, tmp_path, monkeypatch):
+    monkeypatch.setenv("LCMAP_HIST_CATALOG", str(tmp_path / "histograms.sqlite"))
+
+    script = load_script("5_ccdc_cover_changes")
+
+    rng = np.random.default_rng(0)
+
+    # classes 1-8 with the 0 (insufficient data) and 9 values that don't count as a change
+    stack = [rng.choice([0, 1, 2, 3, 9], size=(13, 11), p=[0.1, 0.3, 0.3, 0.2, 0.1]).astype(np.uint8)
+             for _ in range(6)]
+
+    in_files = [write_raster("CoverPrim_{}.tif".format(1985 + i), data) for i, data in enumerate(stack)]
+
+    out_files = {i: str(tmp_path / "out{}.tif".format(i)) for i in range(1, len(stack))}
+
+    script.do_calc(in_files, out_files, blocksize=4)
+
+    for i, out_r in out_files.items():
+        assert (read(out_r) == baseline_cover_changes(stack[:i + 1])).all()
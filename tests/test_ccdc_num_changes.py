@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+gdal = pytest.importorskip("osgeo.gdal")
+
+
+def read(path):
+    return gdal.Open(path).GetRasterBand(1).ReadAsArray()
+
+
+def baseline_num_changes(stack, start, end):
+    """
+    The chain of 5_ccdc_num_changes.do_calc calls before the single read of the stack, each year adds its changes to
+    the output of the previous year
+    """
+    out = np.where(stack[start] > 0, 1, 0).astype(np.uint8)
+
+    for index in range(start + 1, end + 1):
+        out = np.add(out, np.where(stack[index] > 0, 1, 0)).astype(np.uint8)
+
+    return out
+
+
+def test_num_changes_match_baseline(load_script, write_raster, tmp_path):
+    script = load_script("5_ccdc_num_changes")
+
+    rng = np.random.default_rng(1)
+
+    # change day values, 0 is no change
+    stack = [np.where(rng.random((9, 14)) < 0.3, rng.integers(1, 365, (9, 14)), 0).astype(np.uint16)
+             for _ in range(7)]
+
+    in_files = [write_raster("ChangeMap_{}.tif".format(1985 + i), data) for i, data in enumerate(stack)]
+
+    ranges = [(0, 6), (0, 3), (2, 5), (4, 4)]
+
+    out_files = {r: str(tmp_path / "out_{}_{}.tif".format(*r)) for r in ranges}
+
+    script.do_calc(in_files, out_files, blocksize=4)
+
+    for (start, end), out_r in out_files.items():
+        assert (read(out_r) == baseline_num_changes(stack, start, end)).all()
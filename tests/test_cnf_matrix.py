@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo.gdal")
+
+import cnf_matrix
+
+
+def baseline_matrix(reference, classified, classes):
+    """
+    The per class pair loop and bordering of compute_confusion_matrix before the bincount rewrite
+    """
+    matrix = np.zeros((len(classes), len(classes)), np.int32)
+
+    for c in classes:
+        for r in classes:
+            matrix[classes.index(c), classes.index(r)] = np.sum(np.logical_and(reference == r, classified == c))
+
+    matrix = np.append(matrix, matrix.sum(axis=1).reshape((len(classes), 1)), axis=1)
+
+    matrix = np.append(matrix, matrix.sum(axis=0).reshape((1, len(classes) + 1)), axis=0)
+
+    matrix = np.insert(np.insert(matrix, 0, 0, axis=0), 0, 0, axis=1)
+
+    labels = [0] + classes + [99999999]
+
+    matrix[:, 0], matrix[0, :] = labels, labels
+
+    return matrix
+
+
+def get_classes(reference, classified):
+    return sorted(set(np.unique(reference).tolist()) | set(np.unique(classified).tolist()))
+
+
+def test_get_pair_counts_ignores_values_outside_classes():
+    reference = np.array([1, 2, 3, 9])
+
+    classified = np.array([1, 3, 3, 1])
+
+    counts = cnf_matrix.get_pair_counts(reference, classified, [1, 2, 3])
+
+    # rows are the classified values, columns the reference values
+    assert counts.tolist() == [[1, 0, 0], [0, 0, 0], [0, 1, 1]]
+
+
+def test_compute_confusion_matrix_matches_baseline():
+    rng = np.random.default_rng(0)
+
+    reference = rng.choice([0, 1, 2, 5, 11], size=(30, 40))
+
+    classified = rng.choice([0, 1, 2, 7, 11], size=(30, 40))
+
+    classes = get_classes(reference, classified)
+
+    expected = baseline_matrix(reference, classified, list(classes))
+
+    assert (cnf_matrix.compute_confusion_matrix(reference, classified, list(classes)) == expected).all()
+
+
+def test_update_pair_counts_expands_classes():
+    matrix, classes = np.zeros((0, 0), np.int64), []
+
+    matrix, classes = cnf_matrix.update_pair_counts(matrix, classes, np.array([2, 2]), np.array([2, 4]), [2, 4])
+
+    matrix, classes = cnf_matrix.update_pair_counts(matrix, classes, np.array([1, 4]), np.array([1, 4]), [1, 4])
+
+    assert classes == [1, 2, 4]
+
+    assert (matrix == cnf_matrix.get_pair_counts(np.array([2, 2, 1, 4]), np.array([2, 4, 1, 4]), classes)).all()
+
+
+@pytest.mark.parametrize("mask_pred", [True, False])
+def test_compute_confusion_matrix_blocks_matches_baseline(write_raster, mask_pred):
+    rng = np.random.default_rng(1)
+
+    reference = rng.choice([0, 1, 2, 5], size=(23, 17)).astype(np.uint8)
+
+    classified = rng.choice([1, 2, 3, 5], size=(23, 17)).astype(np.uint8)
+
+    # read_data of 8_confusion_matrix sets the prediction to 0 where the reference is 0
+    expected_pred = np.where(reference == 0, 0, classified) if mask_pred else classified
+
+    expected = baseline_matrix(reference, expected_pred, get_classes(reference, classified))
+
+    matrix = cnf_matrix.compute_confusion_matrix_blocks(write_raster("ref.tif", reference),
+                                                        write_raster("pred.tif", classified), blocksize=5,
+                                                        mask_pred=mask_pred)
+
+    assert (matrix == expected).all()
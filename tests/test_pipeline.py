@@ -0,0 +1,158 @@
+import fnmatch
+import os
+
+import pytest
+
+import pipeline
+
+CONCAT = """import glob
+import sys
+
+with open(sys.argv[-1], "w") as out:
+    for pattern in sys.argv[1:-1]:
+        for infile in sorted(glob.glob(pattern)):
+            with open(infile, "r") as f:
+                out.write(f.read())
+"""
+
+CONFIG = {
+    "vars": {"maps": "{root}/{tile}/maps", "eval": "{root}/{tile}/eval"},
+    "stages": [
+        {"name": "first", "script": "concat.py", "args": ["{maps}/*_ChangeMap_*.tif", "{eval}/first_{to}.tif"],
+         "inputs": ["{maps}/*_ChangeMap_*.tif"], "outputs": ["{eval}/first_{to}.tif"]},
+        {"name": "second", "script": "concat.py", "args": ["{eval}/first_{to}.tif", "{eval}/second_{to}.tif"],
+         "inputs": ["{eval}/first_{to}.tif"], "outputs": ["{eval}/second_{to}.tif"]}
+    ]
+}
+
+
+def baseline_dependencies(tasks):
+    """
+    Compare every input pattern of every task with every output of the other tasks
+    """
+    return {task.id: set(other.id for other in tasks for pattern in task.inputs for outfile in other.outputs
+                         if other.id != task.id and fnmatch.fnmatch(outfile, pattern)) for task in tasks}
+
+
+def test_default_dependencies_match_baseline():
+    tasks = pipeline.get_tasks(pipeline.DEFAULT_PIPELINE, "/data", ["H03V01", "H04V01"], "1985", "2015")
+
+    deps = pipeline.get_dependencies(tasks)
+
+    assert deps == baseline_dependencies(tasks)
+
+    assert deps["H03V01/plot_cover_area"] == {"H03V01/cover_changes"}
+
+    assert deps["H04V01/plot_change_area"] == {"H04V01/num_changes"}
+
+    assert deps["H03V01/lc_change"] == set()
+
+
+def test_dependencies_with_pattern_folders():
+    config = {"stages": [{"name": "a", "script": "a.py", "outputs": ["/d/{tile}/x/a.tif"]},
+                         {"name": "b", "script": "b.py", "outputs": ["/d/{tile}/y/b.tif"]},
+                         {"name": "c", "script": "c.py", "inputs": ["/d/{tile}/*/*.tif"]}]}
+
+    tasks = pipeline.get_tasks(config, "/d", ["H01V01"], "1985", "2015")
+
+    assert pipeline.get_dependencies(tasks) == baseline_dependencies(tasks)
+
+    assert pipeline.get_dependencies(tasks)["H01V01/c"] == {"H01V01/a", "H01V01/b"}
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    scripts = tmp_path / "scripts"
+
+    scripts.mkdir()
+
+    (scripts / "concat.py").write_text(CONCAT)
+
+    (scripts / "fail.py").write_text("import sys\n\nsys.exit(1)\n")
+
+    monkeypatch.setattr(pipeline, "REPO", str(scripts))
+
+    maps = tmp_path / "data" / "H01V01" / "maps"
+
+    maps.mkdir(parents=True)
+
+    for year in (1985, 1986):
+        (maps / "H01V01_ChangeMap_{}.tif".format(year)).write_text(str(year))
+
+    return str(tmp_path / "data")
+
+
+def run(root, config=CONFIG, to_year="1986", use_hash=False, dry_run=False):
+    tasks = pipeline.get_tasks(config, root, ["H01V01"], "1985", to_year)
+
+    results = pipeline.run_pipeline(tasks, pipeline.State(root, use_hash), root, workers=2, dry_run=dry_run)
+
+    return [results["H01V01/first"], results["H01V01/second"]]
+
+
+def test_pipeline_reruns_only_stale_tasks(root):
+    maps = os.path.join(root, "H01V01", "maps")
+
+    second = os.path.join(root, "H01V01", "eval", "second_1986.tif")
+
+    assert run(root, dry_run=True) == ["would run", "would run"]
+
+    assert run(root) == ["ran", "ran"]
+
+    with open(second, "r") as f:
+        assert f.read() == "19851986"
+
+    assert run(root) == ["current", "current"]
+
+    # a new input is picked up by the input pattern
+    with open(os.path.join(maps, "H01V01_ChangeMap_1987.tif"), "w") as f:
+        f.write("1987")
+
+    assert run(root, dry_run=True) == ["would run", "would run"]
+
+    assert run(root) == ["ran", "ran"]
+
+    with open(second, "r") as f:
+        assert f.read() == "198519861987"
+
+    os.remove(second)
+
+    assert run(root) == ["current", "ran"]
+
+    # a different command line
+    assert run(root, to_year="1987") == ["ran", "ran"]
+
+
+def test_pipeline_hash_ignores_rewritten_inputs(root):
+    infile = os.path.join(root, "H01V01", "maps", "H01V01_ChangeMap_1985.tif")
+
+    assert run(root, use_hash=True) == ["ran", "ran"]
+
+    with open(infile, "w") as f:
+        f.write("1985")
+
+    mtime = os.stat(infile).st_mtime_ns + 10 ** 9
+
+    os.utime(infile, ns=(mtime, mtime))
+
+    assert run(root, use_hash=True) == ["current", "current"]
+
+    assert run(root) == ["ran", "ran"]
+
+
+def test_pipeline_skips_tasks_after_a_failure(root):
+    config = {"vars": CONFIG["vars"], "stages": [dict(CONFIG["stages"][0], script="fail.py"), CONFIG["stages"][1]]}
+
+    assert run(root, config) == ["failed", "skipped"]
+
+    assert not os.path.exists(os.path.join(root, "H01V01", "eval", "second_1986.tif"))
+
+
+def test_pipeline_exits_on_a_cycle(root):
+    config = {"stages": [{"name": "first", "script": "concat.py", "inputs": ["{root}/b.tif"],
+                          "outputs": ["{root}/a.tif"]},
+                         {"name": "second", "script": "concat.py", "inputs": ["{root}/a.tif"],
+                          "outputs": ["{root}/b.tif"]}]}
+
+    with pytest.raises(SystemExit):
+        run(root, config)
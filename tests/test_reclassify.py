@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo.gdal")
+
+import reclassify
+
+
+def baseline_bins(inarray, bounds):
+    """
+    The chain of boolean masks of the baseline array_calc functions, each range (bounds[i - 1], bounds[i]] is set
+    to class i in place and values > bounds[-1] become class len(bounds)
+    """
+    inarray = inarray.copy()
+
+    inarray[inarray == 0] = 0
+
+    lower = 0
+
+    for cls, upper in enumerate(bounds, start=1):
+        inarray[(inarray > lower) & (inarray <= upper)] = cls
+
+        lower = upper
+
+    inarray[inarray > lower] = len(bounds) + 1
+
+    return inarray.astype(np.uint8)
+
+
+def baseline_recode(srcdata, table):
+    """
+    The baseline recode loops, one mask of the source values per entry of the table
+    """
+    holder = np.copy(srcdata)
+
+    for value, cls in table.items():
+        holder[srcdata == value] = cls
+
+    return holder
+
+
+CHANGEMAG = [650, 750, 800, 850, 950, 1000, 1100, 1200, 1300, 1400, 1500, 1600, 1700, 1900, 2000, 2200, 2300, 2500,
+             2600, 2700, 2900, 3000, 3300, 3500, 3800, 4100, 4700, 5200, 6000, 7000, 9100]
+
+SEGLENGTH = [100, 250, 500, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 5500, 5750, 6000, 6500, 6750, 7000,
+             7500, 8000, 8500, 9000, 9500, 10000, 10500, 11000, 11500, 12000]
+
+
+def values_with_breaks(bounds, high, dtype):
+    """
+    Random values plus 0, every break and its neighbours and values above the last break
+    """
+    rng = np.random.default_rng(0)
+
+    edges = [b + d for b in bounds for d in (-1, 0, 1)]
+
+    return np.concatenate([[0], edges, rng.integers(0, high, 2000)]).astype(dtype)
+
+
+@pytest.mark.parametrize("name, bounds, high", [("1_reclassify_changemag", CHANGEMAG, 12000),
+                                                ("1_reclassify_seglength", SEGLENGTH, 15000)])
+def test_classify_matches_baseline(load_script, name, bounds, high):
+    script = load_script(name)
+
+    for dtype in (np.int16, np.float32):
+        values = values_with_breaks(bounds, high, dtype)
+
+        np.testing.assert_array_equal(script.array_calc(values), baseline_bins(values, bounds))
+
+
+def test_classify_lastchange_matches_baseline(load_script):
+    script = load_script("1_reclassify_lastchange")
+
+    # every day count up to beyond the last break of 30 years
+    values = np.arange(0, 366 * 32, dtype=np.int16)
+
+    # the baseline binned the day counts as percent of a year
+    expected = baseline_bins((values.astype(np.float32) / 365.0) * 100.0, [100 * k for k in range(1, 31)])
+
+    np.testing.assert_array_equal(script.array_calc(values), expected)
+
+
+def test_classify_nan_is_class_zero():
+    values = np.array([np.nan, 0, 1, 5, 11], dtype=np.float32)
+
+    np.testing.assert_array_equal(reclassify.classify(values, [0, 5, 10]), [0, 0, 1, 1, 3])
+
+
+@pytest.mark.parametrize("name, tables", [("1_recode_trends", ["RECODE"]),
+                                          ("1_recode_nlcd", ["RECODE_1992", "RECODE_2001"])])
+def test_recode_matches_baseline(load_script, name, tables):
+    script = load_script(name)
+
+    srcdata = np.random.default_rng(2).integers(0, 256, (40, 40)).astype(np.uint8)
+
+    for table in tables:
+        lut = reclassify.get_lut(getattr(script, table))
+
+        np.testing.assert_array_equal(reclassify.recode(srcdata, lut), baseline_recode(srcdata, getattr(script, table)))
+
+
+def test_recode_keeps_values_outside_lut():
+    srcdata = np.array([[-1, 0, 3], [300, 2, 1]], dtype=np.int16)
+
+    lut = reclassify.get_lut({1: 5, 2: 7}, size=4)
+
+    np.testing.assert_array_equal(reclassify.recode(srcdata, lut), [[-1, 0, 3], [300, 7, 5]])
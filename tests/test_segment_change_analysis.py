@@ -0,0 +1,56 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("osgeo.gdal")
+pytest.importorskip("matplotlib")
+pytest.importorskip("pandas")
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Segment_Change_Analysis"))
+
+import segment_change_analysis
+
+
+def baseline_matrix(fromto):
+    """
+    The per from/to pair loop of compute_confusion_matrix before the bincount rewrite, without the borders
+    """
+    vals = list(range(9))
+
+    check_vals = np.unique(fromto)
+
+    matrix = np.zeros((9, 9), np.int32)
+
+    for c in vals:
+        for r in vals:
+            val = int(str(c) + str(r))
+
+            if val in check_vals and val != 0:
+                matrix[c, r] = np.bincount(fromto.flatten())[val]
+
+    return matrix
+
+
+def test_compute_confusion_matrix_matches_baseline():
+    rng = np.random.default_rng(0)
+
+    # from-to values are the from class followed by the to class, 0 is no change
+    fromto = (rng.integers(0, 9, (40, 30)) * 10 + rng.integers(0, 9, (40, 30))).astype(np.uint8)
+
+    fromto[rng.random((40, 30)) < 0.3] = 0
+
+    matrix = segment_change_analysis.compute_confusion_matrix(fromto, "test")
+
+    expected = baseline_matrix(fromto)
+
+    assert (matrix[1:10, 1:10] == expected).all()
+
+    # row and column totals, then the class value borders
+    assert (matrix[1:10, 10] == expected.sum(axis=1)).all()
+    assert (matrix[10, 1:10] == expected.sum(axis=0)).all()
+    assert matrix[10, 10] == expected.sum()
+
+    assert matrix[0].tolist() == [0] + list(range(9)) + [99999999]
+    assert matrix[:, 0].tolist() == [0] + list(range(9)) + [99999999]